@@ -0,0 +1,88 @@
+"""
+Pickling throughput of ldarray and Struct arrays.
+
+Compares in-band pickling (protocol 4) with protocol 5 out-of-band buffers, and measures the transfer rate through
+a multiprocessing pipe.
+
+    python benchmarks/bench_pickle.py
+"""
+import time
+import pickle
+import multiprocessing as mp
+import numpy as np
+
+from np_struct import ldarray, Struct
+
+
+class record(Struct):
+    timestamp = np.float64()
+    seq = np.uint32()
+    samples = np.int16([0] * 64)
+
+
+def timeit(func, repeat=5):
+    # best time of repeat calls
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def pickle_rate(obj, protocol, out_of_band=False):
+    """
+    dumps + loads rate in MB/s
+    """
+    def run():
+        buffers = []
+        callback = buffers.append if out_of_band else None
+        data = pickle.dumps(obj, protocol=protocol, buffer_callback=callback)
+        pickle.loads(data, buffers=buffers)
+
+    return obj.nbytes / timeit(run) / 1e6
+
+
+def _echo(conn):
+    # receive objects until None is sent, reply with the number of bytes received
+    while True:
+        obj = conn.recv()
+        if obj is None:
+            break
+        conn.send(obj.nbytes)
+
+
+def pipe_rate(obj, count=10):
+    """
+    Transfer rate in MB/s through a multiprocessing pipe
+    """
+    parent, child = mp.Pipe()
+    proc = mp.Process(target=_echo, args=(child,))
+    proc.start()
+
+    def run():
+        for _ in range(count):
+            parent.send(obj)
+            parent.recv()
+
+    rate = count * obj.nbytes / timeit(run, repeat=3) / 1e6
+    parent.send(None)
+    proc.join()
+    return rate
+
+
+def main():
+    print(f"{'object':<28}{'protocol 4':>14}{'protocol 5 oob':>16}{'pipe':>12}  (MB/s)")
+
+    for n in [10**4, 10**6, 10**7]:
+        ld = ldarray(np.random.rand(n // 100, 100), coords=dict(a=np.arange(n // 100), b=np.arange(100) * 0.5))
+        recs = record(shape=(n // 64,))
+
+        for name, obj in [(f"ldarray {ld.shape}", ld), (f"Struct {recs.shape}", recs)]:
+            print(
+                f"{name:<28}{pickle_rate(obj, 4):>14.0f}{pickle_rate(obj, 5, True):>16.0f}{pipe_rate(obj):>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Formatting time of ldarray and Struct reprs as the array size grows. The time should stay roughly constant, only
+the printed edge items of the data and coordinates are formatted.
+
+    python benchmarks/bench_repr.py
+"""
+import time
+import datetime as dt
+import numpy as np
+
+from np_struct import ldarray, Struct
+from np_struct.bitfields import uint16
+
+
+class record(Struct):
+    timestamp = np.float64()
+    state1 = uint16(bits=7)
+    state2 = uint16(bits=3)
+    samples = np.int16([0] * 16)
+
+
+def timeit(func, repeat=5):
+    # best time of repeat calls
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    start = dt.datetime(2024, 1, 1)
+    print(f"{'size':>10}{'ldarray (ms)':>16}{'Struct (ms)':>16}")
+
+    for n in [10**3, 10**4, 10**5, 10**6]:
+        time_coords = np.array([start + dt.timedelta(seconds=i) for i in range(n)])
+        ld = ldarray(np.random.rand(n, 4), coords=dict(time=time_coords, channel=["a", "b", "c", "d"]))
+        recs = record(shape=(n,))
+
+        t_ld = timeit(lambda: repr(ld)) * 1e3
+        t_recs = timeit(lambda: repr(recs)) * 1e3
+        print(f"{n:>10}{t_ld:>16.3f}{t_recs:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+Benchmark suite for the Struct, PacketTransfer and ldarray hot paths.
+
+Each benchmark reports the best time per operation over several repeats. Results can be written to a JSON file and
+compared against a stored baseline, benchmarks that are slower than the baseline by more than the threshold are
+reported as regressions and the script exits with status 1.
+
+    python benchmarks/run.py                                    # run all benchmarks
+    python benchmarks/run.py --quick -k ldarray                 # smallest sizes of the ldarray benchmarks
+    python benchmarks/run.py --output baseline.json             # store a baseline
+    python benchmarks/run.py --baseline baseline.json           # compare against it
+"""
+import os
+import sys
+import json
+import time
+import pickle
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import datetime as dt
+import numpy as np
+
+from np_struct import ldarray, Struct
+from np_struct.transfer import Packet, LoopBack, SocketInterface
+from np_struct.bitfields import uint16
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import bench_pickle
+import bench_repr
+
+
+class record(Struct):
+    timestamp = np.float64()
+    state1 = uint16(bits=7)
+    state2 = uint16(bits=3)
+    state3 = uint16(bits=1)
+    samples = np.int16([0] * 16)
+
+
+class benchheader(Packet):
+    psize = np.uint16()
+    ptype = np.uint8()
+
+    def get_ptype(self):
+        return self.ptype
+
+class benchpkt(Packet):
+    hdr = benchheader(ptype=0x1)
+    seq = np.uint32()
+    samples = np.int16([0] * 16)
+
+
+# registered benchmarks, name: (function, sizes, quick sizes). Each function takes a size and returns a callable
+# that runs the benchmark once and the number of operations it performs.
+BENCHMARKS = {}
+
+
+def benchmark(name, sizes=(1,), quick=None):
+    def wrap(func):
+        BENCHMARKS[name] = (func, sizes, quick if quick is not None else sizes[:1])
+        return func
+    return wrap
+
+
+def timeit(func, repeat=5):
+    # best time of repeat calls
+    best = np.inf
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def time_coords(n):
+    start = np.datetime64("2024-01-01T00:00:00", "us")
+    return start + np.arange(n) * np.timedelta64(1, "s")
+
+
+## Struct
+
+@benchmark("struct.construct", sizes=(1, 1000, 100000), quick=(1, 1000))
+def bench_struct_construct(n):
+    if n == 1:
+        return (lambda: [record() for _ in range(1000)]), 1000
+    return (lambda: record(shape=(n,))), 1
+
+
+@benchmark("struct.unpack", sizes=(1, 1000, 100000), quick=(1, 1000))
+def bench_struct_unpack(n):
+    recs = record(shape=(n,)) if n > 1 else record()
+    data = recs.tobytes()
+    return (lambda: [recs.unpack(data) for _ in range(100)]), 100
+
+
+@benchmark("struct.frombuffer", sizes=(1000, 100000, 1000000), quick=(1000,))
+def bench_struct_frombuffer(n):
+    data = record(shape=(n,)).tobytes()
+    return (lambda: record.frombuffer(data).samples.sum()), 1
+
+
+@benchmark("struct.bitfield_get", sizes=(1, 100000), quick=(1,))
+def bench_bitfield_get(n):
+    recs = record(shape=(n,)) if n > 1 else record()
+    return (lambda: [recs.state2 for _ in range(100)]), 100
+
+
+@benchmark("struct.bitfield_set", sizes=(1, 100000), quick=(1,))
+def bench_bitfield_set(n):
+    recs = record(shape=(n,)) if n > 1 else record()
+
+    def run():
+        for i in range(100):
+            recs.state2 = i % 8
+
+    return run, 100
+
+
+@benchmark("struct.repr", sizes=(1000, 1000000), quick=(1000,))
+def bench_struct_repr(n):
+    recs = bench_repr.record(shape=(n,))
+    return (lambda: repr(recs)), 1
+
+
+@benchmark("struct.pickle", sizes=(10**4, 10**6), quick=(10**4,))
+def bench_struct_pickle(n):
+    recs = bench_pickle.record(shape=(n // 64,))
+    return (lambda: pickle.loads(pickle.dumps(recs, protocol=5))), 1
+
+
+## PacketTransfer
+
+@benchmark("transfer.loopback_pkt_read", sizes=(1000,))
+def bench_loopback(n, stats=False):
+    intf = LoopBack(header=benchheader)
+    intf.set_stats(stats)
+    pkt = benchpkt()
+
+    def run():
+        for i in range(n):
+            intf.pkt_write(pkt)
+            intf.pkt_read()
+
+    return run, n
+
+
+@benchmark("transfer.loopback_pkt_read_stats", sizes=(1000,))
+def bench_loopback_stats(n):
+    # compare with transfer.loopback_pkt_read for the per packet overhead of stats
+    return bench_loopback(n, stats=True)
+
+
+@benchmark("transfer.stats_record_rx", sizes=(1000,))
+def bench_stats_record_rx(n):
+    stats = LoopBack(header=benchheader).set_stats()
+
+    def run():
+        for i in range(n):
+            stats.record_rx(1, 38, 1500)
+
+    return run, n
+
+
+@benchmark("transfer.tcp_pkt_read", sizes=(1000,))
+def bench_tcp(n):
+    data = benchpkt().tobytes() * n
+
+    def run():
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(("127.0.0.1", 0))
+        server.listen()
+
+        def send():
+            conn, _ = server.accept()
+            conn.sendall(data)
+            conn.close()
+
+        thread = threading.Thread(target=send)
+        thread.start()
+        with SocketInterface(target=server.getsockname(), header=benchheader) as client:
+            for i in range(n):
+                client.pkt_read()
+        thread.join()
+        server.close()
+
+    return run, n
+
+
+## ldarray
+
+def make_ldarray(n):
+    return ldarray(np.random.rand(n, 4), coords=dict(time=time_coords(n), channel=["a", "b", "c", "d"]))
+
+
+@benchmark("ldarray.sel", sizes=(1000, 100000, 1000000), quick=(1000,))
+def bench_sel(n):
+    ld = make_ldarray(n)
+    t = time_coords(n)[n // 2]
+    return (lambda: [ld.sel(time=t, channel="b") for _ in range(100)]), 100
+
+
+@benchmark("ldarray.coord2idx", sizes=(1000, 100000, 1000000), quick=(1000,))
+def bench_coord2idx(n):
+    ld = make_ldarray(n)
+    t = time_coords(n)
+    key = dict(time=slice(t[n // 4], t[3 * n // 4]), channel=["a", "c"])
+    return (lambda: [ld._coord2idx(key) for _ in range(100)]), 100
+
+
+@benchmark("ldarray.ufunc_align", sizes=(1000, 100000, 1000000), quick=(1000,))
+def bench_ufunc(n):
+    a = make_ldarray(n)
+    # broadcast against an array along a new dimension
+    b = ldarray(np.random.rand(3), coords=dict(freq=[1.0, 2.0, 3.0]))
+    return (lambda: a * b), 1
+
+
+@benchmark("ldarray.save_load", sizes=(1000, 100000, 1000000), quick=(1000,))
+def bench_save_load(n):
+    ld = ldarray(np.random.rand(n, 4), coords=dict(a=np.arange(n), b=["a", "b", "c", "d"]))
+    path = os.path.join(tempfile.mkdtemp(), "bench.npy")
+
+    def run():
+        ld.save(path)
+        ldarray.load(path)
+
+    return run, 1
+
+
+@benchmark("ldarray.interpolate", sizes=(1000, 100000), quick=(1000,))
+def bench_interpolate(n):
+    ld = ldarray(np.random.rand(n, 4), coords=dict(a=np.arange(n) * 0.5, b=["a", "b", "c", "d"]))
+    points = np.linspace(0, (n - 1) * 0.5, n)
+    return (lambda: ld.interpolate(a=points, b=["b", "c"])), 1
+
+
+@benchmark("ldarray.repr", sizes=(1000, 1000000), quick=(1000,))
+def bench_ldarray_repr(n):
+    ld = make_ldarray(n)
+    return (lambda: repr(ld)), 1
+
+
+def run(pattern=None, quick=False, repeat=5):
+    """
+    Run benchmarks whose name contains pattern, returns results keyed by "name[size]".
+    """
+    # same data on every run
+    np.random.seed(0)
+    results = {}
+    for name, (func, sizes, quick_sizes) in BENCHMARKS.items():
+        if pattern and pattern not in name:
+            continue
+
+        for n in (quick_sizes if quick else sizes):
+            call, ops = func(n)
+            # warm up caches before timing
+            call()
+            seconds = timeit(call, repeat)
+
+            key = f"{name}[{n}]"
+            results[key] = dict(seconds=seconds, ops=ops, per_op=seconds / ops)
+            print(f"{key:<40}{seconds / ops * 1e6:>14.3f} us/op", flush=True)
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Print the time per operation relative to the baseline, returns the names of benchmarks that regressed.
+    """
+    print(f"\n{'benchmark':<40}{'baseline (us)':>16}{'current (us)':>16}{'ratio':>10}")
+    regressions = []
+    for key, res in results.items():
+        if key not in baseline:
+            continue
+
+        base = baseline[key]["per_op"]
+        ratio = res["per_op"] / base
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<40}{base * 1e6:>16.3f}{res['per_op'] * 1e6:>16.3f}{ratio:>10.2f}{flag}")
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="np_struct benchmark suite")
+    parser.add_argument("-k", dest="pattern", help="only run benchmarks whose name contains this string")
+    parser.add_argument("--quick", action="store_true", help="run the smallest sizes only")
+    parser.add_argument("--repeat", type=int, default=5, help="number of timed repeats, the best is reported")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results stored in this JSON file")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="relative slowdown reported as a regression (default 0.2)"
+    )
+    args = parser.parse_args(argv)
+
+    results = run(args.pattern, args.quick, args.repeat)
+
+    if args.output:
+        meta = dict(
+            date=dt.datetime.now().isoformat(timespec="seconds"),
+            python=platform.python_version(),
+            numpy=np.__version__,
+            machine=platform.machine(),
+            platform=platform.platform(),
+        )
+        with open(args.output, "w") as f:
+            json.dump(dict(meta=meta, results=results), f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        if compare(results, baseline, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
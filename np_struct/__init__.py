@@ -1,5 +1,6 @@
 
-from . structures import Struct
+from . structures import Struct, varlen
+from . checksum import checksum
 from . ldarray import ldarray, Coords
 from . transfer import Packet
 from . import bitfields
\ No newline at end of file
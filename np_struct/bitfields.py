@@ -1,13 +1,106 @@
 
+import enum as _enum
 import numpy as np
 
 
+def enum_members(enum) -> dict:
+    """
+    Returns the {name: value} members of a bit field enum, given as an Enum class or a dictionary.
+    """
+    if isinstance(enum, type) and issubclass(enum, _enum.Enum):
+        return {k: int(m.value) for k, m in enum.__members__.items()}
+    return {k: int(v) for k, v in dict(enum).items()}
+
+
+class EnumTable(object):
+    """
+    Lookup tables of a bit field enum. Raw values are decoded to categorical codes (the position of the member in
+    categories, -1 for values that are not members) with a single gather, and codes are mapped to names with
+    another.
+
+    Parameters
+    ----------
+    enum : Enum | dict
+        members of the enum, an Enum class (i.e. IntEnum) or a dictionary of {name: value}.
+    bits : int
+        width of the bit field.
+    dtype : np.dtype, default: np.int64
+        data type of the bit field, raw values of arrays of names are returned with this type.
+    """
+    # fields with more bits are decoded with a binary search instead of a full table
+    MAX_LUT_BITS = 16
+
+    def __init__(self, enum, bits: int, dtype=np.int64):
+        self.enum = enum
+        self.bits = bits
+        members = enum_members(enum)
+        self._members = members
+
+        self.categories = np.array(list(members.keys()))
+        self.values = np.array(list(members.values()), dtype=dtype)
+        # names indexed by code, code -1 wraps to the empty name of unknown values
+        self._names = np.append(self.categories, '')
+
+        code_dtype = np.int8 if len(members) < 128 else np.int32
+        if bits is not None and bits <= self.MAX_LUT_BITS:
+            self.lut = np.full(1 << bits, -1, dtype=code_dtype)
+            self.lut[self.values] = np.arange(len(members))
+        else:
+            self.lut = None
+            self._order = np.argsort(self.values).astype(code_dtype)
+            self._sorted = self.values[self._order]
+
+    def codes(self, raw: np.ndarray) -> np.ndarray:
+        """
+        Returns the categorical code of each raw bit field value.
+        """
+        if self.lut is not None:
+            return np.take(self.lut, raw)
+
+        raw = np.asarray(raw)
+        pos = np.minimum(np.searchsorted(self._sorted, raw), len(self._sorted) - 1)
+        return np.where(self._sorted[pos] == raw, self._order[pos], -1).astype(self._order.dtype)
+
+    def names(self, codes: np.ndarray) -> np.ndarray:
+        """
+        Returns the member name of each code, values that are not members have an empty name.
+        """
+        return np.take(self._names, codes)
+
+    def encode(self, value):
+        """
+        Returns the raw value of enum members, names, or arrays of names. Integers are returned as is.
+        """
+        if isinstance(value, _enum.Enum):
+            return value.value
+        if isinstance(value, str):
+            if value not in self._members:
+                raise ValueError('\'{}\' is not a member of {}.'.format(value, list(self._members)))
+            return self._members[value]
+
+        arr = np.asarray(value)
+        if arr.dtype.kind in 'US':
+            order = np.argsort(self.categories)
+            idx = order[np.minimum(np.searchsorted(self.categories, arr, sorter=order), len(order) - 1)]
+            if not np.all(self.categories[idx] == arr):
+                raise ValueError('Unknown names in {}, must be one of {}.'.format(arr, list(self._members)))
+            return self.values[idx]
+        if arr.dtype.kind == 'O':
+            return np.array([self.encode(v) for v in arr.reshape(-1)]).reshape(arr.shape)
+
+        return value
+
+
 class bitfield(np.ndarray):
 
     def __new__(cls, input_=None, bits=None, doc=None, dtype=None, enum=None):
         
         input_ = 0 if np.all(input_ == None) else input_
 
+        ## default values can be given as enum members or names
+        if enum is not None and isinstance(input_, (str, _enum.Enum)):
+            input_ = EnumTable(enum, bits).encode(input_)
+
         ## cast single values as arrays
         input_ = [input_] if not isinstance(input_, (tuple, list, np.ndarray)) else input_
         
@@ -59,3 +152,9 @@ class float64(bitfield):
 
 class float32(bitfield):
     pass
+
+class uint64(bitfield):
+    pass
+
+class int64(bitfield):
+    pass
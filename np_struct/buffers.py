@@ -0,0 +1,149 @@
+class RxBuffer(object):
+    """
+    Receive buffer backed by a preallocated bytearray. Data is received directly into the free space at the end of
+    the buffer (i.e. with ``socket.recv_into``), and consumed from the start. The buffer is compacted or grown only
+    when the free space runs out.
+
+    Delimiter searches are incremental, bytes that were already scanned for a delimiter are not scanned again when
+    more data arrives.
+
+    Parameters
+    ----------
+    size : int, default: 65536
+        initial size of the buffer in bytes.
+    chunk : int, default: 65536
+        minimum free space made available for each receive call.
+    """
+
+    def __init__(self, size: int = 1 << 16, chunk: int = 1 << 16):
+        self.chunk = chunk
+        self._buf = bytearray(max(size, chunk))
+        self._view = memoryview(self._buf)
+        # unread data is in _buf[_start:_end]
+        self._start = 0
+        self._end = 0
+        # delimiter of the current search, the position the search has reached, and the end index of each
+        # occurrence found so far
+        self._delim = None
+        self._scan = 0
+        self._matches = []
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __bytes__(self):
+        return bytes(self._view[self._start:self._end])
+
+    @property
+    def capacity(self) -> int:
+        return len(self._buf)
+
+    def clear(self):
+        """
+        Discard all unread data.
+        """
+        self._start = self._end = 0
+        self._reset_search()
+
+    def reserve(self, nbytes: int) -> memoryview:
+        """
+        Returns a writable view of at least nbytes of free space at the end of the buffer. Data written to the view
+        is added to the buffer with commit().
+        """
+        if len(self._buf) - self._end < nbytes:
+            n = len(self)
+
+            if n + nbytes > len(self._buf):
+                # grow, keeping the unread data at the start of the new buffer
+                size = len(self._buf)
+                while size < n + nbytes:
+                    size *= 2
+                buf = bytearray(size)
+                buf[:n] = self._view[self._start:self._end]
+                self._buf, self._view = buf, memoryview(buf)
+            else:
+                # compact, move the unread data to the start of the buffer. Copy through the memoryview, which
+                # handles the overlapping ranges
+                self._view[:n] = self._view[self._start:self._end]
+
+            self._shift(self._start)
+            self._start, self._end = 0, n
+
+        return self._view[self._end:]
+
+    def commit(self, nbytes: int):
+        """
+        Add nbytes written to the view returned by reserve() to the buffer.
+        """
+        self._end += nbytes
+
+    def recv_into(self, sock, nbytes: int = None) -> int:
+        """
+        Receive up to nbytes (default is the chunk size) from a socket directly into the buffer. Returns the number
+        of bytes received.
+        """
+        nbytes = self.chunk if nbytes is None else nbytes
+        view = self.reserve(nbytes)
+        n = sock.recv_into(view, nbytes)
+        self._end += n
+        return n
+
+    def write(self, data):
+        """
+        Append data to the buffer.
+        """
+        data = memoryview(data).cast('B')
+        self.reserve(data.nbytes)[:data.nbytes] = data
+        self._end += data.nbytes
+
+    def read(self, nbytes: int) -> bytes:
+        """
+        Remove and return up to nbytes from the start of the buffer.
+        """
+        nbytes = min(nbytes, len(self))
+        ret = bytes(self._view[self._start:self._start + nbytes])
+        self._consume(nbytes)
+        return ret
+
+    def find(self, expected: bytes, count: int = 1) -> int:
+        """
+        Returns the number of bytes up to and including the count-th (non-overlapping) occurrence of expected, or
+        -1 if there are fewer occurrences in the buffer. Only bytes added since the last call are searched.
+        """
+        if expected != self._delim:
+            self._delim = bytes(expected)
+            self._reset_search()
+
+        size = len(self._delim)
+        while len(self._matches) < count:
+            idx = self._buf.find(self._delim, self._scan, self._end)
+            if idx < 0:
+                # a delimiter may be split across the end of the buffer, rescan the last bytes next time
+                self._scan = max(self._scan, self._end - size + 1)
+                return -1
+
+            self._matches.append(idx + size)
+            self._scan = idx + size
+
+        return self._matches[count - 1] - self._start
+
+    def _reset_search(self):
+        self._scan = self._start
+        self._matches = []
+
+    def _consume(self, nbytes: int):
+        self._start += nbytes
+
+        # occurrences in the consumed data are dropped, a partially consumed delimiter is no longer a match
+        if len(self._matches):
+            self._matches = [m for m in self._matches if m - len(self._delim) >= self._start]
+        self._scan = max(self._scan, self._start)
+
+        if self._start == self._end:
+            self._shift(self._start)
+            self._start = self._end = 0
+
+    def _shift(self, offset: int):
+        # data moved toward the start of the buffer by offset bytes
+        self._scan -= offset
+        self._matches = [m - offset for m in self._matches]
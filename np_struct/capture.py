@@ -0,0 +1,312 @@
+import os
+import struct
+import threading
+import numpy as np
+from time import time, sleep, perf_counter
+from . structures import _gather_bytes
+
+# direction of captured packets
+RX = 0
+TX = 1
+
+# the index file starts with a magic string and format version, followed by one entry for each packet
+_MAGIC = b'NPCAP\x00'
+_VERSION = 1
+_INDEX_HEADER = struct.Struct('<6sH8x')
+
+INDEX_DTYPE = np.dtype(dict(
+    names=['timestamp', 'offset', 'length', 'ptype', 'direction'],
+    formats=['<f8', '<u8', '<u4', '<i4', 'u1'],
+    offsets=[0, 8, 16, 20, 24],
+    itemsize=32,
+))
+_INDEX_ENTRY = struct.Struct('<dQIiB7x')
+
+
+def _index_path(path) -> str:
+    return str(path) + '.idx'
+
+
+def _read_index_header(f, path):
+    magic, version = _INDEX_HEADER.unpack(f.read(_INDEX_HEADER.size))
+    if magic != _MAGIC:
+        raise ValueError('\'{}\' is not a packet capture index.'.format(path))
+    if version != _VERSION:
+        raise ValueError('Unsupported capture version {} in \'{}\'.'.format(version, path))
+
+
+class CaptureWriter(object):
+    """
+    Append-only packet capture. Raw packet bytes are appended to the data file at path, and an entry with the
+    timestamp, byte offset, length, packet type and direction of each packet is appended to the index file
+    (path + '.idx'). The index is a flat array of INDEX_DTYPE records after a 16 byte header, and can be memory
+    mapped while the capture is still being written, see Capture.
+
+    Captures are attached to an interface with PacketTransfer.set_capture() to record every packet read or written.
+    An existing capture is appended to.
+
+    Parameters
+    ----------
+    path : str | Path
+        path of the data file.
+    buffering : int, default: 65536
+        size of the write buffers of the data and index files.
+    """
+
+    def __init__(self, path, buffering: int = 1 << 16):
+        self.path = str(path)
+        index_path = _index_path(self.path)
+
+        if os.path.exists(index_path) and os.path.getsize(index_path):
+            with open(index_path, 'rb') as f:
+                _read_index_header(f, index_path)
+            # drop a partially written entry at the end of the index
+            size = os.path.getsize(index_path) - _INDEX_HEADER.size
+            with open(index_path, 'r+b') as f:
+                f.truncate(_INDEX_HEADER.size + size - size % INDEX_DTYPE.itemsize)
+
+        self._data = open(self.path, 'ab', buffering=buffering)
+        self._index = open(index_path, 'ab', buffering=buffering)
+        if self._index.tell() == 0:
+            self._index.write(_INDEX_HEADER.pack(_MAGIC, _VERSION))
+
+        self._offset = self._data.tell()
+        self._lock = threading.Lock()
+
+    def record(self, data, ptype: int = None, direction: int = RX, timestamp: float = None):
+        """
+        Append the bytes of a packet to the capture.
+
+        Parameters
+        ----------
+        data : bytes | memoryview
+            raw packet bytes.
+        ptype : int, optional
+            packet type, stored as -1 if None.
+        direction : int, default: RX
+            RX for received packets, TX for sent packets.
+        timestamp : float, optional
+            time the packet was sent or received in seconds since the epoch. Default is the current time.
+        """
+        nbytes = len(data)
+        with self._lock:
+            self._data.write(data)
+            self._index.write(_INDEX_ENTRY.pack(
+                time() if timestamp is None else timestamp,
+                self._offset,
+                nbytes,
+                -1 if ptype is None else ptype,
+                direction
+            ))
+            self._offset += nbytes
+
+    def flush(self):
+        """
+        Write buffered packets to disk. Data is flushed before the index, but index entries can still reach the
+        disk before their data when the index write buffer fills first. Capture ignores entries that point past the
+        end of the data file.
+        """
+        with self._lock:
+            self._data.flush()
+            self._index.flush()
+
+    def close(self):
+        if not self._data.closed:
+            self.flush()
+            self._data.close()
+            self._index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+
+class Capture(object):
+    """
+    Read-only view of a packet capture written by CaptureWriter. The data and index files are memory mapped, and
+    packets are only copied when they are decoded or replayed.
+
+    Parameters
+    ----------
+    path : str | Path
+        path of the data file.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        index_path = _index_path(self.path)
+
+        with open(index_path, 'rb') as f:
+            _read_index_header(f, index_path)
+
+        n = (os.path.getsize(index_path) - _INDEX_HEADER.size) // INDEX_DTYPE.itemsize
+        data_size = os.path.getsize(self.path)
+
+        self.data = np.memmap(self.path, dtype=np.uint8, mode='r') if data_size else np.zeros(0, dtype=np.uint8)
+        index = (
+            np.memmap(index_path, dtype=INDEX_DTYPE, mode='r', offset=_INDEX_HEADER.size, shape=(n,))
+            if n else np.zeros(0, dtype=INDEX_DTYPE)
+        )
+        # entries of a capture that is still being written may point past the data that is on disk
+        end = np.searchsorted(index['offset'] + index['length'], data_size, side='right')
+        self.index = index[:end]
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i: int) -> memoryview:
+        """
+        Returns the bytes of the i-th packet.
+        """
+        entry = self.index[i]
+        return memoryview(self.data[entry['offset']: entry['offset'] + entry['length']])
+
+    def select(self, direction: int = None, ptype: int = None) -> np.ndarray:
+        """
+        Returns the positions in the index of packets with the given direction and packet type, or all packets
+        if both are None.
+        """
+        mask = np.ones(len(self.index), dtype=bool)
+        if direction is not None:
+            mask &= self.index['direction'] == direction
+        if ptype is not None:
+            mask &= self.index['ptype'] == ptype
+        return np.flatnonzero(mask)
+
+    def decode(self, header: type, direction: int = None, byte_order: str = None, native: bool = False) -> dict:
+        """
+        Decodes all captured packets of the classes registered with header.
+
+        Parameters
+        ----------
+        header : type
+            packet header class.
+        direction : int, optional
+            decode only RX or TX packets. Default is all packets.
+        byte_order : str, optional
+            byte order of the captured packets, '<' or '>'. Default is the byte order of the class definitions.
+        native : bool, default: False
+            if True, record arrays are converted to native byte order with one byteswap of each array.
+
+        Returns
+        -------
+        dict
+            decoded packets keyed by packet class, in capture order. Values are record arrays for fixed size
+            packets, dictionaries of record arrays keyed by member lengths for packets with variable length members
+            (see Struct.frombuffer), and lists of packets for packets that are sized by from_header. Packets with
+            an unknown type or an unexpected size are skipped.
+        """
+        # imported here since the transfer module records captures
+        from . transfer import Packet, get_packet_table
+
+        table = get_packet_table(header)
+        pos = self.select(direction)
+        entries = self.index[pos]
+        offsets = entries['offset'].astype(np.int64)
+        lengths = entries['length'].astype(np.int64)
+        ret = {}
+
+        for ptype in np.unique(entries['ptype']):
+            pkt_cls = table.get(ptype.item())
+            if pkt_cls is None:
+                continue
+
+            sel = np.flatnonzero(entries['ptype'] == ptype)
+
+            if len(pkt_cls._var_fields):
+                # join the packets into one stream and let the class walk the length fields
+                stream = np.concatenate([self.data[o:o + n] for o, n in zip(offsets[sel], lengths[sel])])
+                ret[pkt_cls] = pkt_cls.frombuffer(stream, byte_order=byte_order, native=native)
+
+            elif pkt_cls.from_header.__func__ is not Packet.from_header.__func__:
+                pkts = []
+                for i in sel:
+                    buf = self.data[offsets[i]:offsets[i] + lengths[i]]
+                    hdr = header.frombuffer(buf, count=1, byte_order=byte_order)
+                    pkt = pkt_cls.from_header(hdr, byte_order=byte_order or '<')
+                    if pkt.get_size() == lengths[i]:
+                        pkt.unpack(buf)
+                        pkts.append(pkt)
+                ret[pkt_cls] = pkts
+
+            else:
+                dtype = pkt_cls._build_dtype({}, byte_order)
+                sel = sel[lengths[sel] == dtype.itemsize]
+                records = np.empty(len(sel), dtype=dtype)
+                _gather_bytes(self.data, offsets[sel], dtype.itemsize, records.view(np.uint8).reshape(len(sel), -1))
+                records = records.view(pkt_cls)
+                ret[pkt_cls] = records.to_byte_order('=') if native else records
+
+        return ret
+
+    def replay(
+        self,
+        intf,
+        speed: float = None,
+        direction: int = RX,
+        chunk_size: int = 1 << 20,
+        resolution: float = 1e-3
+    ) -> int:
+        """
+        Write captured packets to an interface, e.g. a LoopBack that is read by a packet handler. Packets that are
+        adjacent in the data file are sent with a single write of up to chunk_size bytes, so replay runs at memory
+        speed when speed is None.
+
+        Parameters
+        ----------
+        intf : PacketTransfer
+            interface the packets are written to.
+        speed : float, optional
+            replay rate relative to the capture timestamps, i.e. 1 for the original timing or 10 for ten times
+            faster. Default is as fast as possible.
+        direction : int, default: RX
+            replay packets with this direction, or all packets if None.
+        chunk_size : int, default: 1MB
+            largest number of bytes in a write, a write always contains at least one whole packet.
+        resolution : float, default: 1e-3
+            packets within this many seconds (after scaling by speed) are written together.
+
+        Returns
+        -------
+        int
+            number of packets written.
+        """
+        entries = self.index[self.select(direction)]
+        n = len(entries)
+        if not n:
+            return 0
+
+        offsets = entries['offset'].astype(np.int64)
+        ends = offsets + entries['length']
+
+        # start a new write where packets are not adjacent in the data file,
+        new = np.ones(n, dtype=bool)
+        new[1:] = offsets[1:] != ends[:-1]
+        # every chunk_size bytes of adjacent packets,
+        seg_start = offsets[np.maximum.accumulate(np.where(new, np.arange(n), 0))]
+        chunk = (offsets - seg_start) // chunk_size
+        new[1:] |= chunk[1:] != chunk[:-1]
+
+        # and every resolution seconds of replay time
+        if speed is not None:
+            due = (entries['timestamp'] - entries['timestamp'][0]) / speed
+            tick = np.floor(due / resolution).astype(np.int64)
+            new[1:] |= tick[1:] != tick[:-1]
+
+        starts = np.flatnonzero(new)
+        stops = np.append(starts[1:], n)
+        t0 = perf_counter()
+
+        for i0, i1 in zip(starts, stops):
+            if speed is not None:
+                delay = due[i0] - (perf_counter() - t0)
+                if delay > 0:
+                    sleep(delay)
+            intf.write(memoryview(self.data[offsets[i0]:ends[i1 - 1]]))
+
+        return n
@@ -0,0 +1,759 @@
+"""
+Generate Struct classes from C struct definitions.
+
+Supports a restricted subset of C: struct and typedef struct definitions with fixed-width integer, floating point and
+bool members, multi-dimensional arrays, nested structs, bit-fields, integer #defines used as array lengths, and
+packing with ``__attribute__((packed))`` or ``#pragma pack``. Unions, pointers and enums are not supported.
+"""
+import re
+import os
+import sys
+import copyreg
+import ast
+import json
+import hashlib
+import operator
+import numpy as np
+from collections import OrderedDict
+
+from . structures import Struct
+from . import bitfields
+
+# increment when the parsed format changes so existing caches are rebuilt
+_CACHE_VERSION = 2
+
+# integer sizes that can hold a group of bit-fields
+_INT_SIZES = (1, 2, 4, 8)
+
+# classes rebuilt from pickled C struct definitions in this process, keyed by the hash of the definitions
+_REBUILT = {}
+
+_C_TYPES = {
+    'uint8_t': 'uint8', 'int8_t': 'int8', 'uint16_t': 'uint16', 'int16_t': 'int16',
+    'uint32_t': 'uint32', 'int32_t': 'int32', 'uint64_t': 'uint64', 'int64_t': 'int64',
+    'char': 'int8', 'signed char': 'int8', 'unsigned char': 'uint8',
+    'short': 'int16', 'signed short': 'int16', 'unsigned short': 'uint16',
+    'int': 'int32', 'signed int': 'int32', 'signed': 'int32', 'unsigned int': 'uint32', 'unsigned': 'uint32',
+    'long long': 'int64', 'signed long long': 'int64', 'unsigned long long': 'uint64',
+    'float': 'float32', 'double': 'float64', 'bool': 'uint8', '_Bool': 'uint8',
+}
+
+# words that can start a multi-word C type
+_TYPE_WORDS = {'signed', 'unsigned', 'char', 'short', 'int', 'long'}
+
+_TOKEN_RE = re.compile(r'\s*(?:(0[xX][0-9a-fA-F]+|\d+)[uUlL]*|([A-Za-z_]\w*)|(.))')
+
+_OPERATORS = {
+    ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.FloorDiv: operator.floordiv,
+    ast.Div: operator.floordiv, ast.LShift: operator.lshift, ast.RShift: operator.rshift
+}
+
+
+class CHeaderError(ValueError):
+    pass
+
+
+def parse_c_structs(text: str) -> list:
+    """
+    Parse the struct definitions in C source text.
+
+    Returns a list of struct specifications in definition order. Each specification is a dictionary with the
+    struct name, a list of alias names (from typedefs), if the struct is packed, and the list of fields. Fields
+    have a name, type (a numpy type name, or the name of another struct), shape, and number of bits for bit-fields.
+    """
+    defines = {}
+    lines = []
+    packed = False
+    pack_stack = []
+
+    # remove comments
+    text = re.sub(r'/\*.*?\*/', ' ', text, flags=re.S)
+    text = re.sub(r'//[^\n]*', '', text)
+    # join continued lines
+    text = text.replace('\\\n', ' ')
+
+    # handle preprocessor lines. #pragma pack applies to the structs that follow it, so replace it with a marker
+    # token that the parser uses to track the packing state.
+    for line in text.split('\n'):
+        stripped = line.strip()
+        if not stripped.startswith('#'):
+            lines.append(line)
+            continue
+
+        define = re.match(r'#\s*define\s+([A-Za-z_]\w*)\s+(.+)$', stripped)
+        pack = re.match(r'#\s*pragma\s+pack\s*\((.*)\)', stripped)
+
+        if define:
+            try:
+                defines[define.group(1)] = _eval_const(define.group(2), defines)
+            except CHeaderError:
+                # ignore defines that aren't integer constants
+                pass
+
+        elif pack:
+            args = [a.strip() for a in pack.group(1).split(',') if a.strip()]
+            if len(args) and args[0] == 'push':
+                pack_stack.append(packed)
+                packed = len(args) > 1 and args[-1] == '1'
+            elif len(args) and args[0] == 'pop':
+                packed = pack_stack.pop() if len(pack_stack) else False
+            else:
+                packed = len(args) > 0 and args[0] == '1'
+
+            lines.append(' @pack{} '.format(int(packed)))
+
+    tokens = _tokenize('\n'.join(lines))
+    return _Parser(tokens, defines).parse()
+
+
+def build_structs(
+    specs: list,
+    base: type = Struct,
+    ptype_field: str = None,
+    ptypes: dict = None,
+    module: str = None,
+    rename: dict = None
+) -> OrderedDict:
+    """
+    Create Struct classes from parsed C struct specifications.
+
+    Parameters
+    ----------
+    specs : list
+        struct specifications returned by ``parse_c_structs()``
+    base : type, default: Struct
+        base class of the generated classes, i.e. Struct or Packet.
+    ptype_field : str, optional
+        name of the packet type field. Classes that have this field get a ``get_ptype()`` method that returns it.
+    ptypes : dict, optional
+        packet type value of each struct name. The first member (header) of these structs is initialized with
+        the packet type.
+    module : str, optional
+        value of ``__module__`` for the generated classes. Set to the module the classes are placed in so they are
+        pickled by reference. Classes that can't be imported by name are pickled with the C definitions they
+        were built from, and rebuilt once in each process that loads them.
+    rename : dict, optional
+        field name of C members, keyed by member name. Members with names that are attributes of numpy arrays
+        or of the base class (i.e. size, data or flags) are renamed with a trailing underscore by default.
+        ptype_field is the C member name, and is renamed the same way.
+
+    Returns
+    -------
+    OrderedDict
+        generated classes keyed by struct name and typedef aliases.
+    """
+    ptypes = {} if ptypes is None else ptypes
+    rename = {} if rename is None else rename
+    classes = OrderedDict()
+
+    # generated classes that can't be imported by name are pickled with the definitions they were built from
+    source_key = hashlib.sha1(json.dumps(
+        [specs, base.__module__, base.__qualname__, ptype_field, sorted(ptypes.items()), sorted(rename.items())],
+        default=str
+    ).encode()).hexdigest()
+    c_source = (source_key, specs, base, ptype_field, ptypes, rename)
+
+    if ptype_field is not None:
+        ptype_field = _field_name(ptype_field, base, rename)
+
+    for spec in specs:
+        spec = dict(spec, fields=[dict(f, name=_field_name(f['name'], base, rename)) for f in spec['fields']])
+        classdict, offsets, size = _layout_members(spec, classes, ptype_field, ptypes)
+
+        if ptype_field is not None and ptype_field in classdict:
+            classdict['get_ptype'] = _make_get_ptype(ptype_field)
+
+        if module is not None:
+            classdict['__module__'] = module
+
+        names = [spec['name']] + spec['aliases']
+        # anonymous structs are named by their typedef
+        if spec['name'].startswith('_anonymous') and len(spec['aliases']):
+            names = spec['aliases']
+
+        classdict['_c_source'] = c_source + (names[0],)
+
+        cls = type(base)(names[0], (base,), classdict, align=not spec['packed'], packed=spec['packed'])
+
+        # the generated layout must match the C layout exactly
+        dtype = cls.__schema__.dtype
+        if dtype.itemsize != size or any(dtype.fields[k][1] != v for k, v in offsets.items()):
+            raise CHeaderError('Layout of \'{}\' can\'t be represented as a Struct.'.format(names[0]))
+
+        # nested members reference the struct name
+        classes[spec['name']] = cls
+        for name in names:
+            classes[name] = cls
+
+    # drop the internal names of anonymous structs that have a typedef
+    return OrderedDict((k, v) for k, v in classes.items() if k == v.__name__ or not k.startswith('_anonymous'))
+
+
+def _field_name(name: str, base: type, rename: dict) -> str:
+    # Struct field name of a C member, names that would shadow array or class attributes get a trailing underscore
+    if name in rename:
+        return rename[name]
+    while hasattr(np.ndarray, name) or hasattr(base, name):
+        name += '_'
+    return name
+
+
+def _align_up(value: int, align: int) -> int:
+    return -(-value // align) * align
+
+
+def _layout_members(spec: dict, classes: dict, ptype_field: str, ptypes: dict) -> tuple:
+    """
+    Lay out the members of a struct the same as a C compiler (System V ABI). Bit-fields are placed in the storage
+    unit of their type that holds the current bit offset if they fit, even when the unit overlaps earlier members.
+    Packed structs place bit-fields at the next bit.
+
+    Returns the classdict members, the byte offset of each member in the C layout, and the size of the struct.
+    Bit-fields are grouped into base fields that cover the bytes they occupy, and padding members are added
+    where C pads more than numpy does.
+    """
+    packed = spec['packed']
+    bit = 0
+    struct_align = 1
+    # (byte offset, member name, member value) of regular members, and (bit offset, field) of bit-fields
+    members = []
+
+    for i, field in enumerate(spec['fields']):
+        shape = tuple(field['shape'])
+        ftype = field['type']
+
+        if field['bits'] is not None:
+            unit = np.dtype(ftype).itemsize * 8
+            # zero width bit-fields move to the next storage unit
+            if field['bits'] == 0:
+                bit = _align_up(bit, unit)
+                continue
+            # bit-fields don't cross the boundary of their storage unit unless packed
+            if not packed and bit // unit != (bit + field['bits'] - 1) // unit:
+                bit = _align_up(bit, unit)
+
+            members.append((bit, field))
+            bit += field['bits']
+            # unnamed bit-fields don't affect the alignment of the struct
+            if field.get('named', True) and not packed:
+                struct_align = max(struct_align, unit // 8)
+            continue
+
+        if ftype in classes:
+            nested = classes[ftype]
+            # the first member of a packet is the header, initialize it with the packet type
+            if i == 0 and spec['name'] in ptypes and ptype_field is not None:
+                value = nested(**{ptype_field: ptypes[spec['name']]})
+            else:
+                value = nested(shape=shape if len(shape) else None)
+            item_size = nested.__schema__.itemsize
+            item_align = nested._c_align
+        else:
+            value = np.zeros(shape if len(shape) else (1,), dtype=ftype)
+            item_size = item_align = np.dtype(ftype).itemsize
+
+        item_align = 1 if packed else item_align
+        offset = _align_up(_align_up(bit, 8) // 8, item_align)
+        members.append((offset, field['name'], value))
+        bit = (offset + item_size * int(np.prod(shape))) * 8
+        struct_align = max(struct_align, item_align)
+
+    size = _align_up(_align_up(bit, 8) // 8, struct_align)
+
+    # group each run of bit-fields into base fields, limited by the offset of the next regular member
+    elements = []
+    run = []
+    # reserved members are numbered across all runs, after the unnamed bit-fields
+    n_reserved = sum(f['name'].startswith('_reserved') for f in spec['fields'])
+    for m in members + [(size, None, None)]:
+        if len(m) == 2:
+            run.append(m)
+            continue
+        if len(run):
+            group, n_reserved = _group_bitfields(spec, run, m[0], n_reserved)
+            elements += group
+            run = []
+        if m[1] is not None:
+            elements.append(m)
+
+    # emit members, padding where numpy would place a member before its C offset
+    classdict = OrderedDict()
+    offsets = {}
+    cur = 0
+    n_pad = 0
+    for offset, name, value in elements:
+        if isinstance(name, list):
+            # bit-field group, value is the size of the base
+            np_align = value
+        elif isinstance(value, Struct):
+            np_align = value.__class__.__schema__.dtype.alignment
+        else:
+            np_align = value.dtype.itemsize
+        np_align = 1 if packed else np_align
+
+        if _align_up(cur, np_align) < offset:
+            classdict['_padding{}'.format(n_pad)] = np.zeros(offset - cur, dtype=np.uint8)
+            n_pad += 1
+            cur = offset
+
+        if _align_up(cur, np_align) != offset:
+            raise CHeaderError('Layout of \'{}\' can\'t be represented as a Struct.'.format(spec['name']))
+
+        if isinstance(name, list):
+            # the base field is named after the first bit-field of the group
+            classdict.update(name)
+            offsets[name[0][0] + '_base'] = offset
+            cur = offset + value
+        else:
+            classdict[name] = value
+            offsets[name] = offset
+            cur = offset + value.nbytes
+
+    if cur < size:
+        classdict['_padding{}'.format(n_pad)] = np.zeros(size - cur, dtype=np.uint8)
+
+    classdict['_c_align'] = struct_align
+    return classdict, offsets, size
+
+
+def _group_bitfields(spec: dict, run: list, limit: int, n_reserved: int) -> tuple:
+    """
+    Assign a run of bit-fields to base fields. Each base is an integer that covers the bytes of its bit-fields,
+    starts at a byte offset that is a multiple of its size (unless packed), and is no larger than the storage
+    units of its bit-fields so the struct alignment is unchanged. limit is the byte offset where the run ends.
+    Reserved members are numbered from n_reserved.
+
+    Returns (byte offset, bit-field members, base size) elements, and the number of the next reserved member.
+    """
+    packed = spec['packed']
+    groups = []
+
+    def fit(start: int, end_bit: int, max_size: int):
+        # smallest base at byte offset start that holds bits up to end_bit
+        for size in _INT_SIZES:
+            if size <= max_size and (packed or start % size == 0) and 8 * (start + size) >= end_bit:
+                return size if start + size <= limit else None
+        return None
+
+    for bit, field in run:
+        end_bit = bit + field['bits']
+        unit = 8 if packed else np.dtype(field['type']).itemsize
+
+        if len(groups):
+            start, size, max_size, fields = groups[-1]
+            new_size = fit(start, end_bit, max(max_size, unit))
+            if new_size is not None:
+                groups[-1] = (start, new_size, max(max_size, unit), fields + [(bit, field)])
+                continue
+
+        start = bit // 8
+        size = fit(start, end_bit, unit)
+        if size is None or (len(groups) and start < groups[-1][0] + groups[-1][1]):
+            raise CHeaderError(
+                'Bit-field layout of \'{}.{}\' can\'t be represented as a Struct.'.format(spec['name'], field['name'])
+            )
+        groups.append((start, size, unit, [(bit, field)]))
+
+    elements = []
+    for start, size, _, fields in groups:
+        # the base type is signed if the first bit-field is
+        signed = fields[0][1]['type'].startswith('int')
+        bf_type = getattr(bitfields, '{}int{}'.format('' if signed else 'u', size * 8))
+
+        members = OrderedDict()
+        pos = 0
+        for bit, field in fields:
+            # reserved bits for gaps, and to fill the base so the next group starts a new base
+            if bit - start * 8 > pos:
+                members['_reserved{}'.format(n_reserved)] = bf_type(bits=bit - start * 8 - pos)
+                n_reserved += 1
+            members[field['name']] = bf_type(bits=field['bits'])
+            pos = bit - start * 8 + field['bits']
+
+        if pos < size * 8:
+            members['_reserved{}'.format(n_reserved)] = bf_type(bits=size * 8 - pos)
+            n_reserved += 1
+
+        elements.append((start, list(members.items()), size))
+
+    return elements, n_reserved
+
+
+def _rebuild_c_struct(
+    source_key: str, specs: list, base: type, ptype_field: str, ptypes: dict, rename: dict, name: str
+):
+    """
+    Returns a class generated from C struct definitions, building the definitions once per process.
+    """
+    if source_key not in _REBUILT:
+        _REBUILT[source_key] = build_structs(specs, base=base, ptype_field=ptype_field, ptypes=ptypes, rename=rename)
+    return _REBUILT[source_key][name]
+
+
+def _reduce_struct_class(cls):
+    # classes that can be imported by name are pickled by reference, generated classes that can't are pickled
+    # with the C definitions they were built from
+    source = cls.__dict__.get('_c_source')
+    module = sys.modules.get(cls.__module__)
+
+    if source is None or getattr(module, cls.__qualname__, None) is cls:
+        return cls.__qualname__
+
+    return (_rebuild_c_struct, source)
+
+
+copyreg.pickle(type(Struct), _reduce_struct_class)
+
+
+def load_c_header(
+    path: str,
+    base: type = Struct,
+    ptype_field: str = None,
+    ptypes: dict = None,
+    module: str = None,
+    cache_dir: str = None,
+    use_cache: bool = True,
+    rename: dict = None,
+) -> OrderedDict:
+    """
+    Generate Struct classes from the struct definitions in a C header file.
+
+    Parsed definitions are cached on disk, keyed by the contents of the header file, so loading large headers only
+    parses them once. The cache directory is ``cache_dir``, the NP_STRUCT_CACHE environment variable, or
+    ``~/.cache/np_struct``.
+
+    See ``build_structs()`` for a description of the other parameters.
+
+    Examples
+    --------
+    >>> from np_struct import Packet
+    >>> from np_struct.cheader import load_c_header
+    >>> globals().update(load_c_header("packets.h", base=Packet, ptype_field="ptype", module=__name__))
+
+    Returns
+    -------
+    OrderedDict
+        generated classes keyed by struct name and typedef aliases.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    specs = None
+    cache_file = None
+
+    if use_cache:
+        if cache_dir is None:
+            cache_dir = os.environ.get('NP_STRUCT_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'np_struct'))
+
+        key = hashlib.sha1(content + str(_CACHE_VERSION).encode()).hexdigest()
+        cache_file = os.path.join(cache_dir, 'cheader_{}.json'.format(key))
+
+        if os.path.exists(cache_file):
+            with open(cache_file, 'r') as f:
+                specs = json.load(f)
+
+    if specs is None:
+        specs = parse_c_structs(content.decode())
+
+        if cache_file is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            # write to a temporary file first so other processes never read a partial cache
+            tmp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+            with open(tmp_file, 'w') as f:
+                json.dump(specs, f)
+            os.replace(tmp_file, cache_file)
+
+    return build_structs(specs, base=base, ptype_field=ptype_field, ptypes=ptypes, module=module, rename=rename)
+
+
+def _make_get_ptype(ptype_field: str):
+
+    def get_ptype(self):
+        return self[ptype_field]
+
+    return get_ptype
+
+
+def _tokenize(text: str) -> list:
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        number, word, punct = match.groups()
+
+        if number is not None:
+            tokens.append(int(number, 0))
+        elif word is not None:
+            tokens.append(word)
+        elif punct == '@':
+            # packing marker inserted by the preprocessor step
+            marker = re.match(r'pack(\d)', text[match.end():])
+            tokens.append('@pack' + marker.group(1))
+            pos = match.end() + marker.end()
+            continue
+        else:
+            tokens.append(punct)
+
+        pos = match.end()
+
+    return tokens
+
+
+def _eval_const(expr, defines: dict) -> int:
+    """
+    Evaluate an integer constant expression, i.e. an array length.
+    """
+    if isinstance(expr, (list, tuple)):
+        expr = ' '.join(str(t) for t in expr)
+
+    # strip integer suffixes
+    expr = re.sub(r'\b(0[xX][0-9a-fA-F]+|\d+)[uUlL]+\b', r'\1', expr)
+
+    def _eval(node):
+        if isinstance(node, ast.Expression):
+            return _eval(node.body)
+        if isinstance(node, ast.Constant) and isinstance(node.value, int):
+            return node.value
+        if isinstance(node, ast.Name) and node.id in defines:
+            return defines[node.id]
+        if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+            return _OPERATORS[type(node.op)](_eval(node.left), _eval(node.right))
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -_eval(node.operand)
+        raise CHeaderError('Unsupported constant expression: {}'.format(expr))
+
+    try:
+        return int(_eval(ast.parse(expr.strip(), mode='eval')))
+    except SyntaxError:
+        raise CHeaderError('Unsupported constant expression: {}'.format(expr))
+
+
+class _Parser(object):
+    """
+    Recursive descent parser for struct definitions.
+    """
+
+    def __init__(self, tokens: list, defines: dict):
+        self.tokens = tokens
+        self.defines = defines
+        self.pos = 0
+        self.packed = False
+        self.specs = []
+        # struct tag and typedef names that have been defined
+        self.names = {}
+        self.n_anonymous = 0
+
+    def peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else None
+
+    def next(self):
+        token = self.peek()
+        if token is None:
+            raise CHeaderError('Unexpected end of input')
+        self.pos += 1
+        return token
+
+    def expect(self, token):
+        found = self.next()
+        if found != token:
+            raise CHeaderError('Expected \'{}\', found \'{}\''.format(token, found))
+
+    def parse(self) -> list:
+        while self.peek() is not None:
+            token = self.peek()
+
+            if isinstance(token, str) and token.startswith('@pack'):
+                self.packed = token == '@pack1'
+                self.pos += 1
+
+            elif token == 'typedef' and self.peek(1) == 'struct':
+                self.pos += 2
+
+                # alias of a struct defined elsewhere, i.e. typedef struct foo foo_t;
+                if not self.is_definition():
+                    tag = self.next()
+                    if tag in self.names:
+                        spec = [s for s in self.specs if s['name'] == self.names[tag]][0]
+                        self.add_alias(spec, self.next())
+                    self.skip_statement()
+                    continue
+
+                spec = self.parse_struct()
+                # typedef names, there could be several (typedef struct {...} a_t, b_t;)
+                while self.peek() != ';':
+                    name = self.next()
+                    if name not in [',', '*']:
+                        self.add_alias(spec, name)
+                self.expect(';')
+
+            elif token == 'struct' and self.is_definition(1):
+                self.pos += 1
+                self.parse_struct()
+                self.skip_statement()
+
+            else:
+                # skip declarations we don't handle (function prototypes, enums, variables)
+                self.skip_statement()
+
+        return self.specs
+
+    def is_definition(self, offset=0) -> bool:
+        """
+        Returns True if the struct keyword before offset starts a definition, i.e. a brace appears before the end 
+        of the statement.
+        """
+        i = self.pos + offset
+        while i < len(self.tokens) and self.tokens[i] not in ['{', ';']:
+            i += 1
+        return i < len(self.tokens) and self.tokens[i] == '{'
+
+    def skip_statement(self):
+        # skip to the end of the current statement, including any braces
+        depth = 0
+        while self.peek() is not None:
+            token = self.next()
+            if token == '{':
+                depth += 1
+            elif token == '}':
+                depth -= 1
+            elif token == ';' and depth <= 0:
+                return
+
+    def skip_attribute(self) -> bool:
+        """
+        Skip __attribute__((...)), returns True if the attribute is packed.
+        """
+        packed = False
+        self.next()
+        depth = 0
+        while True:
+            token = self.next()
+            if token == '(':
+                depth += 1
+            elif token == ')':
+                depth -= 1
+                if depth == 0:
+                    return packed
+            elif token in ['packed', '__packed__']:
+                packed = True
+
+    def add_alias(self, spec: dict, name: str):
+        if name not in [spec['name']] + spec['aliases']:
+            spec['aliases'].append(name)
+        self.names[name] = spec['name']
+
+    def parse_struct(self) -> dict:
+        """
+        Parse a struct definition starting after the struct keyword.
+        """
+        packed = self.packed
+
+        if self.peek() == '__attribute__':
+            packed |= self.skip_attribute()
+
+        if self.peek() != '{':
+            name = self.next()
+        else:
+            name = '_anonymous{}'.format(self.n_anonymous)
+            self.n_anonymous += 1
+
+        self.expect('{')
+        fields = []
+        n_unnamed = 0
+
+        while self.peek() != '}':
+            field_type = self.parse_type()
+
+            while True:
+                if self.peek() == '*':
+                    raise CHeaderError('Pointer members are not supported ({})'.format(name))
+
+                # unnamed bit-fields are padding
+                named = self.peek() != ':'
+                if not named:
+                    field_name = '_reserved{}'.format(n_unnamed)
+                    n_unnamed += 1
+                else:
+                    field_name = self.next()
+
+                shape = []
+                while self.peek() == '[':
+                    self.next()
+                    expr = []
+                    while self.peek() != ']':
+                        expr.append(self.next())
+                    self.expect(']')
+                    shape.append(_eval_const(expr, self.defines))
+
+                bits = None
+                if self.peek() == ':':
+                    self.next()
+                    expr = []
+                    while self.peek() not in [',', ';']:
+                        expr.append(self.next())
+                    bits = _eval_const(expr, self.defines)
+
+                    if field_type in self.names or field_type.startswith('float'):
+                        raise CHeaderError('Bit-fields must be integer types ({}.{})'.format(name, field_name))
+
+                # zero width bit-fields only affect the layout, they don't become members
+                fields.append(dict(name=field_name, type=field_type, shape=shape, bits=bits, named=named))
+
+                if self.next() == ';':
+                    break
+
+        self.expect('}')
+
+        if self.peek() == '__attribute__':
+            packed |= self.skip_attribute()
+
+        if not any(f['bits'] != 0 for f in fields):
+            raise CHeaderError('Empty structures are not supported ({})'.format(name))
+
+        spec = dict(name=name, aliases=[], packed=packed, fields=fields)
+        self.names[name] = name
+        self.specs.append(spec)
+        return spec
+
+    def parse_type(self) -> str:
+        """
+        Parse a member type. Returns a numpy type name, or the name of a previously defined struct.
+        """
+        words = []
+        while self.peek() in ['const', 'volatile']:
+            self.next()
+
+        if self.peek() == 'struct':
+            self.next()
+            if self.peek() == '{' or self.peek(1) == '{':
+                # struct defined inside the member declaration
+                return self.parse_struct()['name']
+            tag = self.next()
+            if tag not in self.names:
+                raise CHeaderError('Unknown struct: {}'.format(tag))
+            return self.names[tag]
+
+        if self.peek() in ['union', 'enum']:
+            raise CHeaderError('{} members are not supported'.format(self.peek()))
+
+        if self.peek() in self.names:
+            return self.names[self.next()]
+
+        while self.peek() in _TYPE_WORDS:
+            words.append(self.next())
+
+        if not len(words):
+            words.append(self.next())
+
+        c_type = ' '.join(words)
+        # drop trailing int from "unsigned long long int" etc.
+        if c_type not in _C_TYPES and c_type.endswith(' int'):
+            c_type = c_type[:-4]
+
+        if c_type not in _C_TYPES:
+            raise CHeaderError('Unsupported type: {}'.format(c_type))
+
+        return _C_TYPES[c_type]
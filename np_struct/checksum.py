@@ -0,0 +1,192 @@
+import zlib
+import binascii
+import numpy as np
+
+
+class CRC(object):
+    """
+    Table-driven CRC over the rows of a 2D uint8 array. Small batches are computed one row at a time (with zlib or
+    binascii where the algorithm matches), large batches are computed one byte column at a time over all rows
+    with NumPy table lookups.
+
+    Parameters
+    ----------
+    width : int
+        width of the CRC in bits, 16 or 32.
+    poly : int
+        generator polynomial, in normal (MSB first) form.
+    init : int
+        initial register value.
+    reflected : bool
+        if True, bytes are processed LSB first and the result is reflected.
+    xorout : int
+        value XORed with the final register.
+    row_func : callable, optional
+        function(bytes, init) -> int that computes the CRC of one row, used for small batches.
+    """
+    # batches with fewer rows are computed row by row
+    MIN_VECTOR_ROWS = 64
+
+    def __init__(self, width: int, poly: int, init: int, reflected: bool, xorout: int, row_func=None):
+        self.width = width
+        self.poly = poly
+        self.init = init
+        self.reflected = reflected
+        self.xorout = xorout
+        self.dtype = np.dtype('<u{}'.format(width // 8))
+        self._row_func = row_func
+        self._table = None
+
+    @property
+    def table(self) -> list:
+        """
+        CRC of each byte value, built on first use.
+        """
+        if self._table is None:
+            self._table = self._build_table()
+        return self._table
+
+    def _build_table(self) -> list:
+        mask = (1 << self.width) - 1
+        table = []
+
+        if self.reflected:
+            rpoly = int('{:0{}b}'.format(self.poly, self.width)[::-1], 2)
+            for i in range(256):
+                c = i
+                for _ in range(8):
+                    c = (c >> 1) ^ rpoly if c & 1 else c >> 1
+                table.append(c)
+        else:
+            top = 1 << (self.width - 1)
+            for i in range(256):
+                c = i << (self.width - 8)
+                for _ in range(8):
+                    c = ((c << 1) ^ self.poly) & mask if c & top else (c << 1) & mask
+                table.append(c)
+
+        return table
+
+    def _crc_row(self, data) -> int:
+        # bytewise CRC of a single buffer, for algorithms without a C implementation
+        table = self.table
+        crc, mask, shift = self.init, (1 << self.width) - 1, self.width - 8
+        if self.reflected:
+            for b in bytes(data):
+                crc = table[(crc ^ b) & 0xFF] ^ (crc >> 8)
+        else:
+            for b in bytes(data):
+                crc = table[((crc >> shift) ^ b) & 0xFF] ^ ((crc << 8) & mask)
+        return crc ^ self.xorout
+
+    def __call__(self, data: np.ndarray) -> np.ndarray:
+        """
+        Returns the CRC of each row of data, a (N, L) uint8 array.
+        """
+        data = np.asarray(data, dtype=np.uint8)
+        if data.ndim == 1:
+            data = data[None]
+
+        if len(data) < self.MIN_VECTOR_ROWS:
+            if self._row_func is not None:
+                return np.array([self._row_func(row.tobytes(), self.init) for row in data], dtype=self.dtype)
+            return np.array([self._crc_row(row) for row in data], dtype=self.dtype)
+
+        # walk the byte columns, each step updates the CRC of every row. Columns are made contiguous first, and the
+        # registers are updated in place.
+        cols = np.asfortranarray(data)
+        table = np.array(self.table, dtype=np.uint32)
+        crc = np.full(len(data), self.init, dtype=np.uint32)
+        idx = np.empty(len(data), dtype=np.uint32)
+        lookup = np.empty(len(data), dtype=np.uint32)
+        mask, shift = (1 << self.width) - 1, self.width - 8
+
+        for j in range(cols.shape[1]):
+            if self.reflected:
+                np.bitwise_xor(crc, cols[:, j], out=idx)
+                idx &= 0xFF
+                crc >>= 8
+            else:
+                np.right_shift(crc, shift, out=idx)
+                idx ^= cols[:, j]
+                idx &= 0xFF
+                crc <<= 8
+                crc &= mask
+            np.take(table, idx, out=lookup)
+            crc ^= lookup
+
+        crc ^= self.xorout
+        return crc.astype(self.dtype)
+
+
+def _zlib_crc32(data: bytes, init: int) -> int:
+    # zlib applies the initial and final inversion itself
+    return zlib.crc32(data)
+
+
+# supported checksum algorithms
+CHECKSUMS = {
+    # CRC-16/CCITT-FALSE
+    'crc16': CRC(16, 0x1021, 0xFFFF, False, 0x0000, row_func=binascii.crc_hqx),
+    # CRC-16/MODBUS
+    'crc16-modbus': CRC(16, 0x8005, 0xFFFF, True, 0x0000),
+    # CRC-32 (zlib, Ethernet)
+    'crc32': CRC(32, 0x04C11DB7, 0xFFFFFFFF, True, 0xFFFFFFFF, row_func=_zlib_crc32),
+}
+
+
+class checksum(np.ndarray):
+    """
+    Checksum member of a structure, computed over a byte range of each record. Checksums are filled by
+    Struct.update_checksums() and checked by Struct.verify_checksums(). Packets fill them on pkt_write and verify
+    them on pkt_read.
+
+    Examples
+    --------
+    >>> class datapkt(Packet):
+    ...     hdr = pktheader(ptype=0x0C)
+    ...     samples = np.int16([0] * 16)
+    ...     crc = checksum('crc16')
+
+    Parameters
+    ----------
+    algorithm : {'crc16', 'crc16-modbus', 'crc32'}
+        checksum algorithm, 'crc16' is CRC-16/CCITT-FALSE.
+    start : int | str, default: 0
+        byte offset, or name of the first member, where the checksummed range starts.
+    stop : int | str, optional
+        byte offset, or name of the member, where the checksummed range ends (exclusive). Default is the start of
+        the checksum member, i.e. all bytes before it.
+    """
+
+    def __new__(cls, algorithm: str = 'crc32', start=0, stop=None):
+        if algorithm not in CHECKSUMS:
+            raise ValueError(
+                'Unknown checksum algorithm \'{}\', must be one of {}.'.format(algorithm, list(CHECKSUMS))
+            )
+
+        obj = np.zeros(1, dtype=CHECKSUMS[algorithm].dtype).view(cls)
+        obj.algorithm = algorithm
+        obj.start = start
+        obj.stop = stop
+        return obj
+
+    def __array_finalize__(self, obj):
+        self.algorithm = getattr(obj, 'algorithm', None)
+        self.start = getattr(obj, 'start', 0)
+        self.stop = getattr(obj, 'stop', None)
+
+    def byte_range(self, dtype: np.dtype, key: str) -> tuple:
+        """
+        Returns the (start, stop) byte offsets covered by the checksum member key in records of dtype.
+        """
+        def offset(ref):
+            return dtype.fields[ref][1] if isinstance(ref, str) else ref
+
+        return offset(self.start), offset(key if self.stop is None else self.stop)
+
+    def compute(self, data: np.ndarray) -> np.ndarray:
+        """
+        Returns the checksum of each row of data, a (N, L) uint8 array.
+        """
+        return CHECKSUMS[self.algorithm](data)
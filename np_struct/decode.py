@@ -0,0 +1,346 @@
+import os
+import re
+import mmap
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from . structures import _gather_bytes
+from . transfer import Packet, PacketTypeError, get_packet_table
+
+
+# bytes of the stream that are decoded as candidate headers at once by _walk
+_WINDOW = 1 << 16
+
+
+def _walk(buf, header: type, byte_order: str, start: int, stop: int, sync: bytes = None):
+    """
+    Yields the offset, class and size of each packet that starts in buf[start:stop], and the empty packet for
+    classes that are built by from_header (None for other classes). Packets are sized from their header. If sync
+    is given, every packet starts with it, and the walk skips ahead to the next sync word after bytes that are not
+    a known packet. Iteration stops at a packet that extends past the end of buf.
+    """
+    table = get_packet_table(header)
+    hdr = header(byte_order=byte_order)
+    hsize = hdr.get_size()
+    mv = memoryview(buf)
+    data = np.frombuffer(buf, dtype=np.uint8)
+
+    # fixed packet sizes indexed by packet type, 0 for unknown types and packets that are sized from the header
+    lut = table.lut or []
+    classes = lut + [None]
+    fixed = np.zeros(len(lut) + 1, dtype=np.int64)
+    for ptype, pkt_cls in enumerate(lut):
+        if pkt_cls is not None and not len(pkt_cls._var_fields) and (
+            pkt_cls.from_header.__func__ is Packet.from_header.__func__
+        ):
+            fixed[ptype] = pkt_cls._build_dtype({}, byte_order).itemsize
+
+    def step(pos):
+        # decode the packet at pos from its header, returns the next position and the packet
+        if sync is not None and mv[pos:pos + len(sync)] != sync:
+            pos = buf.find(sync, pos + 1)
+            return (len(buf) if pos < 0 else pos), None
+
+        hdr.unpack(mv[pos:pos + hsize])
+        pkt_cls = table.get(hdr.get_ptype().item())
+
+        if pkt_cls is None:
+            if sync is None:
+                raise PacketTypeError(
+                    'Packet type \'{}\' not recognized at offset {}.'.format(hdr.get_ptype().item(), pos)
+                )
+            pos = buf.find(sync, pos + 1)
+            return (len(buf) if pos < 0 else pos), None
+
+        pkt = None
+        if len(pkt_cls._var_fields):
+            size = pkt_cls._build_dtype(pkt_cls.var_shapes(hdr), byte_order).itemsize
+        elif pkt_cls.from_header.__func__ is not Packet.from_header.__func__:
+            pkt = pkt_cls.from_header(hdr, byte_order=byte_order or '<')
+            size = pkt.get_size()
+        else:
+            size = pkt_cls._build_dtype({}, byte_order).itemsize
+
+        return pos + size, (pos, pkt_cls, size, pkt)
+
+    pos = start
+    while pos < stop and pos + hsize <= len(buf):
+        # the header at every byte offset of a window is decoded with one strided view, so the type and size of
+        # fixed size packets are found without unpacking each header
+        w0, w1 = pos, min(pos + _WINDOW, stop, len(buf) - hsize + 1)
+        hdrs = np.ndarray((w1 - w0,), dtype=hdr.dtype, buffer=data, offset=w0, strides=(1,)).view(header)
+        ptypes = np.asarray(hdrs.get_ptype()).reshape(-1)
+
+        if ptypes.shape != (w1 - w0,) or ptypes.dtype.kind not in 'iu' or not len(lut):
+            # packet types that are not small integers are looked up one packet at a time
+            sizes = [0] * (w1 - w0)
+            types = sizes
+        else:
+            types = np.where((ptypes >= 0) & (ptypes < len(lut)), ptypes, len(lut))
+            sizes = fixed[types]
+            if sync is not None:
+                for i, b in enumerate(sync):
+                    sizes[data[w0 + i:w1 + i] != b] = 0
+            sizes, types = sizes.tolist(), types.tolist()
+
+        while pos < w1:
+            size = sizes[pos - w0]
+            if size:
+                if pos + size > len(buf):
+                    return
+                yield pos, classes[types[pos - w0]], size, None
+                pos += size
+                continue
+
+            # unknown types, packets that are sized from the header, and bytes between sync words
+            next_pos, item = step(pos)
+            if item is not None:
+                if next_pos > len(buf):
+                    return
+                yield item
+            pos = next_pos
+
+
+def _open(path):
+    # read-only map of the file, None if the file is empty
+    with open(path, 'rb') as f:
+        if not os.fstat(f.fileno()).st_size:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _decode_chunk(
+    path: str, header: type, byte_order: str, sync: bytes, start: int, stop: int, resync: bool = False
+) -> tuple:
+    """
+    Decodes the packets that start in a chunk of the file.
+
+    If resync is True, start is only a guess of where the first packet starts (i.e. a fixed split of the file). The
+    chunk is decoded from the first sync word at or after start, or without sync, from the first offset where the
+    packet headers can be walked to the end of the chunk without an unknown packet type. The guess can still be
+    wrong (i.e. a sync word inside a packet), see _join.
+
+    Returns the decoded parts keyed by packet class, the offset the walk started at, and the offset of the first
+    packet after the chunk. Each part is (packet offsets, packet sizes, packets). Fixed size packets are gathered
+    into one record array per class. Packets with variable length members are returned as a single byte stream per
+    class, and packets that are built by from_header as lists.
+    """
+    buf = _open(path)
+    data = np.frombuffer(buf, dtype=np.uint8)
+
+    if resync and sync is not None:
+        # sync words that start in the chunk
+        start = buf.find(sync, start, stop + len(sync) - 1)
+        start = stop if start < 0 else start
+
+    # offsets on chains of headers that led to an unknown packet type, the walk is not started from them again
+    bad = set()
+    while True:
+        found, end = {}, stop
+        try:
+            for pos, pkt_cls, size, pkt in _walk(buf, header, byte_order, start, stop, sync):
+                if pos in bad:
+                    raise PacketTypeError('Packet type not recognized after offset {}.'.format(pos))
+                found.setdefault(pkt_cls, ([], [], []))
+                found[pkt_cls][0].append(pos)
+                found[pkt_cls][1].append(size)
+                found[pkt_cls][2].append(pkt)
+                end = pos + size
+            break
+        except PacketTypeError:
+            if not resync or sync is not None:
+                raise
+            bad.add(start)
+            bad.update(pos for offsets, _, _ in found.values() for pos in offsets)
+            while start in bad:
+                start += 1
+            if start >= stop:
+                found, end = {}, stop
+                break
+
+    parts = {}
+    for pkt_cls, (pos, sizes, pkts) in found.items():
+        pos, sizes = np.array(pos, dtype=np.int64), np.array(sizes, dtype=np.int64)
+        if pkts[0] is not None:
+            for p, s, pkt in zip(pos, sizes, pkts):
+                pkt.unpack(data[p:p + s])
+            part = pkts
+        elif len(pkt_cls._var_fields):
+            part = np.concatenate([data[p:p + s] for p, s in zip(pos, sizes)])
+        else:
+            dtype = pkt_cls._build_dtype({}, byte_order)
+            part = np.empty(len(pos), dtype=dtype)
+            _gather_bytes(data, pos, dtype.itemsize, part.view(np.uint8).reshape(len(pos), -1))
+        parts[pkt_cls] = (pos, sizes, part)
+
+    return parts, start, max(end, stop)
+
+
+def _trim(parts: dict, offset: int) -> dict:
+    # drop the packets that start before offset
+    ret = {}
+    for pkt_cls, (pos, sizes, part) in parts.items():
+        n = np.searchsorted(pos, offset)
+        if n == len(pos):
+            continue
+        if isinstance(part, list) or not len(pkt_cls._var_fields):
+            part = part[n:]
+        else:
+            part = part[sizes[:n].sum():]
+        ret[pkt_cls] = (pos[n:], sizes[n:], part)
+    return ret
+
+
+def _join(buf, args: tuple, end: int, parts: dict, first: int, chunk_end: int) -> tuple:
+    """
+    Joins a chunk decoded from a guessed start to the end of the previous chunk, returns the packets of the chunk
+    that are on the packet chain of the stream, and the offset of the first packet after the chunk.
+
+    The chunk is correct if it was decoded from the end of the previous chunk. Otherwise the headers are walked from
+    the end of the previous chunk until they reach a packet of the chunk, and the chunk is trimmed to start at that
+    packet. The few packets in between are decoded here. The whole chunk is only decoded again if the walks don't
+    meet.
+    """
+    path, header, byte_order, sync, start, stop, _ = args
+    if end >= stop:
+        # the previous chunk ended after this one
+        return [], end
+    # bytes before the first sync word of a chunk are skipped
+    if end == first or (sync is not None and end <= first):
+        return [parts], chunk_end
+
+    offsets = np.sort(np.concatenate([pos for pos, _, _ in parts.values()] + [np.zeros(0, dtype=np.int64)]))
+    meet = stop
+    for pos, _, _, _ in _walk(buf, header, byte_order, end, stop, sync):
+        i = np.searchsorted(offsets, pos)
+        if i < len(offsets) and offsets[i] == pos:
+            meet = pos
+            break
+
+    if meet == end:
+        return [_trim(parts, meet)], chunk_end
+
+    fixed, _, fixed_end = _decode_chunk(path, header, byte_order, sync, end, meet)
+    if meet == stop:
+        return [fixed], fixed_end
+    return [fixed, _trim(parts, meet)], chunk_end
+
+
+def _file_name(pkt_cls: type, used: set) -> str:
+    # unique file name of the records of a class in out_dir
+    name = re.sub(r'[^\w.]', '_', '{}.{}'.format(pkt_cls.__module__, pkt_cls.__qualname__))
+    unique, i = name, 1
+    while unique in used:
+        unique, i = '{}_{}'.format(name, i), i + 1
+    used.add(unique)
+    return unique + '.bin'
+
+
+def decode_file(
+    path,
+    header: type,
+    workers: int = None,
+    sync: bytes = None,
+    chunk_size: int = 1 << 24,
+    byte_order: str = None,
+    out_dir: str = None
+) -> dict:
+    """
+    Decodes a raw stream of packets with mixed types (i.e. read from a serial port or socket and written to disk)
+    into arrays of each packet class registered with header.
+
+    The file is split into chunks of chunk_size bytes, and chunks are decoded in a process pool. Each worker finds
+    the first packet of its chunk: the first sync word (i.e. a constant start-of-packet field in the header), or
+    without sync, the first offset where the packet headers can be walked to the end of the chunk. Chunks are then
+    joined to the end of the previous chunk in stream order. A chunk that started inside a packet (i.e. at a sync
+    word in a payload) is trimmed to the first packet that is also reached from the end of the previous chunk,
+    so only the packets in between are decoded again.
+
+    Examples
+    --------
+    >>> pkts = decode_file('stream.bin', pktheader, workers=8, sync=b'\\xAA\\x55')
+    >>> pkts[datapkt].samples
+
+    Parameters
+    ----------
+    path : str | Path
+        path of the stream.
+    header : type
+        packet header class. Packet classes must be defined at the top level of a module, so that the worker
+        processes can find them.
+    workers : int, optional
+        number of worker processes. Default is the number of CPUs, chunks are decoded in this process if 1.
+    sync : bytes, optional
+        bytes that every packet starts with. Bytes between packets that don't start with sync or have an unknown
+        type are skipped. If None, the stream must only hold packets of known types.
+    chunk_size : int, default: 16MB
+        size of the chunks in bytes.
+    byte_order : str, optional
+        byte order of the stream, '<' or '>'. Default is the byte order of the class definitions.
+    out_dir : str, optional
+        if given, records of fixed size packets are written to out_dir/<module>.<class qualname>.bin as they are
+        decoded and returned memory mapped, so the decoded records don't have to fit in memory. Files are
+        RecordFile compatible.
+
+    Returns
+    -------
+    dict
+        decoded packets keyed by packet class, in stream order. Values are record arrays for fixed size packets,
+        dictionaries of record arrays keyed by member lengths for packets with variable length members (see
+        Struct.frombuffer), and lists of packets for packets that are sized by from_header.
+    """
+    path = str(path)
+    size = os.path.getsize(path)
+    if not size:
+        return {}
+
+    starts = list(range(0, size, chunk_size))
+    stops = starts[1:] + [size]
+    # the first chunk starts at the start of the stream unless packets start with a sync word
+    args = [
+        (path, header, byte_order, sync, s0, s1, i > 0 or sync is not None)
+        for i, (s0, s1) in enumerate(zip(starts, stops))
+    ]
+
+    workers = os.cpu_count() if workers is None else workers
+    if workers > 1 and len(args) > 1:
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(args)))
+        results = pool.map(_decode_chunk, *zip(*args))
+    else:
+        pool = None
+        results = (_decode_chunk(*a) for a in args)
+
+    buf = _open(path)
+    records, streams, pkts, files, names = {}, {}, {}, {}, set()
+    try:
+        end = 0
+        for a, (parts, first, chunk_end) in zip(args, results):
+            joined, end = _join(buf, a, end, parts, first, chunk_end)
+
+            for pkt_cls, (_, _, part) in ((k, v) for p in joined for k, v in p.items()):
+                if isinstance(part, list):
+                    pkts.setdefault(pkt_cls, []).extend(part)
+                elif len(pkt_cls._var_fields):
+                    streams.setdefault(pkt_cls, []).append(part)
+                elif out_dir is not None:
+                    if pkt_cls not in files:
+                        files[pkt_cls] = open(os.path.join(out_dir, _file_name(pkt_cls, names)), 'wb')
+                    files[pkt_cls].write(part.tobytes())
+                else:
+                    records.setdefault(pkt_cls, []).append(part)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        for f in files.values():
+            f.close()
+        # the map is closed when it's released, views of it may still be held by the header walk
+        del buf
+
+    ret = {}
+    for pkt_cls, parts in records.items():
+        ret[pkt_cls] = np.concatenate(parts).view(pkt_cls)
+    for pkt_cls, f in files.items():
+        ret[pkt_cls] = pkt_cls.frombuffer(np.memmap(f.name, dtype=np.uint8, mode='r'), byte_order=byte_order)
+    for pkt_cls, parts in streams.items():
+        ret[pkt_cls] = pkt_cls.frombuffer(np.concatenate(parts), byte_order=byte_order)
+    ret.update(pkts)
+    return ret
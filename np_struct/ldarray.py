@@ -7,6 +7,9 @@ from copy import deepcopy as dcopy
 import datetime
 from itertools import chain
 from typing import TYPE_CHECKING
+import re
+import reprlib
+from numpy.lib.stride_tricks import sliding_window_view
 
 def check_shapes(a: tuple, b: tuple):
     """ 
@@ -27,12 +30,12 @@ def datetime_idx_handler(v: datetime.datetime, coords: np.ndarray):
     # convert coords to timestamp.
     coords_ts = np.array([v.timestamp() for v in coords])
 
+    # get timestamp from datetime selections. datetime is a subclass of date so it must be checked first.
+    if isinstance(v, datetime.datetime):
+        v_ts = v.timestamp()
     # cast date selection coords to datetime, then get timestamp
-    if isinstance(v, datetime.date):
+    elif isinstance(v, datetime.date):
         v_ts = dt.datetime(year=v.year, month=v.month, day=v.day).timestamp()
-    # get timestamp from datetime selections
-    elif isinstance(v, datetime.datetime):
-        v_ts = v.timestamp()
     # if str, treat as UTC formatted string, use same format as is printed with the ldarray __str__ method.
     elif isinstance(v, str):
         v_ts = datetime.datetime.strptime(v, '%Y-%m-%dT%H:%M').timestamp()
@@ -64,6 +67,35 @@ def float_idx_handler(v: float, coords: np.ndarray, precision: float):
     return lmin_arg
 
 
+def _ldarray_from_pickle(cls, data: np.ndarray, coords: tuple, attrs: dict):
+    """
+    Rebuild a pickled ldarray, see ldarray.__reduce_ex__
+    """
+    if coords is None:
+        return data.view(cls)
+
+    values, idx_precision, idx_handlers = coords
+    return cls(data, coords=Coords(**values, idx_precision=idx_precision, idx_handlers=idx_handlers), attrs=attrs)
+
+
+# plain ndarray subclass used to format ldarray data, numpy uses the class name as the repr prefix
+_ldarray_repr = type("ldarray", (np.ndarray,), {})
+
+# bounded repr of attribute values, formats at most a few items of large containers
+_attr_repr = reprlib.Repr()
+_attr_repr.maxstring = 40
+_attr_repr.maxother = 40
+
+
+def _coord_repr_values(v: np.ndarray) -> np.ndarray:
+    """
+    Cast datetime coordinates to numpy datetimes for printing.
+    """
+    if len(v) and isinstance(v[0], datetime.datetime):
+        return np.array(v).astype('datetime64[m]')
+    return v
+
+
 class Coords(OrderedDict):
     """ 
     Labeled dimension coordinates for ldarray. Conditions values to work as indices, but otherwise, same as 
@@ -179,7 +211,7 @@ class Coords(OrderedDict):
 
         elif isinstance(v_1d[0], (datetime.datetime, datetime.date)):
             # cast dates (only day/month/year) to more general datetime objects
-            if isinstance(v_1d[0], datetime.date):
+            if not isinstance(v_1d[0], datetime.datetime):
                 v_1d = np.array([dt.datetime(year=d.year, month=d.month, day=d.day) for d in v])
 
             # use index handler for datetime objects
@@ -523,6 +555,21 @@ class ldarray(np.ndarray):
     def __deepcopy__(self, memo):
         return self.__copy__()
 
+    def __reduce_ex__(self, protocol):
+        # ndarray subclasses are pickled by copying the data to bytes, and the coordinates are dropped. Pickle the 
+        # data as a base ndarray instead, which supports out-of-band buffers with protocol 5. Coordinates are 
+        # pickled as plain arrays and rebuilt when loaded.
+        if self.coords is None:
+            coords = None
+        else:
+            coords = (
+                {k: np.asarray(v) for k, v in self.coords.items()}, 
+                dict(self.coords.idx_precision),
+                dict(self.coords.idx_handlers)
+            )
+
+        return (_ldarray_from_pickle, (type(self), self.view(np.ndarray), coords, dict(self.attrs)))
+
 
     def sel(self, **keys):
         return self[keys]
@@ -655,8 +702,15 @@ class ldarray(np.ndarray):
         LEN_THRESHOLD = 7
         MAX_N_ATTRS = 7
         MAX_LEN_ATTRS = 30
+        EDGE_ITEMS = 2
+
+        # format the data as a plain ndarray subclass. Formatting indexes the array several times, which is slow 
+        # for ldarrays since each index also indexes the coordinates.
+        s = np.array_repr(self.view(_ldarray_repr))
 
-        s = super().__repr__()
+        # large arrays are summarized by numpy, lead with the size of the full array
+        if self.size > np.get_printoptions()["threshold"]:
+            s = "ldarray: {}, {}, {:.3g} MB\n".format(self.shape, self.dtype, self.nbytes / 1e6) + s
 
         if self.coords is None:
             return s
@@ -665,10 +719,16 @@ class ldarray(np.ndarray):
         s+='\nCoordinates: ' + str(self.shape)
         for k, v in self.coords.items():
 
-            if isinstance(v[0], datetime.datetime):
-                v = np.array(v).astype('datetime64[m]')
-            if isinstance(v, np.ndarray):
-                v_str = np.array2string(v, threshold=LEN_THRESHOLD, suppress_small=True, edgeitems=2, prefix="  ")
+            if isinstance(v, np.ndarray) and len(v) > LEN_THRESHOLD:
+                # only format the values that are printed
+                v_start = _coord_repr_values(v[:EDGE_ITEMS])
+                v_end = _coord_repr_values(v[-EDGE_ITEMS:])
+
+                v_str = np.array2string(v_start, suppress_small=True, prefix="  ")[:-1] + " ... " 
+                v_str += np.array2string(v_end, suppress_small=True, prefix="  ")[1:]
+
+            elif isinstance(v, np.ndarray):
+                v_str = np.array2string(_coord_repr_values(v), suppress_small=True, prefix="  ")
             else:
                 # abbreviate long coordinate lists
                 if len(v) > LEN_THRESHOLD:
@@ -685,7 +745,14 @@ class ldarray(np.ndarray):
             s += "\nAttributes: "
 
             for k, v in tuple(self.attrs.items())[:MAX_N_ATTRS]:
-                v = str(v)
+                # limit the number of items formatted in large attributes
+                if isinstance(v, str):
+                    v = v[:MAX_LEN_ATTRS + 1]
+                elif isinstance(v, np.ndarray):
+                    v = np.array2string(v, threshold=LEN_THRESHOLD, edgeitems=EDGE_ITEMS)
+                else:
+                    v = _attr_repr.repr(v)
+
                 v = v.replace("\n", "\\n").replace("\r", "\\r")
                 v = v[:MAX_LEN_ATTRS] + "..." if len(v) > MAX_LEN_ATTRS else v
                 # remove newline characters before printing
@@ -1097,6 +1164,468 @@ class ldarray(np.ndarray):
 
         return ldarray(super().transpose(order_idx), coords=coords)
 
-            
-            
+    def groupby(self, dim: str, bins=None, labels=None):
+        """
+        Group the array along a labeled dimension by coordinate value. Group indices are computed once from the 
+        coordinate vector, reductions on the returned GroupBy object are applied to all groups at once.
+
+        Parameters
+        ----------
+        dim : str
+            name of the dimension to group.
+        bins : int | array_like, optional
+            monotonically increasing bin edges. Coordinates ``bins[i] <= c < bins[i + 1]`` fall in group i, values
+            outside of the edges are dropped. If an integer, the coordinate range is split into that many equal 
+            width bins. If not provided, each unique coordinate value is a group.
+        labels : array_like, optional
+            coordinate labels of each bin. Defaults to the left bin edges.
+
+        Examples
+        --------
+        >>> ld = ldarray(np.arange(6), coords=dict(f=[1., 4., 9., 12., 15., 31.]))
+        >>> ld.groupby("f", bins=[0, 10, 20, 30, 40]).mean()
+        ldarray([1. , 3.5, 5. ])
+        Coordinates: (3,)
+          f: [ 0 10 30]
 
+        Returns
+        -------
+        GroupBy
+        """
+        coords_k = self._dim_coords(dim)
+
+        if bins is None:
+            labels, group_idx = np.unique(coords_k, return_inverse=True)
+            return GroupBy(self, dim, group_idx.ravel(), labels)
+
+        is_datetime = isinstance(coords_k[0], (datetime.date, np.datetime64))
+        # keep the same coordinate type as the original array in the labels
+        as_object = isinstance(coords_k[0], datetime.date)
+        if is_datetime:
+            # bin datetimes as integer microseconds, the same as resample
+            coords_k = np.asarray(coords_k, dtype="datetime64[us]").astype(np.int64)
+
+        if isinstance(bins, (int, np.integer)):
+            if is_datetime:
+                bins = np.linspace(np.min(coords_k), np.max(coords_k), bins + 1).astype(np.int64)
+                # include the maximum coordinate value in the last bin
+                bins[-1] += 1
+            else:
+                bins = np.linspace(np.min(coords_k), np.max(coords_k), bins + 1)
+                bins[-1] = np.nextafter(bins[-1], np.inf)
+        elif is_datetime:
+            bins = np.asarray(bins, dtype="datetime64[us]").astype(np.int64)
+
+        bins = np.asarray(bins)
+        if labels is None and is_datetime:
+            labels = bins[:-1].astype("datetime64[us]").astype(object if as_object else "datetime64[us]")
+        elif labels is None:
+            labels = bins[:-1]
+        labels = np.asarray(labels)
+
+        if len(labels) != len(bins) - 1:
+            raise ValueError(f"Expected {len(bins) - 1} bin labels, got {len(labels)}.")
+
+        # np.digitize returns 0 for values below the first edge, shift so the first bin is group 0.
+        group_idx = np.digitize(coords_k, bins) - 1
+        return GroupBy(self, dim, group_idx, labels)
+
+    def resample(self, **freq):
+        """
+        Group the array into regular intervals along a single dimension. Datetime dimensions accept frequency
+        strings such as "15min", "1h" or "1d", numeric dimensions accept the interval width. Intervals are aligned 
+        to whole multiples of the frequency and labeled with their start value.
+
+        Examples
+        --------
+        >>> time = [dt.datetime(2024, 1, 1) + dt.timedelta(minutes=20 * i) for i in range(6)]
+        >>> ld = ldarray(np.arange(6), coords=dict(time=time))
+        >>> ld.resample(time="1h").sum()
+        ldarray([ 3, 12])
+        Coordinates: (2,)
+          time: ['2024-01-01T00:00' '2024-01-01T01:00']
+
+        Returns
+        -------
+        GroupBy
+        """
+        if len(freq) != 1:
+            raise ValueError("resample() accepts a single dimension and frequency, e.g. resample(time=\"1h\").")
+
+        dim, step = next(iter(freq.items()))
+        coords_k = self._dim_coords(dim)
+
+        is_datetime = isinstance(coords_k[0], (datetime.date, np.datetime64))
+
+        if is_datetime:
+            # cast to a fixed unit so the interval arithmetic is integer math on the whole coordinate vector
+            values = np.asarray(coords_k, dtype="datetime64[us]").astype(np.int64)
+            step = int(_parse_freq(step) / np.timedelta64(1, "us"))
+        elif isinstance(step, str):
+            raise ValueError(f"Frequency strings are only supported for datetime dimensions, got '{step}'.")
+        else:
+            values = np.asarray(coords_k)
+
+        # interval number of each coordinate, relative to the first interval that holds data
+        bin_n = np.floor_divide(values, step)
+        group_idx = (bin_n - np.min(bin_n)).astype(np.intp)
+
+        labels = (np.arange(np.max(group_idx) + 1) + np.min(bin_n)) * step
+
+        if is_datetime:
+            labels = labels.astype("datetime64[us]")
+            # keep the same coordinate type as the original array
+            if isinstance(coords_k[0], datetime.date):
+                labels = labels.astype(object)
+
+        return GroupBy(self, dim, group_idx, labels)
+
+    def rolling(self, center: bool = False, chunk_size: int = None, **window):
+        """
+        Moving window along a single labeled dimension. The returned Rolling object supports mean(), sum(), max() 
+        and min(); results have the same shape and coordinates as this array, positions without a full window 
+        are NaN.
+
+        Windows are computed with cumulative sums or strided sliding window views. The rolled dimension is 
+        processed in blocks of ``chunk_size`` so arrays backed by np.memmap are streamed from disk instead of being
+        loaded all at once.
+
+        Parameters
+        ----------
+        center : bool, default: False
+            If True, each window is labeled by the coordinate at its center. Otherwise windows are labeled by their
+            last coordinate.
+        chunk_size : int, optional
+            number of positions along the rolled dimension processed at a time. Defaults to blocks of about 
+            64 MB.
+        **window
+            dimension name and window length, e.g. ``rolling(time=5)``.
+
+        Examples
+        --------
+        >>> ld = ldarray([1, 2, 3, 4, 5], coords=dict(t=[0, 1, 2, 3, 4]))
+        >>> ld.rolling(t=3).mean()
+        ldarray([nan, nan,  2.,  3.,  4.])
+        Coordinates: (5,)
+          t: [0 1 2 3 4]
+
+        Returns
+        -------
+        Rolling
+        """
+        if len(window) != 1:
+            raise ValueError("rolling() accepts a single dimension and window length, e.g. rolling(time=5).")
+
+        dim, length = next(iter(window.items()))
+        self._dim_coords(dim)
+
+        return Rolling(self, dim, int(length), center=center, chunk_size=chunk_size)
+
+    def to_shared(self):
+        """
+        Copy the array into shared memory so other processes can use it without copying the data. 
+        
+        Returns a picklable SharedArrayHandle, the array is opened in other processes with 
+        ``ldarray.from_shared(handle)``. The calling process owns the shared memory and must release it with 
+        ``handle.unlink()``, or by using the handle as a context manager.
+
+        Examples
+        --------
+        >>> with ld.to_shared() as handle:
+        ...     with multiprocessing.Pool(4) as pool:
+        ...         pool.map(func, [handle] * 4)
+
+        Returns
+        -------
+        SharedArrayHandle
+        """
+        from . shared import SharedArrayHandle
+        return SharedArrayHandle.create(self)
+
+    @classmethod
+    def from_shared(cls, handle):
+        """
+        Returns an ldarray that uses the shared memory buffer referenced by handle. Changes to the data are visible
+        to all processes using the same buffer.
+
+        Parameters
+        ----------
+        handle : SharedArrayHandle
+            handle returned by ``ldarray.to_shared()``
+        """
+        data = handle.attach()
+
+        if handle.coords is None:
+            return data.view(cls)
+
+        coords = Coords(
+            **handle.coords, 
+            idx_precision=dict(handle.idx_precision), 
+            idx_handlers=dict(getattr(handle, 'idx_handlers', {}))
+        )
+        return cls(data, coords=coords, attrs=handle.attrs)
+
+    def parallel_map(self, func, dim: str, processes: int = None, chunks: int = None):
+        """
+        Split the array along a labeled dimension and apply func to each part in a process pool. The array is 
+        placed in shared memory once, workers receive the coordinates when they start and only the index of their
+        part with each task. See ``np_struct.shared.parallel_map()``.
+
+        Examples
+        --------
+        >>> def detrend(part):
+        ...     return part - part.mean()
+
+        >>> ld.parallel_map(detrend, dim="channel", processes=4)
+        """
+        from . shared import parallel_map
+        return parallel_map(self, func, dim, processes=processes, chunks=chunks)
+
+    def _dim_coords(self, dim: str) -> np.ndarray:
+        """
+        Returns the coordinate vector of dimension dim, raises an error if the array does not have the dimension.
+        """
+        if self.coords is None or dim not in self.coords.keys():
+            raise ValueError(f"Array does not have a labeled dimension '{dim}'.")
+
+        return self.coords[dim]
+
+
+def _parse_freq(freq) -> np.timedelta64:
+    """
+    Convert a frequency string (e.g. "1h", "15min", "2d") or timedelta to a numpy timedelta.
+    """
+    if isinstance(freq, (datetime.timedelta, np.timedelta64)):
+        return np.timedelta64(freq).astype("timedelta64[us]")
+
+    # units are case sensitive. "m" and "M" are rejected, they mean minutes or months depending on the library.
+    units = {
+        "us": "us", "ms": "ms", "s": "s", "S": "s", "sec": "s", "min": "m", "T": "m", "h": "h", "H": "h", 
+        "hr": "h", "d": "D", "D": "D", "day": "D", "w": "W", "W": "W", "week": "W"
+    }
+
+    match = re.fullmatch(r"\s*(\d*)\s*([a-zA-Z]+)\s*", str(freq))
+    unit = units.get(match.group(2)) if match else None
+
+    if match and match.group(2) in ("m", "M"):
+        raise ValueError(f"Ambiguous frequency '{freq}', use 'min' for minutes. Months are not supported.")
+    if unit is None:
+        raise ValueError(f"Unrecognized frequency: {freq}")
+
+    n = int(match.group(1)) if match.group(1) else 1
+    return np.timedelta64(n, unit).astype("timedelta64[us]")
+
+
+class GroupBy(object):
+    """
+    Groups of an ldarray along one dimension, returned by ``ldarray.groupby()`` and ``ldarray.resample()``.
+
+    Reductions are computed for all groups at once with segmented ufunc reductions (``np.add.reduceat``). The 
+    result is a ldarray where the grouped dimension is labeled by the group coordinates. Groups without any 
+    data are not included in the result.
+    """
+
+    def __init__(self, obj: ldarray, dim: str, group_idx: np.ndarray, labels: np.ndarray):
+
+        self.obj = obj
+        self.dim = dim
+        self.axis = obj.coords.index(dim)
+
+        group_idx = np.asarray(group_idx)
+        # drop values that don't fall in any group
+        valid = (group_idx >= 0) & (group_idx < len(labels))
+
+        # order the dimension so each group is contiguous. Coordinates are usually sorted already, in which case
+        # the data is reduced in place without reordering.
+        if np.all(valid) and np.all(group_idx[1:] >= group_idx[:-1]):
+            self._order = None
+            sorted_idx = group_idx
+        else:
+            order = np.flatnonzero(valid)
+            order = order[np.argsort(group_idx[order], kind="stable")]
+            self._order = order
+            sorted_idx = group_idx[order]
+
+        # start index of each segment, and the group it belongs to
+        if len(sorted_idx):
+            self._starts = np.flatnonzero(np.r_[True, sorted_idx[1:] != sorted_idx[:-1]])
+        else:
+            self._starts = np.array([], dtype=np.intp)
+
+        self._counts = np.diff(np.r_[self._starts, len(sorted_idx)])
+        self.groups = sorted_idx[self._starts]
+        self.labels = np.asarray(labels)[self.groups]
+
+    def __len__(self):
+        return len(self.groups)
+
+    def __iter__(self):
+        # yield each group label and the data in the group
+        data = self._data()
+        for label, start, count in zip(self.labels, self._starts, self._counts):
+            idx = [slice(None)] * data.ndim
+            idx[self.axis] = slice(start, start + count)
+            yield label, data[tuple(idx)]
+
+    def _data(self) -> ldarray:
+        # contiguous groups along the grouped axis
+        if self._order is None:
+            return self.obj
+        return self.obj[(slice(None),) * self.axis + (self._order,)]
+
+    def _reduce(self, ufunc: np.ufunc, dtype=None) -> ldarray:
+        """
+        Apply a segmented reduction of ufunc over each group.
+        """
+        data = self._data().view(np.ndarray)
+
+        if len(self._starts):
+            result = ufunc.reduceat(data, self._starts, axis=self.axis, dtype=dtype)
+        else:
+            shape = list(data.shape)
+            shape[self.axis] = 0
+            result = np.zeros(shape, dtype=dtype or data.dtype)
+
+        return self._wrap(result)
+
+    def _wrap(self, result: np.ndarray) -> ldarray:
+        # replace the grouped dimension coordinates with the group labels
+        coords = {k: (self.labels if k == self.dim else v) for k, v in self.obj.coords.items()}
+        return ldarray(result, coords=coords, attrs=self.obj.attrs)
+
+    def _count_shape(self) -> tuple:
+        # shape that broadcasts the group counts along the grouped axis
+        shape = [1] * self.obj.ndim
+        shape[self.axis] = len(self._counts)
+        return tuple(shape)
+
+    def sum(self) -> ldarray:
+        """ Sum of each group """
+        return self._reduce(np.add)
+
+    def mean(self) -> ldarray:
+        """ Mean of each group """
+        dtype = np.result_type(self.obj.dtype, np.float64)
+        total = self._reduce(np.add, dtype=dtype).view(np.ndarray)
+        return self._wrap(total / self._counts.reshape(self._count_shape()))
+
+    def max(self) -> ldarray:
+        """ Maximum value of each group """
+        return self._reduce(np.maximum)
+
+    def min(self) -> ldarray:
+        """ Minimum value of each group """
+        return self._reduce(np.minimum)
+
+    def count(self) -> ldarray:
+        """ Number of values in each group """
+        shape = list(self.obj.shape)
+        shape[self.axis] = len(self._counts)
+        return self._wrap(np.broadcast_to(self._counts.reshape(self._count_shape()), shape).copy())
+
+
+class Rolling(object):
+    """
+    Moving window along one dimension of an ldarray, returned by ``ldarray.rolling()``.
+    """
+    # approximate size of each block read from the source array
+    CHUNK_BYTES = 64 * 2**20
+
+    def __init__(self, obj: ldarray, dim: str, window: int, center: bool = False, chunk_size: int = None):
+
+        if window < 1:
+            raise ValueError(f"Window length must be at least 1, got {window}.")
+
+        self.obj = obj
+        self.dim = dim
+        self.axis = obj.coords.index(dim)
+        self.window = window
+        self.center = center
+
+        if chunk_size is None:
+            # bytes in a single position along the rolled dimension
+            row_bytes = max(obj.itemsize * obj.size // max(obj.shape[self.axis], 1), 1)
+            chunk_size = max(self.CHUNK_BYTES // row_bytes, 1)
+
+        self.chunk_size = int(chunk_size)
+
+    def _apply(self, func, out: np.ndarray = None) -> ldarray:
+        """
+        Apply func to blocks of the source array. func accepts a block with the rolled dimension last and returns
+        the value of each full window in the block.
+        """
+        w = self.window
+        # move the rolled dimension to the end, these are views and do not copy the data
+        data = np.moveaxis(self.obj.view(np.ndarray), self.axis, -1)
+        n = data.shape[-1]
+
+        dtype = np.result_type(data.dtype, np.float64)
+
+        if out is None:
+            out = np.empty(self.obj.shape, dtype=dtype)
+        elif out.shape != self.obj.shape:
+            raise ValueError(f"Output shape {out.shape} does not match array shape {self.obj.shape}.")
+
+        result = np.moveaxis(out, self.axis, -1)
+
+        # windows are labeled by their last position, or shifted back to the center position
+        shift = (w - 1) // 2 if self.center else 0
+
+        # positions without a full window
+        result[..., :w - 1 - shift] = np.nan
+        result[..., max(n - shift, 0):] = np.nan
+
+        # start is the last position of the first window in each block. Blocks overlap by the window length.
+        for start in range(w - 1, n, self.chunk_size):
+            stop = min(start + self.chunk_size, n)
+            block = np.asarray(data[..., start - w + 1: stop], dtype=dtype)
+            result[..., start - shift: stop - shift] = func(block)
+
+        return ldarray(out, coords=dcopy(self.obj.coords), attrs=self.obj.attrs)
+
+    def _window_sum(self, block: np.ndarray) -> np.ndarray:
+        # the block is split into segments of one window length. Each window covers the end of one segment and the
+        # start of the next, so its sum is a suffix sum plus a prefix sum. Sums never run longer than a window, so
+        # non-finite values only reach the windows that contain them and rounding error doesn't grow with the block.
+        w = self.window
+        n = block.shape[-1]
+        nseg = -(-n // w)
+
+        seg = np.zeros(block.shape[:-1] + (nseg * w,), dtype=block.dtype)
+        seg[..., :n] = block
+        seg = seg.reshape(block.shape[:-1] + (nseg, w))
+
+        prefix = np.cumsum(seg, axis=-1).reshape(block.shape[:-1] + (-1,))
+        suffix = np.cumsum(seg[..., ::-1], axis=-1)[..., ::-1].reshape(block.shape[:-1] + (-1,))
+        # windows that start at a segment are the whole segment, given by the prefix sum alone
+        suffix[..., ::w] = 0
+
+        wsum = prefix[..., w - 1:n]
+        wsum += suffix[..., :n - w + 1]
+        return wsum
+
+    def sum(self, out: np.ndarray = None) -> ldarray:
+        """ 
+        Sum of each window. An output array with the same shape (i.e. a np.memmap) can be provided with ``out``. 
+        """
+        return self._apply(self._window_sum, out)
+
+    def mean(self, out: np.ndarray = None) -> ldarray:
+        """ 
+        Mean of each window. An output array with the same shape (i.e. a np.memmap) can be provided with ``out``. 
+        """
+        return self._apply(lambda b: self._window_sum(b) / self.window, out)
+
+    def max(self, out: np.ndarray = None) -> ldarray:
+        """ 
+        Maximum of each window. An output array with the same shape (i.e. a np.memmap) can be provided with 
+        ``out``. 
+        """
+        return self._apply(lambda b: sliding_window_view(b, self.window, axis=-1).max(axis=-1), out)
+
+    def min(self, out: np.ndarray = None) -> ldarray:
+        """ 
+        Minimum of each window. An output array with the same shape (i.e. a np.memmap) can be provided with 
+        ``out``. 
+        """
+        return self._apply(lambda b: sliding_window_view(b, self.window, axis=-1).min(axis=-1), out)
@@ -0,0 +1,234 @@
+import io
+import ast
+import tokenize
+import numpy as np
+from functools import lru_cache
+
+_COMPARE = {
+    ast.Eq: np.equal, ast.NotEq: np.not_equal, ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater,
+    ast.GtE: np.greater_equal
+}
+
+_BINARY = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide,
+    ast.FloorDiv: np.floor_divide, ast.Mod: np.mod
+}
+
+# &, | and ~ combine conditions with the precedence of 'and', 'or' and 'not' (as in pandas.DataFrame.query), so
+# 'hdr.ptype == 3 & state1 > 5' is not parsed as a chained comparison with (3 & state1)
+_LOGICAL_TOKENS = {'&': 'and', '|': 'or', '~': 'not'}
+
+
+def _rewrite_tokens(expr: str) -> str:
+    tokens = []
+    for tok in tokenize.generate_tokens(io.StringIO(expr).readline):
+        if tok.type == tokenize.OP and tok.string in _LOGICAL_TOKENS:
+            tokens.append((tokenize.NAME, _LOGICAL_TOKENS[tok.string]))
+        else:
+            tokens.append((tok.type, tok.string))
+    return tokenize.untokenize(tokens)
+
+
+class Query(object):
+    """
+    Boolean expression over the fields of a structure, compiled once against the structure schema. Fields are named
+    by their path (i.e. 'hdr.ptype'), elements of array fields are indexed with constants (i.e. 'samples[3]'), and
+    bit fields are read from their base field with a shift and mask. Names of enum members can be compared with
+    enum bit fields.
+
+    Expressions support comparisons (including chained comparisons, 'in' and 'not in' with a tuple of constants),
+    arithmetic (+, -, *, /, //, %), and 'and', 'or' and 'not' or their equivalents &, | and ~.
+
+    Examples
+    --------
+    >>> q = Query('hdr.ptype == 3 & state1 > 5', datapkt.__schema__)
+    >>> q.indices(recs)
+
+    Parameters
+    ----------
+    expr : str
+        query expression.
+    schema : Schema
+        compiled layout of the structure, see Struct.get_schema().
+    """
+
+    def __init__(self, expr: str, schema):
+        self.expr = expr
+        self.schema = schema
+        # fields read by the expression, keyed by their name in the expression: (schema field, element index)
+        self.fields = {}
+
+        try:
+            tree = ast.parse(_rewrite_tokens(expr).strip(), mode='eval')
+        except (SyntaxError, tokenize.TokenError) as e:
+            raise ValueError('Invalid query \'{}\': {}'.format(expr, e))
+
+        self._func = self._compile(tree.body)
+
+    def _error(self, msg: str):
+        return ValueError('Invalid query \'{}\': {}'.format(self.expr, msg))
+
+    def _path(self, node) -> str:
+        # field path of Name, Attribute and constant Subscript nodes, or None
+        if isinstance(node, ast.Name):
+            return node.id
+        if isinstance(node, ast.Attribute):
+            parent = self._path(node.value)
+            return None if parent is None else parent + '.' + node.attr
+        if isinstance(node, ast.Subscript):
+            parent = self._path(node.value)
+            idx = node.slice.elts if isinstance(node.slice, ast.Tuple) else [node.slice]
+            if parent is None or not all(isinstance(i, ast.Constant) and isinstance(i.value, int) for i in idx):
+                return None
+            return '{}[{}]'.format(parent, ','.join(str(i.value) for i in idx))
+        return None
+
+    def _field(self, path: str):
+        # returns the schema field and element index of a path, i.e. 'samples[3]' is element 3 of 'samples'
+        if path in self.schema:
+            f, index = self.schema[path], ()
+        else:
+            name, _, idx = path.rpartition('[')
+            if name not in self.schema or not idx.endswith(']') or '.' in idx:
+                raise self._error('unknown field \'{}\''.format(path))
+            f, index = self.schema[name], tuple(int(i) for i in idx[:-1].split(','))
+
+        shape = f.shape if f.shape != (1,) else ()
+        if len(index) != len(shape):
+            raise self._error('field \'{}\' has shape {}, index it to compare single elements'.format(path, shape))
+        if any(not 0 <= i < n for i, n in zip(index, shape)):
+            raise self._error('index out of range for field \'{}\' with shape {}'.format(path, shape))
+
+        self.fields[path] = (f, index)
+        return f
+
+    def _constant(self, node, field=None):
+        # constants, and tuples or lists of constants. Strings are names of enum members of the field they are
+        # compared to.
+        if isinstance(node, (ast.Tuple, ast.List)):
+            return np.array([self._constant(e, field) for e in node.elts])
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            return -self._constant(node.operand, field)
+        if not isinstance(node, ast.Constant):
+            raise self._error('expected a constant, got \'{}\''.format(ast.dump(node)))
+        if isinstance(node.value, str):
+            if field is None or field.enum is None:
+                raise self._error('\'{}\' can only be compared with an enum bit field'.format(node.value))
+            return field.enum.encode(node.value)
+        return node.value
+
+    def _compile(self, node):
+        """
+        Returns a function of the field columns that evaluates node.
+        """
+        path = self._path(node)
+        if path is not None:
+            self._field(path)
+            return lambda cols: cols[path]
+
+        if isinstance(node, ast.Constant):
+            value = self._constant(node)
+            return lambda cols: value
+
+        if isinstance(node, ast.BoolOp):
+            funcs = [self._compile(v) for v in node.values]
+            op = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            return lambda cols: op.reduce([f(cols) for f in funcs])
+
+        if isinstance(node, ast.UnaryOp):
+            func = self._compile(node.operand)
+            if isinstance(node.op, ast.Not):
+                return lambda cols: np.logical_not(func(cols))
+            if isinstance(node.op, ast.USub):
+                return lambda cols: np.negative(func(cols))
+            return func
+
+        if isinstance(node, ast.BinOp):
+            if type(node.op) not in _BINARY:
+                raise self._error('unsupported operator {}'.format(type(node.op).__name__))
+            op, left, right = _BINARY[type(node.op)], self._compile(node.left), self._compile(node.right)
+            return lambda cols: op(left(cols), right(cols))
+
+        if isinstance(node, ast.Compare):
+            return self._compile_compare(node)
+
+        raise self._error('unsupported expression \'{}\''.format(type(node).__name__))
+
+    def _compile_compare(self, node):
+        # chained comparisons a < b < c are evaluated as (a < b) and (b < c)
+        operands = [node.left] + node.comparators
+        funcs = []
+        for op, left, right in zip(node.ops, operands[:-1], operands[1:]):
+            l_path, r_path = self._path(left), self._path(right)
+            l_field = self._field(l_path) if l_path is not None else None
+            r_field = self._field(r_path) if r_path is not None else None
+
+            if isinstance(op, (ast.In, ast.NotIn)):
+                values = self._constant(right, l_field)
+                l_func, invert = self._compile(left), isinstance(op, ast.NotIn)
+                funcs.append(lambda cols, l=l_func, v=values, i=invert: np.isin(l(cols), v, invert=i))
+                continue
+
+            if type(op) not in _COMPARE:
+                raise self._error('unsupported comparison {}'.format(type(op).__name__))
+
+            # names of enum members are converted to raw values
+            l_func = self._side(left, r_field)
+            r_func = self._side(right, l_field)
+            funcs.append(lambda cols, c=_COMPARE[type(op)], l=l_func, r=r_func: c(l(cols), r(cols)))
+
+        if len(funcs) == 1:
+            return funcs[0]
+        return lambda cols: np.logical_and.reduce([f(cols) for f in funcs])
+
+    def _side(self, node, other_field):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str):
+            value = self._constant(node, other_field)
+            return lambda cols: value
+        return self._compile(node)
+
+    def evaluate(self, flat: np.ndarray) -> np.ndarray:
+        """
+        Returns the boolean result of the query for each record of flat, a 1D array with the schema flat dtype.
+        """
+        cols = {}
+        for path, (f, index) in self.fields.items():
+            col = flat[f.base if f.is_bitfield else f.name]
+            if f.shape == (1,):
+                col = col[:, 0]
+            elif len(index):
+                col = col[(slice(None),) + index]
+
+            if f.is_bitfield:
+                col = (col >> f.bit_pos) & f.mask
+            cols[path] = col
+
+        return np.broadcast_to(np.asarray(self._func(cols), dtype=bool), flat.shape)
+
+    def mask(self, records: np.ndarray, chunk_size: int = 1 << 16) -> np.ndarray:
+        """
+        Returns the result of the query for each record, in the order of records.reshape(-1). Records are evaluated
+        chunk_size at a time, so temporary arrays are bounded in size and memory mapped records are read one chunk
+        at a time.
+        """
+        flat = records.view(np.ndarray).reshape(-1).view(self.schema.flat_dtype)
+        out = np.empty(len(flat), dtype=bool)
+        for i in range(0, len(flat), chunk_size):
+            out[i:i + chunk_size] = self.evaluate(flat[i:i + chunk_size])
+        return out
+
+    def indices(self, records: np.ndarray, chunk_size: int = 1 << 16) -> np.ndarray:
+        """
+        Returns the flat indices of records where the query is True.
+        """
+        flat = records.view(np.ndarray).reshape(-1).view(self.schema.flat_dtype)
+        idx = [np.flatnonzero(self.evaluate(flat[i:i + chunk_size])) + i for i in range(0, len(flat), chunk_size)]
+        return np.concatenate(idx) if len(idx) else np.zeros(0, dtype=np.intp)
+
+
+@lru_cache(maxsize=256)
+def compile_query(expr: str, schema) -> Query:
+    """
+    Returns the compiled query expr for schema. Queries are cached for each schema and expression.
+    """
+    return Query(expr, schema)
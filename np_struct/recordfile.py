@@ -0,0 +1,298 @@
+import os
+import re
+import glob
+import tempfile
+import numpy as np
+
+# file name of index runs that don't start at the first record, path.<field>.<start>-<stop>.run.npy
+_RUN_RE = re.compile(r'(.+)\.(\d+)-(\d+)\.run')
+
+
+def _index_path(path: str, field: str, start: int = 0, stop: int = 0) -> str:
+    # the run that starts at the first record is the main index file, later runs are named by the records they cover
+    if start == 0:
+        return '{}.{}.npy'.format(path, field)
+    return '{}.{}.{}-{}.run.npy'.format(path, field, start, stop)
+
+
+class RecordFile(object):
+    """
+    Memory mapped file of fixed size structure records (i.e. written with tofile() or by C code), with persisted
+    secondary indexes.
+
+    An index on a field is a sidecar file (path + '.<field>.npy') with the value of the field in every record,
+    sorted, and the position of each record. Selections on an indexed field find the matching positions with a
+    binary search of the memory mapped index, and only the matching records are read from the data file. Indexes
+    that exist next to the file are loaded when it is opened.
+
+    Records appended with append() or refresh() are indexed in sorted runs (path + '.<field>.<start>-<stop>.run.npy')
+    that only hold the new records. The newest runs are merged while they are about the same size, so a field has
+    O(log n) runs and each entry is rewritten O(log n) times. Selections never write to disk: they search every
+    run, and scan records that were appended by another writer and are not indexed yet.
+
+    Examples
+    --------
+    >>> rf = RecordFile('capture.bin', datapkt)
+    >>> rf.build_index('hdr.ptype')
+    >>> rf.build_index('hdr.timestamp')
+    >>> rf.select('hdr.ptype', 3)
+    >>> rf.select('hdr.timestamp', start=t0, stop=t1)
+
+    Parameters
+    ----------
+    path : str | Path
+        path of the data file. The file is created if it does not exist.
+    cls : type
+        Struct class of the records. Classes with variable length members are not supported.
+    byte_order : str, optional
+        byte order of the records in the file, '<' or '>'. Default is the byte order of the class definition.
+    chunk_size : int, default: 1048576
+        number of records read at a time when building indexes or scanning fields without an index.
+    """
+
+    def __init__(self, path, cls, byte_order: str = None, chunk_size: int = 1 << 20):
+        if len(cls._var_fields):
+            raise ValueError('Structures with variable length members are not supported: {}'.format(cls.__name__))
+
+        self.path = str(path)
+        self.cls = cls
+        self.dtype = cls._build_dtype({}, byte_order)
+        self.schema = cls.get_schema(self.dtype)
+        self.chunk_size = chunk_size
+        # sorted runs of each indexed field in record order, memory mapped from the sidecar files. Each run covers
+        # the records after the previous run.
+        self.indexes = {}
+
+        if not os.path.exists(self.path):
+            open(self.path, 'wb').close()
+
+        self._size = None
+        self._map()
+
+        runs = {}
+        for index_path in glob.glob(glob.escape(self.path) + '.*.npy'):
+            name = index_path[len(self.path) + 1:-len('.npy')]
+            match = _RUN_RE.fullmatch(name)
+            field, start = (match.group(1), int(match.group(2))) if match else (name, 0)
+            if field in self.schema:
+                run = np.load(index_path, mmap_mode='r')
+                runs.setdefault(field, []).append((start, start + len(run), run))
+
+        # chain the runs from the first record. Runs left over by an interrupted merge overlap the merged run,
+        # the longest run is used.
+        for field, field_runs in runs.items():
+            chain, covered = [], 0
+            for start, stop, run in sorted(field_runs, key=lambda r: (r[0], -r[1])):
+                if start == covered and (stop > start or not len(chain)):
+                    chain.append(run)
+                    covered = stop
+            if len(chain):
+                self.indexes[field] = chain
+
+    def __len__(self):
+        return len(self.records)
+
+    def _map(self):
+        self._size = os.path.getsize(self.path)
+        n = self._size // self.dtype.itemsize
+        self.records = (
+            np.memmap(self.path, dtype=self.dtype, mode='r', shape=(n,)).view(self.cls)
+            if n else np.zeros(0, dtype=self.dtype).view(self.cls)
+        )
+
+    def _check_field(self, field: str):
+        if field not in self.schema:
+            raise ValueError('structure ({}) has no field: {}'.format(self.cls.__name__, field))
+        if self.schema[field].shape not in [(), (1,)]:
+            raise ValueError('Only scalar fields can be indexed, \'{}\' has shape {}.'.format(
+                field, self.schema[field].shape
+            ))
+
+    def _keys(self, field: str, start: int, stop: int) -> np.ndarray:
+        # native values of a scalar field in records[start:stop]
+        f = self.schema[field]
+        flat = self.records[start:stop].view(np.ndarray).view(self.schema.flat_dtype)
+        col = flat[f.base if f.is_bitfield else f.name].reshape(-1)
+        if f.is_bitfield:
+            col = (col >> f.bit_pos) & f.mask
+        return col.astype(f.dtype.newbyteorder('='))
+
+    def _entries(self, field: str, start: int, stop: int) -> np.ndarray:
+        # index entries of records[start:stop], sorted by key and by position for equal keys
+        keys = [self._keys(field, i, min(i + self.chunk_size, stop)) for i in range(start, stop, self.chunk_size)]
+        keys = np.concatenate(keys) if len(keys) else self._keys(field, 0, 0)
+        order = np.argsort(keys, kind='stable')
+
+        entries = np.empty(len(keys), dtype=[('key', keys.dtype), ('pos', '<i8')])
+        entries['key'] = keys[order]
+        entries['pos'] = order + start
+        return entries
+
+    def _save(self, field: str, entries: np.ndarray, start: int = 0) -> np.ndarray:
+        # runs are written to a unique temporary file and replaced atomically, so readers never see a partial run
+        path = _index_path(self.path, field, start, start + len(entries))
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, entries)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        return np.load(path, mmap_mode='r')
+
+    def _remove_runs(self, field: str, start: int = 0, keep: str = None):
+        # remove the run files of field that start at or after record start, except keep
+        for path in glob.glob(glob.escape('{}.{}'.format(self.path, field)) + '.*.run.npy'):
+            match = _RUN_RE.fullmatch(path[len(self.path) + 1:-len('.npy')])
+            if match is not None and match.group(1) == field and int(match.group(2)) >= start and path != keep:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    # removed by another writer
+                    pass
+
+    def build_index(self, field: str):
+        """
+        Build and save the index of a scalar field (including bit fields), replacing an existing index.
+
+        Parameters
+        ----------
+        field : str
+            name of the field, nested fields are named by their path, i.e. 'hdr.ptype'.
+        """
+        self._check_field(field)
+        self.indexes.pop(field, None)
+        self.indexes[field] = [self._save(field, self._entries(field, 0, len(self)))]
+        self._remove_runs(field)
+
+    def drop_index(self, field: str):
+        """
+        Remove the index of field and its sidecar files.
+        """
+        if self.indexes.pop(field, None) is not None:
+            os.remove(_index_path(self.path, field))
+            self._remove_runs(field)
+
+    def _indexed(self, field: str) -> int:
+        # number of records covered by the index of field
+        return sum(len(run) for run in self.indexes[field])
+
+    def refresh(self):
+        """
+        Map records that were appended to the file since it was opened, and add them to every index as a new
+        sorted run. The newest runs are merged while the older run is at most twice the size of the newer one,
+        existing entries are not sorted again. Indexes with more entries than the file has records (i.e. the file
+        was truncated) are rebuilt.
+        """
+        self._remap()
+
+        n = len(self)
+        for field in list(self.indexes):
+            covered = self._indexed(field)
+            if covered == n:
+                continue
+            if covered > n:
+                self.build_index(field)
+                continue
+
+            runs = self.indexes[field] + [self._save(field, self._entries(field, covered, n), covered)]
+            while len(runs) > 1 and len(runs[-2]) <= 2 * len(runs[-1]):
+                new, old = np.asarray(runs.pop()), np.asarray(runs.pop())
+                start = sum(len(run) for run in runs)
+                # runs cover consecutive records, new entries go after old entries with the same key
+                merged = np.insert(old, np.searchsorted(old['key'], new['key'], side='right'), new)
+                # release the maps of the merged runs before their files are replaced
+                self.indexes[field] = runs
+                old = new = None
+                runs.append(self._save(field, merged, start))
+                self._remove_runs(field, start, keep=_index_path(self.path, field, start, start + len(merged)))
+            self.indexes[field] = runs
+
+    def _remap(self):
+        if os.path.getsize(self.path) != self._size:
+            self._map()
+
+    def append(self, records):
+        """
+        Append records to the file and update the indexes.
+
+        Parameters
+        ----------
+        records : Struct
+            records of the file class, converted to the byte order of the file if needed.
+        """
+        data = np.asarray(records).reshape(-1).view(np.ndarray)
+        if data.dtype != self.dtype:
+            data = data.astype(self.dtype)
+
+        with open(self.path, 'ab') as f:
+            f.write(data.tobytes())
+        self.refresh()
+
+    def select(self, field: str, value=None, start=None, stop=None, indices: bool = False):
+        """
+        Returns the records where field equals value (or any of a list of values), or is in the range
+        [start, stop). Indexed fields are searched with the index and only the matching records are read, other
+        fields are scanned chunk_size records at a time. Records are returned in file order. Records appended by
+        another writer since the last refresh() are scanned, selections don't update the index files.
+
+        Parameters
+        ----------
+        field : str
+            name of a scalar field.
+        value : scalar | list, optional
+            value, or list of values, of the field.
+        start, stop : scalar, optional
+            range of the field, if value is None. Default is unbounded.
+        indices : bool, default: False
+            if True, returns the positions of the matching records in the file instead of a copy of the records.
+        """
+        self._check_field(field)
+        self._remap()
+        values = None if value is None else np.atleast_1d(value)
+
+        # indexes of a truncated file are not used until they are rebuilt by refresh()
+        covered = self._indexed(field) if field in self.indexes else 0
+        covered = 0 if covered > len(self) else covered
+
+        pos = []
+        if covered:
+            for run in self.indexes[field]:
+                keys = run['key']
+                if values is not None:
+                    ranges = zip(np.searchsorted(keys, values, 'left'), np.searchsorted(keys, values, 'right'))
+                else:
+                    lo = 0 if start is None else np.searchsorted(keys, start, 'left')
+                    hi = len(keys) if stop is None else np.searchsorted(keys, stop, 'left')
+                    ranges = [(lo, hi)]
+                pos += [run['pos'][lo:hi] for lo, hi in ranges]
+
+        # records that are not indexed
+        for i in range(covered, len(self), self.chunk_size):
+            keys = self._keys(field, i, min(i + self.chunk_size, len(self)))
+            if values is not None:
+                mask = np.isin(keys, values)
+            else:
+                mask = np.ones(len(keys), dtype=bool)
+                if start is not None:
+                    mask &= keys >= start
+                if stop is not None:
+                    mask &= keys < stop
+            pos.append(np.flatnonzero(mask) + i)
+
+        pos = np.sort(np.concatenate(pos)) if len(pos) else np.zeros(0, dtype=np.int64)
+
+        if indices:
+            return pos
+        return self.records.view(np.ndarray)[pos].view(self.cls)
+
+    def close(self):
+        self.records = None
+        self.indexes = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
@@ -0,0 +1,163 @@
+import numpy as np
+from typing import NamedTuple
+
+
+class SchemaField(NamedTuple):
+    """
+    Leaf field of a compiled structure schema.
+    """
+    # full field name, nested members are separated by '.', e.g. 'hdr.ptype'. Elements of structure arrays
+    # are indexed, e.g. 'points[1].x'
+    name: str
+    # byte offset from the start of the record
+    offset: int
+    # scalar data type of the field
+    dtype: np.dtype
+    # shape of the field in each record
+    shape: tuple
+    # for bit fields, the name of the base field that holds the bits. None for other fields.
+    base: str = None
+    # position of the least significant bit in the base field
+    bit_pos: int = None
+    # width of the bit field
+    bits: int = None
+    # enum lookup tables of the bit field, see bitfields.EnumTable
+    enum: object = None
+
+    @property
+    def is_bitfield(self) -> bool:
+        return self.bits is not None
+
+    @property
+    def mask(self) -> int:
+        """
+        Bit mask of the field (before shifting to the bit position)
+        """
+        return (1 << self.bits) - 1 if self.is_bitfield else None
+
+
+class Schema(object):
+    """
+    Flattened layout of a structure. Lists every leaf field with its byte offset, dtype, shape and bit position.
+
+    The flat dtype views the same memory as the structure, but with a single level of fields named by their full
+    path. This avoids chained views of nested structures,
+
+    >>> recs.view(np.ndarray).view(pkt.__schema__.flat_dtype)['hdr.ptype']
+
+    Bit fields are listed in the schema but are not fields of the flat dtype, they are read by shifting and masking
+    the base field.
+    """
+
+    def __init__(self, fields: list, dtype: np.dtype):
+        self.fields = list(fields)
+        # record dtype the schema was compiled from
+        self.dtype = dtype
+        self.itemsize = dtype.itemsize
+        self.aligned = dtype.isalignedstruct
+        self._lut = {f.name: f for f in self.fields}
+
+        # only non-bit fields are part of the flat dtype
+        leaves = [f for f in self.fields if not f.is_bitfield]
+        self.flat_dtype = np.dtype(dict(
+            names=[f.name for f in leaves],
+            formats=[(f.dtype, f.shape) if f.shape != () else f.dtype for f in leaves],
+            offsets=[f.offset for f in leaves],
+            itemsize=self.itemsize
+        ))
+
+    @property
+    def names(self) -> list:
+        return [f.name for f in self.fields]
+
+    def __getitem__(self, name: str) -> SchemaField:
+        return self._lut[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._lut
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __str__(self):
+        width = max([len(f.name) for f in self.fields] + [4]) + 2
+        s = '{:<{w}}{:>8}  {:<10}{:<10}{}\n'.format('name', 'offset', 'dtype', 'shape', 'bits', w=width)
+        for f in self.fields:
+            bits = '({}:{})'.format(f.bit_pos + f.bits, f.bit_pos) if f.is_bitfield else ''
+            s += '{:<{w}}{:>8}  {:<10}{:<10}{}\n'.format(f.name, f.offset, f.dtype.str, str(f.shape), bits, w=width)
+        return s + 'itemsize: {}'.format(self.itemsize)
+
+    def __repr__(self):
+        return str(self)
+
+
+def align_dtype(dtype: np.dtype, cls=None) -> np.dtype:
+    """
+    Returns dtype with C struct padding applied to it and all nested structured types. If cls is the Struct class 
+    of dtype, nested structures of packed classes (i.e. class inner(Struct, packed=True)) keep their layout, the
+    same as a packed struct inside an aligned struct in C.
+    """
+    if dtype.names is None:
+        return dtype
+
+    item_cls = getattr(cls, '_item_cls', {})
+
+    fields = []
+    for name in dtype.names:
+        sub = dtype.fields[name][0]
+        sub_cls = item_cls.get(name)
+        if getattr(sub_cls, '_packed', False):
+            fields.append((name, sub.base, sub.shape))
+        else:
+            fields.append((name, align_dtype(sub.base, sub_cls), sub.shape))
+
+    return np.dtype(fields, align=True)
+
+
+def compile_schema(cls, dtype: np.dtype) -> Schema:
+    """
+    Compile the leaf fields of a Struct class with the given record dtype.
+    """
+    fields = []
+    _compile_fields(cls, dtype, '', 0, fields)
+    return Schema(fields, dtype)
+
+
+def _compile_fields(cls, dtype: np.dtype, prefix: str, offset: int, fields: list):
+    """
+    Append the leaf fields of a structure to fields. Recurses into nested structures.
+    """
+    item_cls = getattr(cls, '_item_cls', {})
+    bit_fields = getattr(cls, '_bit_fields', {})
+    enums = getattr(cls, '_enums', {})
+
+    for name in dtype.names:
+        sub, sub_offset = dtype.fields[name][:2]
+        full_name = prefix + name
+        sub_cls = item_cls.get(name)
+
+        # nested structures, flatten every element of the sub-array
+        if sub.base.names is not None:
+            if sub.shape in [(), (1,)]:
+                _compile_fields(sub_cls, sub.base, full_name + '.', offset + sub_offset, fields)
+            else:
+                for i, idx in enumerate(np.ndindex(sub.shape)):
+                    idx_str = ','.join(str(j) for j in idx)
+                    el_offset = offset + sub_offset + i * sub.base.itemsize
+                    _compile_fields(sub_cls, sub.base, '{}[{}].'.format(full_name, idx_str), el_offset, fields)
+            continue
+
+        fields.append(SchemaField(full_name, offset + sub_offset, sub.base, sub.shape))
+
+        # bit fields that are packed in this field
+        for b_name, (base, pos, bits, default) in bit_fields.items():
+            if base == name:
+                fields.append(
+                    SchemaField(
+                        prefix + b_name, offset + sub_offset, sub.base, sub.shape, full_name, pos, bits,
+                        enums.get(b_name)
+                    )
+                )
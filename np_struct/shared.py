@@ -0,0 +1,215 @@
+import os
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory, util
+from typing import Callable
+
+from . ldarray import ldarray, Coords
+
+# shared memory segments attached by this process, keyed by segment name. Segments stay mapped so workers
+# that receive many tasks on the same array only attach once.
+_ATTACHED = {}
+
+# handle of the array being processed by a parallel_map worker, set by the pool initializer
+_WORKER_HANDLE = None
+
+
+class SharedArrayHandle(object):
+    """
+    Picklable reference to an ldarray stored in shared memory, returned by ``ldarray.to_shared()``.
+
+    The handle holds the segment name, the array shape and dtype, and a compact header of the coordinates,
+    index precision and handlers, and attributes. Pickling a handle does not copy the array data, other processes attach to the same buffer with
+    ``ldarray.from_shared(handle)``.
+
+    The process that created the handle owns the segment and must release it with ``unlink()`` once all
+    processes are done with it. Handles can be used as a context manager to do this automatically.
+
+    Examples
+    --------
+    >>> with ld.to_shared() as handle:
+    ...     pool.map(func, [handle] * 4)
+    """
+
+    def __init__(
+        self, 
+        name: str, 
+        shape: tuple, 
+        dtype: np.dtype, 
+        coords: dict, 
+        attrs: dict, 
+        idx_precision: dict, 
+        idx_handlers: dict = None
+    ):
+        self.name = name
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.coords = coords
+        self.attrs = attrs
+        self.idx_precision = idx_precision
+        # custom index handlers are pickled by reference, the same as when pickling the ldarray
+        self.idx_handlers = {} if idx_handlers is None else idx_handlers
+        self._shm = None
+
+    @classmethod
+    def create(cls, obj: ldarray) -> "SharedArrayHandle":
+        """
+        Copy obj into a new shared memory segment.
+        """
+        if obj.dtype.hasobject:
+            raise TypeError("Arrays with object types can't be placed in shared memory.")
+
+        # shared memory segments can't be zero sized
+        shm = shared_memory.SharedMemory(create=True, size=max(obj.nbytes, 1))
+        np.ndarray(obj.shape, dtype=obj.dtype, buffer=shm.buf)[...] = obj.view(np.ndarray)
+
+        if obj.coords is not None:
+            coords = {k: np.asarray(v) for k, v in obj.coords.items()}
+            idx_precision = dict(obj.coords.idx_precision)
+            idx_handlers = dict(obj.coords.idx_handlers)
+        else:
+            coords, idx_precision, idx_handlers = None, {}, {}
+
+        handle = cls(shm.name, obj.shape, obj.dtype, coords, dict(obj.attrs), idx_precision, idx_handlers)
+        handle._shm = shm
+        shm._np_struct_owner = os.getpid()
+        _ATTACHED[shm.name] = shm
+        return handle
+
+    def attach(self) -> np.ndarray:
+        """
+        Returns a ndarray view of the shared buffer, attaching to the segment if needed.
+        """
+        shm = _ATTACHED.get(self.name)
+        if shm is None:
+            shm = shared_memory.SharedMemory(name=self.name)
+            _ATTACHED[self.name] = shm
+
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+
+    def unlink(self):
+        """
+        Release the shared memory segment. Only the process that created the segment can unlink it, arrays that
+        were attached to the segment must not be used afterwards.
+        """
+        if self._shm is None:
+            raise RuntimeError("Shared memory can only be unlinked by the process that created it.")
+
+        _ATTACHED.pop(self.name, None)
+        try:
+            self._shm.close()
+        except BufferError:
+            # views of the buffer are still alive in this process, the mapping is released when they are.
+            pass
+
+        self._shm.unlink()
+        self._shm = None
+
+    def __getstate__(self):
+        # the segment is owned by the creating process, copies of the handle only reference it by name
+        state = self.__dict__.copy()
+        state["_shm"] = None
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        if self._shm is not None:
+            self.unlink()
+
+
+def detach_all():
+    """
+    Close the shared memory segments that this process attached to but did not create. Arrays that use the 
+    segments must not be used afterwards. Segments with views that are still alive stay mapped until the views are
+    released.
+    """
+    for name, shm in list(_ATTACHED.items()):
+        # segments created by this process are closed when they are unlinked. Forked workers inherit the mapping
+        # of the creating process, and close their copy.
+        if getattr(shm, '_np_struct_owner', None) == os.getpid():
+            continue
+        _ATTACHED.pop(name)
+        try:
+            shm.close()
+        except BufferError:
+            pass
+
+
+def _init_worker(handle: SharedArrayHandle):
+    # called once in each worker process, the coordinate header is only sent with the pool initializer
+    global _WORKER_HANDLE
+    _WORKER_HANDLE = handle
+    # close attached segments when the worker exits
+    util.Finalize(None, detach_all, exitpriority=10)
+
+
+def _call_worker(args):
+    func, idx = args
+    obj = ldarray.from_shared(_WORKER_HANDLE)
+    return func(obj[idx])
+
+
+def parallel_map(
+    obj: ldarray, func: Callable[[ldarray], object], dim: str, processes: int = None, chunks: int = None
+):
+    """
+    Split obj along a labeled dimension and apply func to each part in a process pool. Workers attach to a
+    single copy of the array in shared memory, only the index of each part is sent with each task.
+
+    If every result is an array with the same length as its part along dim, the results are joined into a
+    single ldarray. Otherwise, the list of results is returned.
+
+    Parameters
+    ----------
+    obj : ldarray
+        labeled array to split.
+    func : Callable
+        function called with each part of obj. Must be picklable, i.e. defined at the top level of a module.
+    dim : str
+        dimension to split obj along.
+    processes : int, optional
+        number of worker processes, defaults to the number of CPUs.
+    chunks : int, optional
+        number of parts to split obj into. Defaults to the number of processes.
+
+    Returns
+    -------
+    ldarray | list
+    """
+    if obj.coords is None or dim not in obj.coords.keys():
+        raise ValueError(f"Array does not have a labeled dimension '{dim}'.")
+
+    processes = mp.cpu_count() if processes is None else processes
+    axis = obj.coords.index(dim)
+    n = obj.shape[axis]
+    chunks = min(processes if chunks is None else chunks, n)
+
+    # index of each part along dim
+    bounds = np.linspace(0, n, chunks + 1).astype(int)
+    idx = [(slice(None),) * axis + (slice(a, b),) for a, b in zip(bounds[:-1], bounds[1:])]
+
+    with SharedArrayHandle.create(obj) as handle:
+        with mp.Pool(processes, initializer=_init_worker, initargs=(handle,)) as pool:
+            results = pool.map(_call_worker, [(func, i) for i in idx])
+            # let the workers exit normally so they detach from the segment, instead of being terminated
+            pool.close()
+            pool.join()
+
+    # join the results back together if the dimension is intact
+    lengths = [b - a for a, b in zip(bounds[:-1], bounds[1:])]
+    if all(isinstance(r, np.ndarray) and r.ndim > axis and r.shape[axis] == l for r, l in zip(results, lengths)):
+        data = np.concatenate([np.asarray(r) for r in results], axis=axis)
+
+        if data.shape == obj.shape:
+            coords = Coords(
+                **obj.coords, 
+                idx_precision=dict(obj.coords.idx_precision), 
+                idx_handlers=dict(obj.coords.idx_handlers)
+            )
+            return ldarray(data, coords=coords, attrs=obj.attrs)
+
+        return data
+
+    return results
@@ -0,0 +1,198 @@
+import numpy as np
+from time import perf_counter
+from typing import Callable
+
+
+class LatencyHistogram(object):
+    """
+    Log-linear histogram of latencies in nanoseconds, in the style of HDR histograms. Each power of two is split
+    into 8 equal buckets, so values are counted with at most 12.5% error over the full 64 bit range. Recording a
+    value is a few integer operations and a list increment.
+    """
+    # buckets per power of two are 2**SUB_BITS
+    SUB_BITS = 3
+    NBUCKETS = 64 << SUB_BITS
+
+    def __init__(self):
+        self.counts = [0] * self.NBUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns: int, count: int = 1):
+        """
+        Add count values of ns nanoseconds to the histogram.
+        """
+        b = ns.bit_length() - self.SUB_BITS - 1
+        # values below 2**(SUB_BITS + 1) have a bucket each
+        idx = ns if b <= 0 else (b << self.SUB_BITS) + (ns >> b)
+
+        self.counts[idx] += count
+        self.count += count
+        self.total += ns * count
+        if ns > self.max:
+            self.max = ns
+
+    @classmethod
+    def bucket_bounds(cls, idx: int) -> tuple:
+        """
+        Returns the (lowest, highest) value counted in bucket idx.
+        """
+        if idx < (2 << cls.SUB_BITS):
+            return idx, idx
+
+        shift = (idx >> cls.SUB_BITS) - 1
+        mantissa = idx - (shift << cls.SUB_BITS)
+        return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+    def percentile(self, q: float) -> int:
+        """
+        Returns the upper bound of the bucket that holds the q-th percentile (0-100) of recorded values.
+        """
+        if not self.count:
+            return 0
+
+        cumsum = np.cumsum(self.counts)
+        idx = int(np.searchsorted(cumsum, max(q / 100 * self.count, 1)))
+        return min(self.bucket_bounds(idx)[1], self.max)
+
+    def summary(self) -> dict:
+        """
+        Returns the count, mean, median, 90th, 99th, 99.9th percentile and maximum latency in nanoseconds.
+        """
+        return dict(
+            count=self.count,
+            mean=self.total / self.count if self.count else 0,
+            p50=self.percentile(50),
+            p90=self.percentile(90),
+            p99=self.percentile(99),
+            p999=self.percentile(99.9),
+            max=self.max,
+        )
+
+
+class _TypeStats(object):
+    __slots__ = ('packets', 'bytes', 'latency')
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.latency = LatencyHistogram()
+
+
+class TransferStats(object):
+    """
+    Counters and latency histograms of a PacketTransfer interface, see PacketTransfer.set_stats().
+
+    Received packets are counted by packet type with a histogram of decode times (from the header arriving to the
+    packet being decoded). Sent packets are counted by packet type, and pkt_sendrecv round-trip times are kept in
+    histograms keyed by the type of the sent packet. Read timeouts and unrecognized packet types are counted.
+
+    Parameters
+    ----------
+    hook : Callable, optional
+        called as hook(event, ptype, nbytes, ns) for every recorded event. Events are 'rx', 'tx', 'rtt', 'timeout'
+        and 'type_error', ns is the decode or round-trip time in nanoseconds (0 for other events).
+    """
+
+    def __init__(self, hook: Callable = None):
+        self.hook = hook
+        self.reset()
+
+    def reset(self):
+        """
+        Clear all counters and histograms.
+        """
+        self.started = perf_counter()
+        self.timeouts = 0
+        self.type_errors = 0
+        self.rx = {}
+        self.tx = {}
+        self.rtt = {}
+
+    def record_rx(self, ptype, nbytes: int, ns: int, count: int = 1):
+        """
+        Count received packets of a type. ns is the decode time of each packet.
+        """
+        entry = self.rx.get(ptype)
+        if entry is None:
+            entry = self.rx[ptype] = _TypeStats()
+
+        entry.packets += count
+        entry.bytes += nbytes
+        entry.latency.record(ns, count)
+
+        if self.hook is not None:
+            self.hook('rx', ptype, nbytes, ns)
+
+    def record_tx(self, ptype, nbytes: int, count: int = 1):
+        """
+        Count sent packets of a type.
+        """
+        entry = self.tx.get(ptype)
+        if entry is None:
+            entry = self.tx[ptype] = _TypeStats()
+
+        entry.packets += count
+        entry.bytes += nbytes
+
+        if self.hook is not None:
+            self.hook('tx', ptype, nbytes, 0)
+
+    def record_rtt(self, ptype, ns: int):
+        """
+        Add the round-trip time of a request packet of type ptype.
+        """
+        hist = self.rtt.get(ptype)
+        if hist is None:
+            hist = self.rtt[ptype] = LatencyHistogram()
+        hist.record(ns)
+
+        if self.hook is not None:
+            self.hook('rtt', ptype, 0, ns)
+
+    def record_timeout(self):
+        self.timeouts += 1
+        if self.hook is not None:
+            self.hook('timeout', None, 0, 0)
+
+    def record_type_error(self, ptype):
+        self.type_errors += 1
+        if self.hook is not None:
+            self.hook('type_error', ptype, 0, 0)
+
+    def snapshot(self) -> dict:
+        """
+        Returns the current counters, rates and latency percentiles as a dictionary of plain python types.
+
+        Returns
+        -------
+        dict
+            'elapsed': seconds since the stats were reset.
+            'rx', 'tx': total packets, bytes, packets per second and bytes per second.
+            'rx_types': packets, bytes and decode latency summary (ns) of each received packet type.
+            'tx_types': packets and bytes of each sent packet type.
+            'rtt': round-trip latency summary (ns) of each request packet type.
+            'timeouts', 'type_errors': error counts.
+        """
+        elapsed = perf_counter() - self.started
+
+        def totals(entries):
+            packets = sum(e.packets for e in entries.values())
+            nbytes = sum(e.bytes for e in entries.values())
+            return dict(
+                packets=packets, bytes=nbytes, packets_per_s=packets / elapsed, bytes_per_s=nbytes / elapsed
+            )
+
+        return dict(
+            elapsed=elapsed,
+            rx=totals(self.rx),
+            tx=totals(self.tx),
+            rx_types={
+                k: dict(packets=e.packets, bytes=e.bytes, latency=e.latency.summary()) for k, e in self.rx.items()
+            },
+            tx_types={k: dict(packets=e.packets, bytes=e.bytes) for k, e in self.tx.items()},
+            rtt={k: h.summary() for k, h in self.rtt.items()},
+            timeouts=self.timeouts,
+            type_errors=self.type_errors,
+        )
@@ -1,12 +1,90 @@
+import struct
 import numpy as np
-from . bitfields import bitfield
+from numpy.lib.stride_tricks import as_strided
+from . bitfields import bitfield, EnumTable
+from . checksum import checksum
+from . schema import Schema, compile_schema, align_dtype
+from . query import compile_query
 from collections import OrderedDict as od
 
-_SUPPORTED_NP_TYPES = (np.uint8, np.uint16, np.uint32, np.int16, np.int32, np.int64, np.float32, np.float64, np.complex128)
+_SUPPORTED_NP_TYPES = (
+    np.uint8, np.int8, np.uint16, np.uint32, np.uint64, np.int16, np.int32, np.int64, np.float32, np.float64, 
+    np.complex128
+)
+
+# struct module format characters of integer length fields, keyed by numpy kind and itemsize
+_LENGTH_FORMATS = {
+    ('u', 1): 'B', ('i', 1): 'b', ('u', 2): 'H', ('i', 2): 'h', 
+    ('u', 4): 'I', ('i', 4): 'i', ('u', 8): 'Q', ('i', 8): 'q'
+}
+
+def _gather_bytes(buf: np.ndarray, starts: np.ndarray, itemsize: int, out: np.ndarray = None) -> np.ndarray:
+    """
+    Copy itemsize bytes at each start offset of a uint8 buffer into the rows of a (len(starts), itemsize) array. 
+    Each run of evenly spaced starts is copied with a single strided view of the buffer.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    if out is None:
+        out = np.empty((len(starts), itemsize), dtype=np.uint8)
+    if not len(starts):
+        return out
+
+    steps = np.diff(starts)
+    breaks = np.flatnonzero(steps[1:] != steps[:-1]) + 1
+    run_starts = np.concatenate([[0], breaks, [len(starts)]])
+    for i0, i1 in zip(run_starts[:-1], run_starts[1:]):
+        # the last record of a run may start the next run with a different spacing
+        stride = steps[i0] if i0 < len(steps) else itemsize
+        out[i0:i1] = as_strided(buf[starts[i0]:], shape=(i1 - i0, itemsize), strides=(stride, 1), writeable=False)
+
+    return out
+
+
+def _struct_from_pickle(cls, data: np.ndarray):
+    """
+    Rebuild a pickled structure from the raw records, see Struct.__reduce_ex__
+    """
+    return data.view(cls)
+
+
+class varlen(np.ndarray):
+    """
+    Variable length member of a structure. The number of elements along the first axis is given by an integer 
+    field named by its path, e.g. 'hdr.nsamples'. Length fields must be defined before the first variable length 
+    member, and for packets they must be part of the header. The length field is set automatically when a value 
+    is given for the member.
+
+    Examples
+    --------
+    >>> class datapkt(Packet):
+    ...     hdr = pktheader(ptype=0x0B)
+    ...     samples = varlen(np.float32, length='hdr.nsamples')
+    >>> pkt = datapkt(samples=np.arange(5))
+    >>> pkt.hdr.nsamples
+    array([5], dtype=uint16)
+
+    Parameters
+    ----------
+    dtype : np.dtype
+        data type of the member.
+    length : str
+        path of the field that holds the number of elements.
+    shape : tuple, optional
+        shape of each element, default is scalar elements.
+    """
+
+    def __new__(cls, dtype, length: str, shape: tuple = ()):
+        obj = np.zeros((0,) + tuple(shape), dtype=dtype).view(cls)
+        obj.length = length
+        return obj
+
+    def __array_finalize__(self, obj):
+        self.length = getattr(obj, 'length', None)
+
 
 class StructMeta(type):
 
-    def __new__(metacls, cls, bases, classdict):
+    def __new__(metacls, cls, bases, classdict, align=False, packed=False):
         
         ## ignore the Packet and Struct classes themselves, we only want the metaclass to apply to subclasses of these
         if cls in ['Packet', 'Struct']:
@@ -20,6 +98,14 @@ class StructMeta(type):
         cur_bit_pos = 0
         cur_bit_dtype = None
         cur_bit_base = None
+        # variable length members and the path of their length field
+        var_fields = {}
+        # members defined before the first variable length member
+        fixed_names = set()
+        # checksum members, in definition order
+        checksums = {}
+        # enum lookup tables of bit fields
+        enums = {}
         ## walk through class definitions finding all supported numpy types, build bit fields, and attach enums
         for key, item in classdict.items():
 
@@ -32,6 +118,9 @@ class StructMeta(type):
                 raise RuntimeError('Protected field name: ({})'.format(key))
             
             item = type(item)([item]) if not hasattr(item, '__len__') else item
+
+            if not len(var_fields) and not isinstance(item, varlen):
+                fixed_names.add(key)
             
             # handle bit fields. the attribute 'bits' of items is an integer that determines how wide the item is in 
             # the bitfield. the item position in the bitfield is determined by it's order in the class 
@@ -39,8 +128,9 @@ class StructMeta(type):
             # in the bitfield definition.
             if getattr(item, 'bits', None) is not None:
 
-                # reset bitfield counters if dtype does not match the base or we are not currently in a bitfield
-                if cur_bit_pos == 0 or item.dtype != cur_bit_dtype:
+                # reset bitfield counters if dtype does not match the base, we are not currently in a bitfield, or
+                # the field does not fit in the remaining bits of the base (C starts a new storage unit).
+                if cur_bit_pos == 0 or item.dtype != cur_bit_dtype or cur_bit_pos + item.bits > item.itemsize * 8:
                     # create bitfield base for the next bit field members and reset position counter
                     cur_bit_dtype = item.dtype
                     cur_bit_pos = 0
@@ -49,6 +139,8 @@ class StructMeta(type):
 
                 # base field, bit position, number of bits, default initial value
                 bit_fields[key] = (cur_bit_base, cur_bit_pos, item.bits, item.item())
+                if getattr(item, 'enum', None) is not None:
+                    enums[key] = EnumTable(item.enum, item.bits, item.dtype)
                 # increment the bit position
                 cur_bit_pos += item.bits
 
@@ -60,26 +152,70 @@ class StructMeta(type):
                 ## add each item to the cls definition dictionary
                 cls_defs[key] = item
 
+                if isinstance(item, varlen):
+                    # the lengths must be known before the first variable member is reached when decoding a 
+                    # stream, so every length field is at the same offset in all records
+                    l_name = item.length.split('.')[0]
+                    if l_name not in fixed_names:
+                        raise ValueError(
+                            'Length field \'{}\' of \'{}\' must be defined before the first variable length '
+                            'member.'.format(item.length, key)
+                        )
+                    var_fields[key] = item.length
+
+                if isinstance(item, checksum):
+                    checksums[key] = item
+
         if len(cls_defs) < 1:
             raise ValueError('Empty structures not supported. Ensure members are supported types.')
 
+        if align and packed:
+            raise ValueError('Structures can\'t be both aligned and packed.')
+
         # set the maximum string length of the items in the class. Used for printing
         classdict['_printwidth'] = max(len(k) for k in cls_defs.keys()) + 3
 
-        classdict['_item_cls'] = {k: v.__class__ for k,v in cls_defs.items()}
+        classdict['_item_cls'] = {
+            k: np.ndarray if isinstance(v, (varlen, checksum)) else v.__class__ for k,v in cls_defs.items()
+        }
 
         # pass items found in class definition to constructor so it can add all fields as instance members
         classdict['_cls_defs'] = cls_defs
 
         classdict['_bit_fields'] = bit_fields
 
+        classdict['_var_fields'] = var_fields
+
+        classdict['_checksums'] = checksums
+
+        classdict['_enums'] = enums
+
+        # pad fields the same as a C compiler if align is True, i.e. class pkt(Struct, align=True)
+        classdict['_align'] = align
+
+        # packed structures keep their layout when nested in aligned structures, i.e. class pkt(Struct, packed=True)
+        # is the same as __attribute__((packed)) in C
+        classdict['_packed'] = packed
+
         # remove all items from the class so they won't appear as members
         [classdict.pop(key) for key, value in cls_defs.items() if key in classdict.keys()]
 
-        return super().__new__(metacls, cls, bases, classdict)
+        new_cls = super().__new__(metacls, cls, bases, classdict)
+
+        # compiled layout of the default record
+        new_cls._schema_cache = {}
+        # record dtype of each distinct set of member shapes
+        new_cls._dtype_cache = {}
+        new_cls.__schema__ = new_cls.get_schema()
+
+        return new_cls
 
 
 class Struct(np.ndarray, metaclass=StructMeta):
+    # checksum members of the structure, see checksum
+    _checksums = {}
+    # enum lookup tables of bit fields, see bitfields.EnumTable
+    _enums = {}
 
     def __new__(cls, input_=None, shape=None, byte_order='<', **kwargs):
 
@@ -87,25 +223,18 @@ class Struct(np.ndarray, metaclass=StructMeta):
 
         if input_ is not None:
             shape = input_.shape if shape is None else shape
-            dtype = input_.dtype
-            dtype.newbyteorder(byte_order)
+            dtype = input_.dtype.newbyteorder(byte_order)
             obj = np.zeros(shape, dtype=dtype).view(cls)
             obj[:] = input_
             return obj
         
-        for key, item in cls._cls_defs.items():
-            
-            if key in kwargs.keys():
-                kwval = kwargs[key]
-                shape_k = (1,) if not hasattr(kwval, '__len__') else np.array(kwval).shape
-            else:
-                shape_k = item.shape
- 
-            dtype[key] = (key, item.dtype, shape_k)
+        # shapes of members that are given as kwargs
+        shapes = {}
+        for key, kwval in kwargs.items():
+            if key in cls._cls_defs.keys():
+                shapes[key] = (1,) if not hasattr(kwval, '__len__') else np.array(kwval).shape
 
-        # update dtype and set structure items dictionary as instance member
-        dtype = np.dtype([d for d in dtype.values()])
-        dtype.newbyteorder(byte_order)
+        dtype = cls._build_dtype(shapes, byte_order)
 
         shape = (1,) if shape is None else shape
         obj = np.zeros(shape, dtype=dtype).view(cls)
@@ -114,20 +243,136 @@ class Struct(np.ndarray, metaclass=StructMeta):
 
             if key in  kwargs.keys():
                 obj[key] = kwargs[key]
-            else:
+            elif not isinstance(item, varlen):
                 obj[key] = item 
 
         return obj
-    
+
     def __init__(self, *args, **kwargs):
 
         # set initial values for each bitfield member
         for key, (base, pos, bits, default) in self._bit_fields.items():
             self.__setitem__(key, default)
+
+        # length fields of variable members follow the size of the member
+        for key, path in self._var_fields.items():
+            self._set_path(path, self.dtype.fields[key][0].shape[0])
     
+    @classmethod
+    def _build_dtype(cls, shapes: dict = {}, byte_order: str = None) -> np.dtype:
+        """
+        Returns the record dtype of the structure. Members use their default shape unless given in shapes, and
+        all fields use byte_order ('<', '>' or '=') if given.
+        """
+        cache_key = (tuple(shapes.items()), byte_order)
+        dtype = cls._dtype_cache.get(cache_key)
+        if dtype is not None:
+            return dtype
+
+        fields = []
+        for key, item in cls._cls_defs.items():
+            if cls._align and not getattr(item, '_packed', False):
+                dtype_k = align_dtype(item.dtype, item.__class__)
+            else:
+                dtype_k = item.dtype
+            fields.append((key, dtype_k, shapes.get(key, item.shape)))
+
+        dtype = np.dtype(fields, align=cls._align)
+        if byte_order is not None:
+            dtype = dtype.newbyteorder(byte_order)
+
+        cls._dtype_cache[cache_key] = dtype
+        return dtype
+
+    @classmethod
+    def var_shapes(cls, hdr) -> dict:
+        """
+        Returns the shapes of the variable length members, with lengths read from hdr. hdr is the first member of 
+        the structure (i.e. the packet header), and length fields must be part of it.
+        """
+        shapes = {}
+        for key, path in cls._var_fields.items():
+            name, _, sub_path = path.partition('.')
+            if name != next(iter(cls._cls_defs)):
+                raise ValueError(
+                    'Length field \'{}\' of \'{}\' is not part of the header.'.format(path, key)
+                )
+            n = hdr._get_path(sub_path) if sub_path else hdr
+            shapes[key] = (int(np.asarray(n).reshape(-1)[0]),) + cls._cls_defs[key].shape[1:]
+
+        return shapes
+
+    @classmethod
+    def size_from_header(cls, hdr) -> int:
+        """
+        Returns the size in bytes of a single record, with the lengths of variable members read from the header 
+        hdr. Dtypes are cached for each distinct length, no records are allocated.
+        """
+        if not len(cls._var_fields):
+            return cls.__schema__.itemsize
+        return cls._build_dtype(cls.var_shapes(hdr)).itemsize
+
+    @classmethod
+    def frombytes(cls, bytes_, shapes: dict = {}, byte_order: str = None):
+        """
+        Returns a single writable record decoded from bytes_, without initializing default values.
+
+        Parameters
+        ----------
+        bytes_ : bytes | bytearray
+            raw record data.
+        shapes : dict, optional
+            shapes of the variable length members, see var_shapes().
+        byte_order : str, optional
+            byte order of the data, '<' or '>'. Default is the byte order of the class definition.
+        """
+        return np.frombuffer(bytearray(bytes_), dtype=cls._build_dtype(shapes, byte_order)).view(cls)
+
+    def _get_path(self, path: str):
+        obj = self
+        for name in path.split('.'):
+            obj = getattr(obj, name)
+        return obj
+
+    def _set_path(self, path: str, value):
+        *parents, name = path.split('.')
+        obj = self
+        for p in parents:
+            obj = getattr(obj, p)
+        setattr(obj, name, value)
+
+    @classmethod
+    def get_schema(cls, dtype: np.dtype = None) -> Schema:
+        """
+        Returns the compiled layout of the structure, listing every leaf field with its byte offset, dtype, shape 
+        and bit position. The default record layout is also available as the class attribute ``__schema__``.
+
+        Parameters
+        ----------
+        dtype : np.dtype, optional
+            record dtype, if members have a different shape than the class definition. Defaults to the class 
+            record dtype.
+        """
+        dtype = cls._build_dtype() if dtype is None else dtype
+
+        if dtype not in cls._schema_cache:
+            cls._schema_cache[dtype] = compile_schema(cls, dtype)
+
+        return cls._schema_cache[dtype]
+
+    def flat_view(self) -> np.ndarray:
+        """
+        Returns a view of the records with a single level of fields, named by their full path. Nested fields
+        are accessed directly without chained views of each structure, i.e. ``pkt.flat_view()['hdr.ptype']``.
+        """
+        schema = self.get_schema(self.dtype)
+        return self.view(np.ndarray).view(schema.flat_dtype)
+
     def __setitem__(self, key, value):
         if isinstance(key, str) and key in self._bit_fields.keys():
             base, pos, bits, default = self._bit_fields[key]
+            if key in self._enums:
+                value = self._enums[key].encode(value)
             mask = 2**(bits) - 1
             # invert the mask in order to clear the current value
             fullmask = 2**(getattr(self, base).itemsize *8) - 1
@@ -165,6 +410,373 @@ class Struct(np.ndarray, metaclass=StructMeta):
         else:
             return ret
 
+    @classmethod
+    def frombuffer(
+        cls, 
+        buffer, 
+        count: int = -1, 
+        offset: int = 0, 
+        return_offsets: bool = False, 
+        byte_order: str = None, 
+        native: bool = False
+    ):
+        """
+        Returns a structure array of the records in buffer, without copying. Records use the default layout of the
+        class.
+
+        Structures with variable length members are decoded by walking the length fields of each record. Records
+        are grouped by length, and a dictionary of structure arrays keyed by the tuple of member lengths is 
+        returned. Each group is copied out of the buffer with one strided copy for each run of records that are 
+        evenly spaced in the buffer.
+
+        Parameters
+        ----------
+        buffer : bytes | bytearray | memoryview | np.ndarray
+            raw record data, e.g. read from a binary file produced by C code.
+        count : int, default: -1
+            number of records to read. Default is all the records in buffer.
+        offset : int, default: 0
+            start reading buffer at this byte offset.
+        return_offsets : bool, default: False
+            for structures with variable length members, also return a dictionary with the byte offset of each 
+            record in buffer, keyed by the same lengths as the records. Sorting the offsets restores the order 
+            of the records in the stream.
+        byte_order : str, optional
+            byte order of the data, '<' or '>'. Default is the byte order of the class definition.
+        native : bool, default: False
+            if True, records are returned in native byte order, converted with one byteswap of each array. 
+            Otherwise records are views of buffer in its own byte order.
+        """
+        if len(cls._var_fields):
+            groups, offsets = cls._frombuffer_var(buffer, count, offset, byte_order)
+            if native:
+                groups = {k: v.to_byte_order('=') for k, v in groups.items()}
+            return (groups, offsets) if return_offsets else groups
+        
+        dtype = cls._build_dtype({}, byte_order) if byte_order is not None else cls.__schema__.dtype
+        records = np.frombuffer(buffer, dtype=dtype, count=count, offset=offset).view(cls)
+        return records.to_byte_order('=') if native else records
+
+    @classmethod
+    def _frombuffer_var(cls, buffer, count: int, offset: int, byte_order: str = None) -> tuple:
+        buf = np.frombuffer(buffer, dtype=np.uint8)
+        mv = memoryview(buf)
+        schema = cls.get_schema(cls._build_dtype({}, byte_order))
+
+        # length fields are at the same offset in every record since they come before the variable members
+        readers = []
+        for key, path in cls._var_fields.items():
+            field = schema[path]
+            kind = (field.dtype.kind, field.dtype.itemsize)
+            if kind not in _LENGTH_FORMATS:
+                raise TypeError('Length field \'{}\' must be an integer.'.format(path))
+            fmt = ('>' if field.dtype.byteorder == '>' else '<') + _LENGTH_FORMATS[kind]
+            readers.append((struct.Struct(fmt), field.offset, field.bit_pos, field.mask))
+
+        # walk the records to find the start and lengths of each one
+        groups = {}
+        pos, n = offset, 0
+        while pos < len(buf) and (count < 0 or n < count):
+            lengths = []
+            for reader, f_offset, bit_pos, mask in readers:
+                v = reader.unpack_from(mv, pos + f_offset)[0]
+                lengths.append((v >> bit_pos) & mask if mask is not None else v)
+            lengths = tuple(lengths)
+
+            if lengths not in groups:
+                shapes = {k: (l,) + cls._cls_defs[k].shape[1:] for k, l in zip(cls._var_fields, lengths)}
+                groups[lengths] = (cls._build_dtype(shapes, byte_order), [])
+
+            dtype, starts = groups[lengths]
+            if pos + dtype.itemsize > len(buf):
+                raise ValueError('Buffer ends in the middle of a record at offset {}.'.format(pos))
+            starts.append(pos)
+            pos += dtype.itemsize
+            n += 1
+
+        # gather the bytes of each group into contiguous records
+        records, offsets = {}, {}
+        for lengths, (dtype, starts) in groups.items():
+            starts = np.asarray(starts, dtype=np.int64)
+            out = np.empty(len(starts), dtype=dtype)
+            _gather_bytes(buf, starts, dtype.itemsize, out.view(np.uint8).reshape(len(starts), dtype.itemsize))
+
+            records[lengths] = out.view(cls)
+            offsets[lengths] = starts
+
+        return records, offsets
+
+    def to_byte_order(self, byte_order: str):
+        """
+        Returns the records with every field in byte_order, '<', '>' or '=' for native. Records that are already in 
+        that byte order are returned as is. Otherwise they are converted with a single byteswap of the whole array 
+        (or a field by field copy if the fields have mixed byte orders).
+        """
+        dtype = self.dtype.newbyteorder(byte_order)
+        if dtype == self.dtype:
+            return self
+
+        raw = self.view(np.ndarray)
+        if dtype == self.dtype.newbyteorder('S'):
+            out = raw.byteswap().view(dtype)
+        else:
+            out = raw.astype(dtype)
+        return out.view(type(self))
+
+    def to_columns(self, fields: list = None, expand_bitfields: bool = True) -> dict:
+        """
+        Returns the fields of the records as contiguous arrays in native byte order (struct-of-arrays). Each column 
+        is copied out of the records in a single pass. 
+
+        Parameters
+        ----------
+        fields : list, optional
+            names of the fields to export, nested members are named by their path, i.e. 'hdr.ptype'. Naming a 
+            nested structure exports all of its fields. Default is every field, except members whose name starts 
+            with an underscore (i.e. padding).
+        expand_bitfields : bool, default: True
+            if True, bit fields are exported as separate columns, shifted and masked, instead of their base fields.
+
+        Returns
+        -------
+        dict
+            arrays keyed by field name. Scalar fields have the shape of the records, other fields have the shape of
+            the records followed by the shape of the field.
+        """
+        schema = self.get_schema(self.dtype)
+        flat = self.view(np.ndarray).view(schema.flat_dtype)
+        bases = {f.base for f in schema if f.is_bitfield}
+
+        if fields is None:
+            leaves = [f for f in schema if not f.name.split('.')[-1].startswith('_')]
+        else:
+            leaves = []
+            for name in fields:
+                match = [f for f in schema if f.name == name or f.name.startswith((name + '.', name + '['))]
+                if not len(match):
+                    raise ValueError('structure ({}) has no field: {}'.format(self.__class__.__name__, name))
+                leaves += match
+
+        columns = {}
+        for f in leaves:
+            if f.name in columns or (f.is_bitfield and not expand_bitfields):
+                continue
+            if expand_bitfields and f.name in bases and (fields is None or f.name not in fields):
+                continue
+            
+            # scalar members are stored with shape (1,) in each record
+            shape = self.shape + (f.shape if f.shape != (1,) else ())
+            dtype = f.dtype.newbyteorder('=')
+
+            if f.is_bitfield:
+                col = flat[f.base].astype(dtype).reshape(shape)
+                col >>= f.bit_pos
+                col &= f.mask
+            else:
+                col = np.empty(shape, dtype=dtype)
+                col[...] = flat[f.name].reshape(shape)
+            
+            columns[f.name] = col
+
+        return columns
+
+    @classmethod
+    def from_columns(cls, columns: dict, byte_order: str = '<'):
+        """
+        Returns a record array built from columns, the reverse of to_columns(). Each column is written into the 
+        records in a single pass, fields without a column keep their default values.
+
+        Parameters
+        ----------
+        columns : dict
+            arrays keyed by field name. All columns have the same length along the first axis, which is the number
+            of records. Bit fields are packed into their base fields.
+        byte_order : str, default: '<'
+            byte order of the records.
+        """
+        columns = {k: np.asarray(v) for k, v in columns.items()}
+        n = len(next(iter(columns.values())))
+
+        # variable length members are sized from their columns
+        var_kwargs = {
+            k: np.zeros(columns[k].shape[1:], dtype=cls._cls_defs[k].dtype) for k in cls._var_fields if k in columns
+        }
+        obj = cls(shape=(n,), byte_order=byte_order, **var_kwargs)
+
+        schema = obj.get_schema(obj.dtype)
+        flat = obj.view(np.ndarray).view(schema.flat_dtype)
+
+        for name, col in columns.items():
+            if name not in schema:
+                raise ValueError('structure ({}) has no field: {}'.format(cls.__name__, name))
+            f = schema[name]
+
+            if f.is_bitfield:
+                base = flat[f.base]
+                fullmask = (1 << (base.itemsize * 8)) - 1
+                base &= fullmask ^ (f.mask << f.bit_pos)
+                base |= (col.astype(base.dtype).reshape(base.shape) & f.mask) << f.bit_pos
+            else:
+                flat[name] = col.reshape(flat[name].shape)
+
+        return obj
+
+    def decode_enum(self, field: str, names: bool = False):
+        """
+        Decodes an enum bit field of the records. Raw values are mapped to categorical codes with one lookup in a 
+        table that is built with the class, and codes are mapped to names with another.
+
+        Examples
+        --------
+        >>> class Mode(enum.IntEnum):
+        ...     IDLE = 0
+        ...     RUNNING = 1
+        ...     FAULT = 4
+        >>> class status(Struct):
+        ...     mode = uint16(bits=3, enum=Mode)
+        ...     code = uint16(bits=13)
+        >>> codes, categories = recs.decode_enum('mode')
+        >>> recs.decode_enum('mode', names=True)
+        array(['IDLE', 'FAULT', 'RUNNING'], dtype='<U7')
+
+        Parameters
+        ----------
+        field : str
+            name of a bit field that was defined with an enum, nested fields are named by their path.
+        names : bool, default: False
+            if True, returns the member name of each record instead of codes. Values that are not members of the 
+            enum have an empty name.
+
+        Returns
+        -------
+        codes : np.ndarray
+            position of each value in categories, or -1 if the value is not a member of the enum.
+        categories : np.ndarray
+            names of the enum members.
+        """
+        schema = self.get_schema(self.dtype)
+        if field not in schema or schema[field].enum is None:
+            raise ValueError('structure ({}) has no enum field: {}'.format(self.__class__.__name__, field))
+        table = schema[field].enum
+
+        codes = table.codes(self.to_columns([field])[field])
+        if names:
+            return table.names(codes)
+        return codes, table.categories
+
+    def query(self, expr: str, indices: bool = False, chunk_size: int = 1 << 16):
+        """
+        Returns the records where a boolean expression of the fields is True. The expression is compiled once for 
+        the layout of the records and evaluated chunk_size records at a time, so records that are memory mapped 
+        from a file are read one chunk at a time.
+
+        Examples
+        --------
+        >>> recs = datapkt.frombuffer(np.memmap('capture.bin', mode='r'))
+        >>> recs.query('hdr.ptype == 3 & state1 > 5')
+        >>> recs.query('mode in ("IDLE", "FAULT") & samples[0] < -100', indices=True)
+
+        Parameters
+        ----------
+        expr : str
+            query expression. Fields are named by their path and elements of array fields are indexed with 
+            constants. &, | and ~ have the precedence of and, or and not. Enum bit fields can be compared with the
+            names of their members. See query.Query.
+        indices : bool, default: False
+            if True, returns the flat indices of the matching records instead of a copy of the records.
+        chunk_size : int, default: 65536
+            number of records evaluated at a time.
+        """
+        q = compile_query(expr, self.get_schema(self.dtype))
+        idx = q.indices(self, chunk_size)
+        if indices:
+            return idx
+        return self.view(np.ndarray).reshape(-1)[idx].view(type(self))
+
+    def to_ldarray(self, field: str, dims: tuple = None, coords_from: str = None, coords: dict = None):
+        """
+        Returns a field of the records as a labeled array. The data is a view of the records (strided, without 
+        copying), except for bit fields which are extracted into a new array.
+
+        Examples
+        --------
+        >>> pkts.to_ldarray('samples', dims=('time', 'channel'), coords_from='hdr.timestamp')
+
+        Parameters
+        ----------
+        field : str
+            name of a numeric field, nested fields are named by their path, i.e. 'payload.samples'.
+        dims : tuple, optional
+            dimension names, the first dimension is along the records followed by the dimensions of the field. 
+            Default is the name of coords_from (or 'index') for the records, and 'dim1', 'dim2'... for the field.
+        coords_from : str, optional
+            field with the coordinates of the records, i.e. a timestamp or sequence counter. Default is the record
+            index. 
+        coords : dict, optional
+            coordinates of other dimensions keyed by dimension name, the default is the element index.
+        """
+        from . ldarray import ldarray
+
+        schema = self.get_schema(self.dtype)
+        if field not in schema:
+            raise ValueError('structure ({}) has no field: {}'.format(self.__class__.__name__, field))
+        f = schema[field]
+
+        if self.ndim != 1:
+            raise ValueError('Labeled arrays can only be made from a 1D record array, got shape {}.'.format(self.shape))
+
+        # scalar members are stored with shape (1,) in each record
+        f_shape = f.shape if f.shape != (1,) else ()
+        if f.is_bitfield:
+            data = self.to_columns([field])[field]
+        else:
+            data = self.view(np.ndarray).view(schema.flat_dtype)[field].reshape(self.shape + f_shape)
+
+        if dims is None:
+            dims = (coords_from or 'index',) + tuple('dim{}'.format(i + 1) for i in range(len(f_shape)))
+        if len(dims) != data.ndim:
+            raise ValueError('Expected {} dimension names for field \'{}\', got {}.'.format(data.ndim, field, dims))
+
+        coords = dict(coords or {})
+        ld_coords = {}
+        for i, d in enumerate(dims):
+            if d in coords:
+                ld_coords[d] = coords[d]
+            elif i == 0 and coords_from is not None:
+                ld_coords[d] = self.to_columns([coords_from])[coords_from]
+            else:
+                ld_coords[d] = np.arange(data.shape[i])
+
+        return ldarray(data, coords=ld_coords)
+
+    def _record_bytes(self) -> np.ndarray:
+        # (records, itemsize) uint8 array of the raw record bytes, a view if the records are contiguous
+        raw = np.ascontiguousarray(self.view(np.ndarray)).reshape(-1)
+        return raw.view(np.uint8).reshape(len(raw), self.dtype.itemsize)
+
+    def update_checksums(self):
+        """
+        Compute and set the checksum members of every record. Checksums are computed in definition order, so a
+        checksum may cover an earlier one.
+        """
+        raw = self.view(np.ndarray)
+        for key, item in self._checksums.items():
+            start, stop = item.byte_range(self.dtype, key)
+            values = item.compute(self._record_bytes()[:, start:stop])
+            raw[key] = values.reshape(raw[key].shape)
+
+    def verify_checksums(self) -> np.ndarray:
+        """
+        Returns a boolean array that is True for records where every checksum member matches the record data.
+        """
+        raw = self.view(np.ndarray)
+        data = self._record_bytes()
+        valid = np.ones(len(data), dtype=bool)
+        for key, item in self._checksums.items():
+            start, stop = item.byte_range(self.dtype, key)
+            valid &= item.compute(data[:, start:stop]) == raw[key].reshape(-1)
+        return valid.reshape(self.shape)
+
     def unpack(self, bytes):
         """ 
         Unpacks byte data into the structured array for this object. 
@@ -174,6 +786,11 @@ class Struct(np.ndarray, metaclass=StructMeta):
     def get_size(self):
         return self.itemsize * self.size
 
+    def __reduce_ex__(self, protocol):
+        # pickle the raw records as a base ndarray, which supports out-of-band buffers with protocol 5. The class is
+        # pickled by reference.
+        return (_struct_from_pickle, (type(self), self.view(np.ndarray)))
+
     def __getattribute__(self, key):
 
         if key in ['_item_cls', '_bit_fields']:
@@ -199,7 +816,13 @@ class Struct(np.ndarray, metaclass=StructMeta):
         base_name = self.__class__.__bases__[0].__name__
 
         shape_str = self.shape if self.shape != (1,) else ''
-        build = '{} {}: {}\n'.format(base_name, self.__class__.__name__, shape_str)
+        build = '{} {}: {}'.format(base_name, self.__class__.__name__, shape_str)
+
+        # lead with the size of large arrays, only the first and last records are printed
+        if self.size > np.get_printoptions()['threshold']:
+            build += ' {} bytes/record, {:.3g} MB'.format(self.itemsize, self.nbytes / 1e6)
+
+        build += '\n'
         tabs_item = tabs + '    '
 
         # print first and last items
@@ -211,8 +834,9 @@ class Struct(np.ndarray, metaclass=StructMeta):
         for i, item_i in enumerate(idx):
             if len(idx) > 1:
                 build += tabs + '[\n'
+            record = self[tuple(item_i)]
             for k, v in self._cls_defs.items():
-                item = getattr(self[tuple(item_i)], k)
+                item = getattr(record, k)
 
                 key_tab = ' '*(self._printwidth-len(str(k))-1)
 
@@ -224,7 +848,7 @@ class Struct(np.ndarray, metaclass=StructMeta):
                 elif hasattr(v, 'bits') and v.bits is not None:
                         fields = [b_k for b_k, b in self._bit_fields.items() if b[0] == k]
                         for f in fields:
-                            b_item = getattr(self, f)
+                            b_item = getattr(record, f)
                             value_str = str(b_item).replace('\n', '\n\t\t'+tabs_item+key_tab)
 
                             _, pos, bits, _ = self._bit_fields[f]
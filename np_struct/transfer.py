@@ -1,18 +1,129 @@
 
+import os
 import time
 import socket
+import select
+import numpy as np
 from . structures import Struct
+from . buffers import RxBuffer
+from . stats import TransferStats
+from . capture import CaptureWriter, RX, TX
 from abc import abstractmethod
 import threading
+from collections import deque
 from typing import Callable
-from time import sleep
+from types import MappingProxyType
+from time import sleep, perf_counter_ns
 
 try:
     import serial
 except ImportError as e:
     pass
 
+class PacketTable(object):
+    """
+    Packet classes that share a header class, keyed by packet type. Tables are populated when packet classes are 
+    created and shared by all PacketTransfer instances using the same header.
+    """
+    # largest packet type value that can be used in the array lookup table
+    MAX_LUT_SIZE = 2**16
+
+    def __init__(self, header: type):
+        self.header = header
+        # packet class of each packet type
+        self.types = {}
+        # packet type lookup table indexed by the type value, built on the first lookup after a class is 
+        # registered. False if the types can't be used as list indices.
+        self._lut = None
+        # packet classes that have the same type as a registered class
+        self.conflicts = []
+
+    def register(self, pkt: type, ptype):
+
+        existing = self.types.get(ptype)
+
+        # classes that are defined again (i.e. reloaded modules or re-run notebook cells) replace the existing class
+        if existing is not None and (existing.__module__, existing.__qualname__) != (pkt.__module__, pkt.__qualname__):
+            self.conflicts.append((existing, pkt))
+            return
+
+        self.types[ptype] = pkt
+        # the lookup table is rebuilt lazily, so importing many packet classes doesn't rebuild it for each one
+        self._lut = None
+
+    @property
+    def lut(self) -> list:
+        """
+        Packet classes indexed by packet type, if all types are small non-negative integers. Unused types are None.
+        """
+        if self._lut is None:
+            self._lut = self._build_lut()
+        return self._lut if self._lut is not False else None
+
+    def _build_lut(self):
+        keys = list(self.types.keys())
+
+        if not all(isinstance(k, int) and 0 <= k < self.MAX_LUT_SIZE for k in keys):
+            return False
+        
+        lut = [None] * (max(keys, default=-1) + 1)
+        for k, v in self.types.items():
+            lut[k] = v
+        return lut
+
+    def get(self, ptype):
+        """
+        Returns the packet class of ptype, or None if the type is not recognized.
+        """
+        lut = self._lut
+        if lut is None:
+            lut = self.lut
+        if lut:
+            return lut[ptype] if isinstance(ptype, int) and 0 <= ptype < len(lut) else None
+        return self.types.get(ptype)
+
+
+# packet tables keyed by header class
+_PACKET_TABLES = {}
+
+
+def get_packet_table(header: type) -> PacketTable:
+    """
+    Returns the table of packet classes that use header as their first member.
+    """
+    if header not in _PACKET_TABLES:
+        _PACKET_TABLES[header] = PacketTable(header)
+    return _PACKET_TABLES[header]
+
+
 class Packet(Struct):
+    # packet type of registered packet classes
+    _ptype = None
+
+    def __init_subclass__(cls, **kwargs):
+        # called once when each packet class (at any depth of inheritance) is created. Packets that have a header 
+        # as their first member are registered by the header class and packet type.
+        super().__init_subclass__(**kwargs)
+
+        hdr_name, pkt_hdr = next(iter(cls._cls_defs.items()))
+
+        # packets are sized from the header (first member) before the rest of the packet is read
+        for key, path in cls._var_fields.items():
+            if path.split('.')[0] != hdr_name:
+                raise ValueError(
+                    'Length field \'{}\' of \'{}\' must be part of the header \'{}\'.'.format(path, key, hdr_name)
+                )
+
+        if not isinstance(pkt_hdr, Packet):
+            return
+
+        try:
+            ptype = pkt_hdr.get_ptype().item()
+        except NotImplementedError:
+            return
+
+        cls._ptype = ptype
+        get_packet_table(pkt_hdr.__class__).register(cls, ptype)
     
     @abstractmethod
     def get_ptype(self):
@@ -24,9 +135,13 @@ class Packet(Struct):
     @classmethod
     def from_header(cls, hdr, **kwargs):
         """
-        Initializes an empty packet object given a fully populated header. 
+        Initializes an empty packet object given a fully populated header. Variable length members are sized from
+        their length fields in the header.
         """
-        return cls()
+        if len(cls._var_fields):
+            shapes = cls.var_shapes(hdr)
+            return cls(**{k: np.zeros(shape, dtype=cls._cls_defs[k].dtype) for k, shape in shapes.items()}, **kwargs)
+        return cls(**kwargs)
 
 
 class PacketError(TypeError):
@@ -38,75 +153,315 @@ class PacketTypeError(PacketError):
 class PacketSizeError(PacketError):
     pass
 
+class PacketChecksumError(PacketError):
+    pass
+
+def _iov_max() -> int:
+    # largest number of buffers passed to a single sendmsg call
+    try:
+        return os.sysconf('SC_IOV_MAX')
+    except (AttributeError, ValueError, OSError):
+        return 1024
+
+_IOV_MAX = _iov_max()
+
+# attribute lookups on packets go through the Struct field lookup first, stats read ndarray attributes directly
+_nbytes = np.ndarray.nbytes.__get__
+_nrecords = np.ndarray.size.__get__
+
+
+def _packet_buffer(packet: Struct) -> memoryview:
+    """
+    Returns a byte memoryview of the packet records, without copying if the packet is contiguous.
+    """
+    return memoryview(np.ascontiguousarray(packet.view(np.ndarray)).reshape(-1).view(np.uint8))
+
+
 class PacketTransfer(object):
+    # packets are batched by pkt_write when either limit is set, see set_batching()
+    max_delay = None
+    max_bytes = None
+    # buffers of batched packets waiting to be sent
+    _tx_queue = ()
+    _tx_bytes = 0
+    _tx_timer = None
+    _tx_lock = None
+    # counters and latency histograms, see set_stats()
+    stats = None
+    # packet recorder, see set_capture()
+    capture = None
+    _capture_owned = False
     
     def __init__(self, header: Packet, **kwargs):
 
         self._header = header
         self._byte_order = kwargs.pop('byte_order', '<')
         self._pkt_header_params = kwargs
-        self._pkt_types = {}
 
         ## header instance is re-used for every read
         self._hdr_obj = self._header(byte_order=self._byte_order)
         self._header_size = self._hdr_obj.get_size()
 
-        # create a map (using the type as the key) of the packets that have the header as their first member
-        for pkt in Packet.__subclasses__():
-
-            pkt_hdr = list(pkt._cls_defs.values())[0]
+        # packet classes that have the header as their first member, keyed by type. The table is shared with all
+        # interfaces that use the same header.
+        self._pkt_table = get_packet_table(header)
+        # read-only view of the registered packet types
+        self._pkt_types = MappingProxyType(self._pkt_table.types)
 
-            if pkt_hdr.__class__ != header:
-                 continue
-            
-            ptype = pkt_hdr.get_ptype().item()
-            
-            if ptype in self._pkt_types.keys():
-                raise RuntimeError('Duplicate type fields for \'{}\' and \'{}\''.format(
-                    self._pkt_types[ptype].__name__, pkt.__name__)
-                )
-            
-            self._pkt_types[ptype] = pkt
+        if len(self._pkt_table.conflicts):
+            existing, pkt = self._pkt_table.conflicts[0]
+            raise RuntimeError('Duplicate type fields for \'{}\' and \'{}\''.format(existing.__name__, pkt.__name__))
 
     def pkt_read(self) -> Packet:
         """ 
         Reads a packet from an interface. 
         """
-        bytes_ = self.read(self._header_size)
+        # send batched packets first, the response may depend on them
+        self.tx_flush()
+
+        stats = self.stats
+        if stats is None and self.capture is None:
+            return self._pkt_decode(self.read(self._header_size))
+
+        try:
+            bytes_ = self.read(self._header_size)
+            start = perf_counter_ns()
+            pkt = self._pkt_decode(bytes_)
+        except TimeoutError:
+            if stats is not None:
+                stats.record_timeout()
+            raise
+        except PacketTypeError:
+            if stats is not None:
+                stats.record_type_error(self._hdr_obj.get_ptype().item())
+            raise
+
+        if stats is not None:
+            stats.record_rx(type(pkt)._ptype, _nbytes(pkt), perf_counter_ns() - start)
+        return pkt
 
+    def _pkt_decode(self, bytes_: bytes) -> Packet:
+        """
+        Decodes a packet given the header bytes, reading the rest of the packet from the interface. The raw bytes
+        are captured before decoding, so packets with an unknown type (only the header) or a checksum mismatch
+        are recorded too.
+        """
         # unpack header into base packet 
         self._hdr_obj.unpack(bytes_[:self._header_size])
 
         ptype = self._hdr_obj.get_ptype().item()
+        pkt_cls = self._pkt_table.get(ptype)
 
-        if ptype not in self._pkt_types.keys():
+        if pkt_cls is None:
+            if self.capture is not None:
+                self.capture.record(bytes_, ptype, RX)
             raise PacketTypeError('Packet type \'{}\' not recognized. Received: {}'.format(ptype, bytes_))
         
-        # create empty packet of recognized packet type
-        pkt = self._pkt_types[ptype].from_header(self._hdr_obj, byte_order=self._byte_order)
-
-        # unpack remaining bytes into packet
-        rm_len = int(pkt.get_size() - self._header_size)
+        # packets that build themselves from the header are allocated first to find their size
+        if pkt_cls.from_header.__func__ is not Packet.from_header.__func__ and not len(pkt_cls._var_fields):
+            pkt = pkt_cls.from_header(self._hdr_obj, byte_order=self._byte_order)
+
+            # unpack remaining bytes into packet
+            rm_len = int(pkt.get_size() - self._header_size)
+            if rm_len > 0:
+                bytes_ += self.read(rm_len)
+            if self.capture is not None:
+                self.capture.record(bytes_, ptype, RX)
+
+            pkt.unpack(bytes_)
+            return self._verify(pkt)
+
+        # the size of other packets is known from the header, the packet is decoded directly from the bytes
+        shapes = pkt_cls.var_shapes(self._hdr_obj)
+        rm_len = pkt_cls._build_dtype(shapes, self._byte_order).itemsize - self._header_size
         if rm_len > 0:
             bytes_ += self.read(rm_len)
-
-        pkt.unpack(bytes_)
+        if self.capture is not None:
+            self.capture.record(bytes_, ptype, RX)
                 
+        return self._verify(pkt_cls.frombytes(bytes_, shapes, self._byte_order))
+
+    def _verify(self, pkt: Packet) -> Packet:
+        # check the checksum members of a received packet
+        if len(type(pkt)._checksums) and not pkt.verify_checksums().all():
+            raise PacketChecksumError('Checksum mismatch in received \'{}\' packet.'.format(type(pkt).__name__))
         return pkt
 
     def pkt_write(self, packet: Packet):
         """
-        Send packet over an interface.
+        Send packet over an interface. The packet is queued if batching is enabled, see set_batching().
+        """
+        if self.max_delay is None and self.max_bytes is None:
+            # packets are sent in the byte order of the interface
+            if self._byte_order != '<':
+                packet = packet.to_byte_order(self._byte_order)
+            if len(type(packet)._checksums):
+                packet.update_checksums()
+            buffer = _packet_buffer(packet)
+            self.write(buffer)
+            if self.stats is not None or self.capture is not None:
+                self._record_tx([packet], [buffer])
+        else:
+            self.pkt_write_many([packet])
+
+    def pkt_write_many(self, packets: list):
+        """
+        Send several packets with as few writes as possible. Packet buffers are gathered without copying and sent
+        with a single vectored write where the interface supports it. If batching is enabled, the packets are 
+        copied into the queue so they can be reused by the caller right away.
         """
-        self.write(bytes(packet))
+        if self._byte_order != '<':
+            packets = [p.to_byte_order(self._byte_order) for p in packets]
+
+        for p in packets:
+            if len(type(p)._checksums):
+                p.update_checksums()
+
+        if self.max_delay is None and self.max_bytes is None:
+            buffers = [_packet_buffer(p) for p in packets]
+            self.write_many(buffers)
+        else:
+            buffers = [bytes(_packet_buffer(p)) for p in packets]
+            self._tx_enqueue(buffers)
+
+        if self.stats is not None or self.capture is not None:
+            self._record_tx(packets, buffers)
+
+    def _record_tx(self, packets: list, buffers: list):
+        # add sent packets to the stats and capture
+        for p, b in zip(packets, buffers):
+            ptype, n = type(p)._ptype, _nrecords(p)
+            if self.stats is not None:
+                self.stats.record_tx(ptype, len(b), n)
+            if self.capture is not None:
+                # each record of a packet array is captured as a packet
+                size = len(b) // max(n, 1)
+                for i in range(0, len(b), max(size, 1)):
+                    self.capture.record(b[i:i + size], ptype, TX)
+
+    def _tx_enqueue(self, buffers: list):
+        # add buffers to the batching queue, starting the delay timer if the queue was empty
+        with self._tx_lock:
+            if not len(self._tx_queue):
+                self._tx_queue = []
+                # send the queue from a timer thread if no other write or read sends it first
+                if self.max_delay is not None:
+                    self._tx_timer = threading.Timer(self.max_delay, self.tx_flush)
+                    self._tx_timer.daemon = True
+                    self._tx_timer.start()
+
+            self._tx_queue.extend(buffers)
+            self._tx_bytes += sum(len(b) for b in buffers)
+            full = self.max_bytes is not None and self._tx_bytes >= self.max_bytes
+
+        if full:
+            self.tx_flush()
+
+    def set_batching(self, max_delay: float = None, max_bytes: int = None):
+        """
+        Batch small packets written with pkt_write or pkt_write_many. Queued packets are sent together once 
+        max_bytes are queued, or max_delay seconds after the first packet was queued. Queued packets are also sent
+        before each pkt_read, or explicitly with tx_flush(). 
+        
+        Batching is disabled if both limits are None.
+
+        Parameters
+        ----------
+        max_delay : float, optional
+            longest time in seconds a packet is held in the queue. The queue is sent from a timer thread when the 
+            delay expires.
+        max_bytes : int, optional
+            number of queued bytes that triggers a write.
+        """
+        self.tx_flush()
+        if self._tx_lock is None:
+            self._tx_lock = threading.Lock()
+        self.max_delay = max_delay
+        self.max_bytes = max_bytes
+
+    def tx_flush(self):
+        """
+        Send all packets queued by batched writes.
+        """
+        if not len(self._tx_queue):
+            return
+
+        with self._tx_lock:
+            queue = self._tx_queue
+            self._tx_queue, self._tx_bytes = [], 0
+
+            if self._tx_timer is not None:
+                self._tx_timer.cancel()
+                self._tx_timer = None
+
+            # writes stay under the lock so batches are sent in order
+            if len(queue):
+                self.write_many(queue)
+
+    def write_many(self, buffers: list):
+        """
+        Write a list of byte buffers to the interface. The default joins the buffers into a single write.
+        """
+        self.write(b''.join(buffers))
     
     def pkt_sendrecv(self, packet: Packet) -> Packet:
         """
         Send packet over an interface and wait for a packet response.
         """
         self.flush(False)
+
+        if self.stats is None:
+            self.pkt_write(packet)
+            return self.pkt_read()
+        
+        start = perf_counter_ns()
         self.pkt_write(packet)
-        return self.pkt_read()
+        ret = self.pkt_read()
+        self.stats.record_rtt(type(packet)._ptype, perf_counter_ns() - start)
+        return ret
+
+    def set_capture(self, capture=None) -> CaptureWriter:
+        """
+        Record every packet read with pkt_read or written with pkt_write/pkt_write_many, see CaptureWriter. 
+
+        Parameters
+        ----------
+        capture : str | Path | CaptureWriter, optional
+            capture to append packets to. If a path is given, the capture is opened and closed by the interface
+            when it is replaced. Recording stops if None.
+
+        Returns
+        -------
+        CaptureWriter
+            the capture, also available as the ``capture`` attribute.
+        """
+        if self.capture is not None and self._capture_owned:
+            self.capture.close()
+
+        self._capture_owned = capture is not None and not isinstance(capture, CaptureWriter)
+        self.capture = CaptureWriter(capture) if self._capture_owned else capture
+        return self.capture
+
+    def set_stats(self, enabled: bool = True, hook: Callable = None) -> TransferStats:
+        """
+        Count sent and received packets by type, with histograms of decode and pkt_sendrecv round-trip latencies.
+        Stats are disabled by default, when enabled they add about 1.5 microseconds to each packet sent or received
+        (compare the transfer.loopback_pkt_read and transfer.loopback_pkt_read_stats benchmarks).
+        
+        Parameters
+        ----------
+        enabled : bool, default: True
+            if False, stats are disabled and discarded.
+        hook : Callable, optional
+            called as hook(event, ptype, nbytes, ns) for each recorded event, see TransferStats.
+
+        Returns
+        -------
+        TransferStats
+            stats of this interface, also available as the ``stats`` attribute. Use stats.snapshot() to read them.
+        """
+        self.stats = TransferStats(hook) if enabled else None
+        return self.stats
     
     @abstractmethod
     def flush(self, reset_tx=True): 
@@ -128,41 +483,120 @@ class PacketTransfer(object):
 
 
 class LoopBack(PacketTransfer):
-    """ Used for debugging Packet interfaces"""
-
-    def __init__(self, timeout = 1, header: Packet = None, addr=0x1, **kwargs):
+    """ 
+    In-memory interface, bytes written to the interface are read back in order. Used for debugging Packet 
+    interfaces and load testing packet handlers without sockets. 
+    
+    Written buffers are kept in a queue of chunks, so reads and writes cost the same regardless of how much data is
+    waiting. The interface is thread-safe and can be used by a producer and a consumer thread.
+
+    Parameters
+    ----------
+    timeout : float, default: 1
+        time in seconds that reads wait for data, and that writes wait for space if the capacity is limited.
+    header : Packet, optional
+        packet header class.
+    capacity : int, optional
+        largest number of unread bytes. Writes block until a reader makes space for them. A write larger than the 
+        capacity is accepted once all earlier data is read. Unlimited by default.
+    """
+
+    def __init__(self, timeout = 1, header: Packet = None, addr=0x1, capacity: int = None, **kwargs):
 
         self.timeout = timeout
         self.addr = addr
-        self.rx_buffer = b''
+        self.capacity = capacity
         self.tx_buffer = b''
 
+        # unread chunks, the first _head bytes of the first chunk have already been read
+        self._chunks = deque()
+        self._head = 0
+        self._size = 0
+        # notified when data is written or read
+        self._cond = threading.Condition()
+
         if (header != None):
             super(LoopBack, self).__init__(header, addr=addr, **kwargs)
+
+    @property
+    def in_waiting(self) -> int:
+        """ Number of unread bytes. """
+        return self._size
+
+    @property
+    def rx_buffer(self) -> bytes:
+        """ Copy of the unread bytes. """
+        with self._cond:
+            data = b''.join(self._chunks)
+            return data[self._head:]
         
     def flush(self, reset_tx=True):
-        self.rx_buffer = b''
+        with self._cond:
+            self._chunks.clear()
+            self._head = self._size = 0
+            self._cond.notify_all()
         if (reset_tx):
-            self.rx_buffer = b''
+            self.tx_buffer = b''
 
     def write(self, bytes_):
-        self.tx_buffer = bytes_
-        self.rx_buffer += bytes_
+        self.write_many([bytes_])
+
+    def write_many(self, buffers: list):
+        # written buffers are copied so the caller can reuse them
+        chunks = [bytes(b) for b in buffers]
+        nbytes = sum(len(c) for c in chunks)
+        
+        with self._cond:
+            if self.capacity is not None and self._size and self._size + nbytes > self.capacity:
+                if not self._cond.wait_for(
+                    lambda: not self._size or self._size + nbytes <= self.capacity, self.timeout
+                ):
+                    raise TimeoutError(
+                        f"Loopback interface timed out attempting to write {nbytes} bytes. Unread: {self._size}"
+                    )
+
+            self._chunks.extend(c for c in chunks if len(c))
+            self._size += nbytes
+            self._cond.notify_all()
+
+        if len(chunks):
+            self.tx_buffer = chunks[-1]
 
     def read(self, nbytes: int):
 
-        if len(self.rx_buffer) < nbytes:
-            raise RuntimeError(
-                f"Loopback interface timed out attempting to read {nbytes} bytes. Received: {self.rx_buffer}"
-            )
+        with self._cond:
+            if self._size < nbytes and not self._cond.wait_for(lambda: self._size >= nbytes, self.timeout):
+                raise TimeoutError(
+                    f"Loopback interface timed out attempting to read {nbytes} bytes. Received: {self.rx_buffer}"
+                )
 
-        ret = self.rx_buffer[:nbytes]
-        self.rx_buffer = self.rx_buffer[nbytes:]
-        return ret
+            # take whole chunks, and the start of the last one
+            parts, need = [], nbytes
+            while need:
+                chunk, head = self._chunks[0], self._head
+                avail = len(chunk) - head
+
+                if avail <= need:
+                    parts.append(chunk[head:] if head else chunk)
+                    self._chunks.popleft()
+                    self._head = 0
+                    need -= avail
+                else:
+                    parts.append(chunk[head:head + need])
+                    self._head += need
+                    need = 0
+
+            self._size -= nbytes
+            if self.capacity is not None:
+                self._cond.notify_all()
+
+        return parts[0] if len(parts) == 1 else b''.join(parts)
 
 
 class SerialInterface(PacketTransfer):
     OPEN_PORTS = {}
+    # how often the background reader checks if it should stop, in seconds. Reads return as soon as data arrives.
+    READER_POLL = 0.1
 
     def __init__(
         self, 
@@ -171,23 +605,50 @@ class SerialInterface(PacketTransfer):
         timeout: float = 1, 
         header: Packet = None, 
         addr=0x1, 
+        threaded: bool = False,
+        byte_order: str = '<',
     ):
+        """
+        Open a serial port that supports reading/writing structures.
+
+        Parameters:
+        -----------
+        port: str
+            device name, e.g. 'COM3' or '/dev/ttyUSB0'
+        timeout: float, default: 1
+            time in seconds that reads wait for data
+        threaded: bool, default: False
+            if True, a background thread reads the port into a receive buffer as data arrives and reads wait for 
+            the thread to deliver enough bytes. Otherwise reads block on the port directly.
+        byte_order: str, default: '<'
+            byte order of packets on the port, '<' or '>'.
+        """
+        # set before the port is opened, so close() works if opening fails
+        self.ser = None
+        self._reader = None
+        self._reader_stop = threading.Event()
 
         ser = serial.Serial()
         ser.port = port
         ser.baudrate = baudrate
-        ser.timeout = timeout
+        ser.timeout = min(timeout, self.READER_POLL) if threaded else timeout
         ser.parity= serial.PARITY_NONE
 
         self.timeout = timeout
         self.ser = ser
         self.port = port
         self.addr = addr
+        self.threaded = threaded
+
+        # received bytes that have not been read yet. The condition is notified when the reader thread adds data.
+        self._rxbuffer = RxBuffer()
+        self._rx_cond = threading.Condition()
+
         self.open()
         self.flush()
 
         if (header != None):
-            super(SerialInterface, self).__init__(header, addr=addr)
+            super(SerialInterface, self).__init__(header, addr=addr, byte_order=byte_order)
 
     @classmethod
     def open_by_name(
@@ -196,7 +657,8 @@ class SerialInterface(PacketTransfer):
         baudrate: int = 115200, 
         timeout: float = 1, 
         header: Packet = None, 
-        addr=0x1
+        addr=0x1,
+        threaded: bool = False,
     ) -> "SerialInterface":
         """
         Opens a connection to the first port found that contains the given description.
@@ -207,7 +669,7 @@ class SerialInterface(PacketTransfer):
 
         for device in device_list:
             if name.lower() in device.description.lower():
-                return SerialInterface(device.device, baudrate, timeout, header, addr)
+                return SerialInterface(device.device, baudrate, timeout, header, addr, threaded)
             
         raise ValueError(
             f"No port found matching: '{name}'"
@@ -218,69 +680,114 @@ class SerialInterface(PacketTransfer):
         return cls.OPEN_PORTS
 
     def flush(self, reset_tx=True):
-        self.ser.read_all()
+        with self._rx_cond:
+            if self.threaded:
+                self.ser.reset_input_buffer()
+            else:
+                self.ser.read_all()
+            self._rxbuffer.clear()
+
         if (reset_tx):
             self.ser.reset_output_buffer()
 
     def write(self, data: bytes):
         self.ser.write(data)
 
-    def read(self, size: int) -> bytes:
+    def _wait(self, ready: Callable[[], bool], nbytes: Callable[[], int]) -> bool:
         """
-        Reads N bytes from the serial port. 
+        Wait until ready() is True or the interface times out. Must be called with the receive lock held.
+        nbytes() is the number of bytes to request from the port when reading without the background thread.
         """
-        timeout = time.time() + self.timeout
+        if self.threaded:
+            return self._rx_cond.wait_for(ready, self.timeout)
+
+        deadline = time.monotonic() + self.timeout
+        while not ready():
+            if time.monotonic() >= deadline:
+                return False
+            # blocks until the bytes arrive or the port times out, without polling
+            data = self.ser.read(max(nbytes(), self.ser.in_waiting, 1))
+            self._rxbuffer.write(data)
+
+        return True
+
+    def _read_loop(self):
+        # background reader, blocks on the port and hands received bytes to the readers
+        ser = self.ser
+        while not self._reader_stop.is_set():
+            try:
+                data = ser.read(max(1, min(ser.in_waiting, self._rxbuffer.chunk)))
+            except (serial.SerialException, OSError, TypeError, AttributeError):
+                # port was closed
+                break
 
-        while(time.time() < timeout):
-            if (self.ser.in_waiting >= size):
-                return self.ser.read(size)
+            if len(data):
+                with self._rx_cond:
+                    self._rxbuffer.write(data)
+                    self._rx_cond.notify_all()
 
-        if (time.time() >= timeout):
-            atport = self.ser.read(self.ser.in_waiting)
-            self.flush()
+    def read(self, size: int) -> bytes:
+        """
+        Reads N bytes from the serial port. 
+        """
+        with self._rx_cond:
+            rx = self._rxbuffer
+            if not self._wait(lambda: len(rx) >= size, lambda: size - len(rx)):
+                atport = rx.read(len(rx))
+                raise TimeoutError(
+                    f"Serial interface timed out ({self.timeout:.2f}s) attempting to read {size} bytes. Received: {atport}"
+                )
 
-            raise TimeoutError(
-                f"Serial interface timed out ({self.timeout:.2f}s) attempting to read {size} bytes. Received: {atport}"
-            )
+            return rx.read(size)
         
     def read_until(self, expected: bytes, count: int = 1) -> bytes:
         """
         Read until the expected sequence of bytes appears N (default = 1) times.
         """
-        buffer = b''
-        timeout = time.time() + self.timeout
-
-        found = 0
-        while (time.time() < timeout) and found < count:
-            buffer += self.ser.read_until(expected)
-            found += 1
-
-        if found < count:
-            atport = self.ser.read(self.ser.in_waiting)
-            self.flush()
-            raise TimeoutError(
-                f"Serial interface timed out ({self.timeout:.2f}s) waiting for '{expected}'. Received: {atport}"
-            )
+        with self._rx_cond:
+            rx = self._rxbuffer
+            # only newly received bytes are searched for the delimiter
+            if not self._wait(lambda: rx.find(expected, count) >= 0, lambda: 1):
+                atport = rx.read(len(rx))
+                raise TimeoutError(
+                    f"Serial interface timed out ({self.timeout:.2f}s) waiting for '{expected}'. Received: {atport}"
+                )
 
-        return buffer
+            return rx.read(rx.find(expected, count))
 
     def read_all(self) -> bytes:
         """
         Immediately return all bytes in the receive buffer. Returns b'' if no data is available.
         """
-        return self.ser.read_all()
+        with self._rx_cond:
+            data = self._rxbuffer.read(len(self._rxbuffer))
+        return data if self.threaded else data + self.ser.read_all()
 
     def is_open(self):
-        return self.ser.is_open
+        return self.ser is not None and self.ser.is_open
 
     def open(self):
         if (self.port in self.OPEN_PORTS):
             self.OPEN_PORTS[self.port].close()
         self.ser.open()
         self.OPEN_PORTS[self.port] = self
+
+        if self.threaded and self._reader is None:
+            self._reader_stop.clear()
+            self._reader = threading.Thread(target=self._read_loop, daemon=True)
+            self._reader.start()
+
         return self
 
     def close(self):
+        if self._reader is not None:
+            self._reader_stop.set()
+            # wake the reader if it's blocked on the port
+            if hasattr(self.ser, 'cancel_read'):
+                self.ser.cancel_read()
+            self._reader.join()
+            self._reader = None
+
         if (self.is_open()):
             self.OPEN_PORTS.pop(self.port)
             self.ser.close()
@@ -298,7 +805,9 @@ class SerialInterface(PacketTransfer):
 class SocketInterface(PacketTransfer):
     open_ports = {}
 
-    def __init__(self, target=None, host=None, timeout=2, header: Packet = None):
+    def __init__(
+        self, target=None, host=None, timeout=2, header: Packet = None, rcvbuf: int = None, byte_order: str = '<'
+    ):
         """
         Open a server or client socket that supports reading/writing structures. 
 
@@ -310,6 +819,11 @@ class SocketInterface(PacketTransfer):
         host: tuple, optional
             socket address (ip addr, port) that server will bind to, e.g. host = ('localhost', 50001).
             If provided, socket is configured as a server
+        rcvbuf: int, optional
+            size of the kernel receive buffer (SO_RCVBUF) in bytes. Uses the OS default if not given. The 
+            receive buffer of the interface starts at the same size.
+        byte_order: str, default: '<'
+            byte order of packets on the socket, '<' or '>'.
         """
         if target and host:
              self._udp = True
@@ -321,17 +835,19 @@ class SocketInterface(PacketTransfer):
         self._host_skt = None
 
         self.timeout = timeout
-        self._rxbuffer = b''
+        self.rcvbuf = rcvbuf
+        # data is received directly into a preallocated buffer
+        self._rxbuffer = RxBuffer(size=rcvbuf if rcvbuf else 1 << 16)
 
         self.socket = None
         self._connected = False
         self._host_skt = None
 
         if (header != None):
-            super(SocketInterface, self).__init__(header, addr=0x1)
+            super(SocketInterface, self).__init__(header, addr=0x1, byte_order=byte_order)
         
     def flush(self, *args, **kwargs):
-        self._rxbuffer = b''
+        self._rxbuffer.clear()
 
     def write(self, data: bytes):
         if not self.is_connected():
@@ -341,6 +857,34 @@ class SocketInterface(PacketTransfer):
             self.socket.sendto(data, self.target)
         else:
             self.socket.sendall(data)
+
+    def write_many(self, buffers: list):
+        """
+        Send a list of byte buffers with vectored writes (sendmsg), without joining them. In UDP mode the buffers
+        are sent as a single datagram.
+        """
+        if not self.is_connected():
+            raise RuntimeError('Socket is not connected.')
+        
+        if not hasattr(self.socket, 'sendmsg'):
+            return self.write(b''.join(buffers))
+        
+        if self._udp:
+            self.socket.sendmsg(buffers, [], 0, self.target)
+            return
+
+        buffers = [memoryview(b).cast('B') for b in buffers]
+        i = 0
+        while i < len(buffers):
+            # the number of buffers in a single call is limited by the OS (IOV_MAX)
+            sent = self.socket.sendmsg(buffers[i:i + _IOV_MAX])
+
+            # skip the buffers that were fully sent, and the sent part of a partially sent buffer
+            while i < len(buffers) and sent >= buffers[i].nbytes:
+                sent -= buffers[i].nbytes
+                i += 1
+            if sent > 0:
+                buffers[i] = buffers[i][sent:]
         
     def read_until(self, expected: bytes, count: int = 1) -> bytes:
         """
@@ -351,25 +895,21 @@ class SocketInterface(PacketTransfer):
         
         timeout = time.time() + self.timeout
 
-        found = 0
-        while (time.time() < timeout) and found < count:
-            self._rxbuffer += self.socket.recv(4096)
-            found = self._rxbuffer.count(expected)
+        # only newly received bytes are searched for the delimiter
+        n = self._rxbuffer.find(expected, count)
+        while (time.time() < timeout) and n < 0:
+            if not self._recv():
+                break
+            n = self._rxbuffer.find(expected, count)
 
-        if found < count:
+        if n < 0:
+            received = bytes(self._rxbuffer)
             self.close()
             raise TimeoutError(
-                f"Socket interface timed out ({self.timeout:.2f}s) waiting for '{expected}'. Received: {self._rxbuffer}"
+                f"Socket interface timed out ({self.timeout:.2f}s) waiting for '{expected}'. Received: {received}"
             )
 
-        # get index of nth instance in rx buffer
-        idx = -1
-        for _ in range(count):
-            idx = self._rxbuffer.index(expected, idx + 1)
-
-        rd = self._rxbuffer[:idx + 1]
-        self._rxbuffer = self._rxbuffer[idx + 1:]
-        return rd
+        return self._rxbuffer.read(n)
 
     def read(self, size: int) -> bytes:
         """
@@ -381,16 +921,26 @@ class SocketInterface(PacketTransfer):
         timeout = time.time() + self.timeout
 
         while (time.time() < timeout) and (len(self._rxbuffer) < size):
-            self._rxbuffer += self.socket.recv(4096)
+            # receive at least the missing bytes in a single call if they are available
+            if not self._recv(max(size - len(self._rxbuffer), self._rxbuffer.chunk)):
+                break
 
-        if (time.time() >= timeout):
+        if len(self._rxbuffer) < size:
+            received = bytes(self._rxbuffer)
             self.close()
-            raise TimeoutError('Socket Timeout. Received: {}'.format(self._rxbuffer))
+            raise TimeoutError('Socket Timeout. Received: {}'.format(received))
         
-        else:
-            rd = self._rxbuffer[:size]
-            self._rxbuffer = self._rxbuffer[size:]
-            return rd
+        return self._rxbuffer.read(size)
+
+    def _recv(self, nbytes: int = None) -> int:
+        """
+        Receive into the rx buffer, returns 0 if the socket timed out or was closed by the peer.
+        """
+        try:
+            return self._rxbuffer.recv_into(self.socket, nbytes)
+        except socket.timeout:
+            # socket.timeout is not a subclass of TimeoutError before Python 3.10
+            return 0
             
     def is_connected(self):
         return self._connected
@@ -407,6 +957,7 @@ class SocketInterface(PacketTransfer):
         # create socket in datagram mode
         if self._udp:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._set_rcvbuf(self.socket)
             self.socket.settimeout(self.timeout)
             self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.socket.bind(self.host)
@@ -415,6 +966,8 @@ class SocketInterface(PacketTransfer):
             self._host_skt = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self._host_skt.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             self._host_skt.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            # accepted connections inherit the receive buffer size of the listening socket
+            self._set_rcvbuf(self._host_skt)
             self._host_skt.settimeout(self.timeout)
             self._host_skt.bind(self.host)
             self._host_skt.listen()
@@ -422,10 +975,15 @@ class SocketInterface(PacketTransfer):
         # create client socket
         elif self.target:
             self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._set_rcvbuf(self.socket)
             self.socket.settimeout(self.timeout)
             self.socket.connect(self.target)
         else:
             raise ValueError('No target or host provided.')
+
+    def _set_rcvbuf(self, skt: socket.socket):
+        if self.rcvbuf:
+            skt.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
     
     def accept(self):
 
@@ -466,6 +1024,304 @@ class SocketInterface(PacketTransfer):
         self.close()
 
 
+class DatagramInterface(PacketTransfer):
+    """
+    UDP interface that keeps datagram boundaries. Each datagram holds one or more packets.
+
+    Datagrams are received in batches with a tight ``recv_into`` loop on a non-blocking socket, directly into the
+    rows of a preallocated slab. ``pkt_read_batch()`` decodes a whole batch at once: the headers of all 
+    datagrams are viewed as one header array, and datagrams that hold a single fixed size packet are copied into 
+    per-type record arrays with one gather per type.
+
+    The ``counters`` dictionary tracks received datagrams, packets and bytes, and datagrams that were truncated 
+    (larger than max_datagram), dropped (unknown packet type or a size that doesn't match the header), or that 
+    filled a whole batch (overruns, the receiver is falling behind the sender). Packets with a checksum mismatch 
+    are dropped and counted as checksum errors.
+
+    Parameters
+    ----------
+    host : tuple
+        socket address (ip addr, port) to bind to. Port 0 binds to a free port, see ``host`` after connect().
+    header : Packet
+        packet header class.
+    target : tuple, optional
+        address that packets are sent to.
+    timeout : float, default: 2
+        time in seconds to wait for the first datagram of a batch.
+    max_datagram : int, default: 65535
+        size of each slab row, larger datagrams are counted as truncated and dropped.
+    batch_size : int, default: 64
+        largest number of datagrams received in one batch.
+    rcvbuf : int, optional
+        size of the kernel receive buffer (SO_RCVBUF) in bytes.
+    byte_order : str, default: '<'
+        byte order of packets in the datagrams, '<' or '>'.
+    """
+    # returns the full length of datagrams that don't fit in the buffer (Linux)
+    _RECV_FLAGS = getattr(socket, 'MSG_TRUNC', 0)
+
+    def __init__(
+        self,
+        host: tuple,
+        header: Packet = None,
+        target: tuple = None,
+        timeout: float = 2,
+        max_datagram: int = 65535,
+        batch_size: int = 64,
+        rcvbuf: int = None,
+        byte_order: str = '<',
+    ):
+        self.host = host
+        self.target = target
+        self.timeout = timeout
+        self.max_datagram = max_datagram
+        self.batch_size = batch_size
+        self.rcvbuf = rcvbuf
+        self.socket = None
+
+        # each datagram of a batch is received into a row of the slab
+        self._slab = np.empty((batch_size, max_datagram), dtype=np.uint8)
+        self._slots = [memoryview(row) for row in self._slab]
+        self._lengths = np.zeros(batch_size, dtype=np.int64)
+        # datagram contents for the byte stream read() interface
+        self._rxbuffer = RxBuffer()
+
+        self.counters = dict(datagrams=0, packets=0, bytes=0, truncated=0, dropped=0, overruns=0, checksum_errors=0)
+
+        if (header != None):
+            super(DatagramInterface, self).__init__(header, addr=0x1, byte_order=byte_order)
+
+    def connect(self):
+        self.close()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.rcvbuf:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        self.socket.bind(self.host)
+        self.socket.setblocking(False)
+        self.host = self.socket.getsockname()
+        return self
+
+    def is_connected(self):
+        return self.socket is not None
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *args, **kwargs):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def flush(self, *args, **kwargs):
+        self._rxbuffer.clear()
+        # discard queued datagrams
+        while self.is_connected() and self.recv_batch(timeout=0):
+            pass
+
+    def write(self, data: bytes):
+        if not self.is_connected():
+            raise RuntimeError('Socket is not connected.')
+        self.socket.sendto(data, self.target)
+
+    def write_many(self, buffers: list):
+        """
+        Send a list of byte buffers as a single datagram.
+        """
+        if not self.is_connected():
+            raise RuntimeError('Socket is not connected.')
+        self.socket.sendmsg(buffers, [], 0, self.target)
+
+    def recv_batch(self, timeout: float = None) -> int:
+        """
+        Receive up to batch_size datagrams into the slab. Waits up to timeout (defaults to the interface timeout)
+        for the first datagram, then receives the datagrams that are already queued without waiting. Returns the
+        number of datagrams received, their lengths are in the first entries of ``self._lengths``.
+        """
+        if not self.is_connected():
+            raise RuntimeError('Socket is not connected.')
+
+        timeout = self.timeout if timeout is None else timeout
+        sock, slots, lengths = self.socket, self._slots, self._lengths
+        max_datagram, flags = self.max_datagram, self._RECV_FLAGS
+        deadline = None
+        n = 0
+
+        while n < self.batch_size:
+            try:
+                size = sock.recv_into(slots[n], max_datagram, flags)
+            except BlockingIOError:
+                # wait for the first datagram only, a partial batch is returned right away. Spurious wakeups wait
+                # for the rest of the timeout.
+                if n > 0:
+                    break
+                if deadline is None:
+                    deadline = time.monotonic() + timeout
+                if not select.select([sock], [], [], max(deadline - time.monotonic(), 0))[0]:
+                    break
+                continue
+
+            if size > max_datagram:
+                self.counters['truncated'] += 1
+                continue
+
+            lengths[n] = size
+            n += 1
+
+        if n == self.batch_size:
+            self.counters['overruns'] += 1
+
+        self.counters['datagrams'] += n
+        self.counters['bytes'] += int(lengths[:n].sum())
+        return n
+
+    def pkt_read_batch(self, timeout: float = None) -> dict:
+        """
+        Receive a batch of datagrams and decode the packets in them.
+
+        Returns
+        -------
+        dict
+            received packets keyed by packet class, in arrival order. Values are record arrays for fixed size 
+            packets, and lists of packets for packets with variable length members.
+        """
+        n = self.recv_batch(timeout)
+        start = perf_counter_ns()
+        slab, lengths = self._slab[:n], self._lengths[:n]
+        hsize = self._header_size
+        ret = {}
+
+        # datagrams too short to hold a header
+        valid = lengths >= hsize
+        self.counters['dropped'] += int(n - np.count_nonzero(valid))
+        rows = np.flatnonzero(valid)
+        if not len(rows):
+            return ret
+
+        # view the headers of every datagram as one header array
+        hdr_dtype = self._hdr_obj.dtype
+        hdrs = np.ascontiguousarray(slab[rows, :hsize]).view(hdr_dtype).reshape(-1).view(self._header)
+        ptypes = np.asarray(hdrs.get_ptype()).reshape(-1)
+
+        # rows that need to be walked packet by packet: variable length packets and datagrams with several packets
+        walk = []
+        single_rows = {}
+        for ptype in np.unique(ptypes):
+            rows_p = rows[ptypes == ptype]
+            pkt_cls = self._pkt_table.get(ptype.item())
+
+            if pkt_cls is None:
+                self.counters['dropped'] += len(rows_p)
+                continue
+
+            if len(pkt_cls._var_fields) or pkt_cls.from_header.__func__ is not Packet.from_header.__func__:
+                walk += list(rows_p)
+                continue
+
+            dtype = pkt_cls._build_dtype({}, self._byte_order)
+            size = dtype.itemsize
+            single = rows_p[lengths[rows_p] == size]
+            walk += list(rows_p[lengths[rows_p] > size])
+            self.counters['dropped'] += int(np.count_nonzero(lengths[rows_p] < size))
+
+            if len(single):
+                # one gather for all datagrams of this type that hold exactly one packet
+                ret[pkt_cls] = np.ascontiguousarray(slab[single, :size]).view(dtype).reshape(-1)
+                single_rows[pkt_cls] = single
+
+        # packets that are decoded one by one, grouped by class, with the datagram row of each packet
+        parts, part_rows = {}, {}
+        for row in sorted(walk):
+            self._walk_datagram(memoryview(slab[row, :lengths[row]]), parts, part_rows, row)
+
+        for pkt_cls, pkts in parts.items():
+            if len(pkt_cls._var_fields) or pkt_cls.from_header.__func__ is not Packet.from_header.__func__:
+                ret[pkt_cls] = pkts
+            elif pkt_cls not in ret:
+                ret[pkt_cls] = np.concatenate([p.view(np.ndarray) for p in pkts])
+            else:
+                # merge the gathered and walked packets of a class in arrival order. Packets of a walked datagram
+                # are consecutive, the stable sort keeps them in datagram order.
+                records = np.concatenate([ret[pkt_cls].view(np.ndarray)] + [p.view(np.ndarray) for p in pkts])
+                order = np.argsort(np.concatenate([single_rows[pkt_cls], part_rows[pkt_cls]]), kind='stable')
+                ret[pkt_cls] = records[order]
+
+        for pkt_cls, records in ret.items():
+            if isinstance(records, np.ndarray):
+                records = ret[pkt_cls] = records.view(pkt_cls)
+
+            # packets with a checksum mismatch are dropped
+            if len(pkt_cls._checksums):
+                n_rx = len(records)
+                if isinstance(records, np.ndarray):
+                    records = ret[pkt_cls] = records[records.verify_checksums()]
+                else:
+                    records = ret[pkt_cls] = [p for p in records if p.verify_checksums().all()]
+                self.counters['checksum_errors'] += n_rx - len(records)
+            
+            self.counters['packets'] += len(records)
+
+        if self.stats is not None:
+            # decode time is shared evenly by the packets of the batch
+            npkts = sum(len(r) for r in ret.values())
+            ns = (perf_counter_ns() - start) // max(npkts, 1)
+            for pkt_cls, records in ret.items():
+                nbytes = _nbytes(records) if isinstance(records, np.ndarray) else sum(_nbytes(r) for r in records)
+                self.stats.record_rx(pkt_cls._ptype, nbytes, ns, len(records))
+
+        return ret
+
+    def _walk_datagram(self, data: memoryview, parts: dict, rows: dict, row: int):
+        # decode the packets in a datagram one at a time, the datagram row of each packet is added to rows
+        pos, hsize = 0, self._header_size
+        while pos + hsize <= len(data):
+            self._hdr_obj.unpack(data[pos:pos + hsize])
+            pkt_cls = self._pkt_table.get(self._hdr_obj.get_ptype().item())
+
+            if pkt_cls is None:
+                self.counters['dropped'] += 1
+                return
+
+            if len(pkt_cls._var_fields) or pkt_cls.from_header.__func__ is Packet.from_header.__func__:
+                shapes = pkt_cls.var_shapes(self._hdr_obj)
+                size = pkt_cls._build_dtype(shapes, self._byte_order).itemsize
+                if pos + size > len(data):
+                    self.counters['dropped'] += 1
+                    return
+                pkt = pkt_cls.frombytes(data[pos:pos + size], shapes, self._byte_order)
+            else:
+                pkt = pkt_cls.from_header(self._hdr_obj, byte_order=self._byte_order)
+                size = pkt.get_size()
+                if pos + size > len(data):
+                    self.counters['dropped'] += 1
+                    return
+                pkt.unpack(data[pos:pos + size])
+
+            parts.setdefault(pkt_cls, []).append(pkt)
+            rows.setdefault(pkt_cls, []).append(row)
+            pos += size
+
+    def read(self, size: int) -> bytes:
+        """
+        Read bytes from the contents of received datagrams, for pkt_read(). Datagram boundaries are not kept.
+        """
+        deadline = time.time() + self.timeout
+        while len(self._rxbuffer) < size:
+            n = self.recv_batch(max(deadline - time.time(), 0))
+            if not n:
+                raise TimeoutError('Socket Timeout. Received: {}'.format(bytes(self._rxbuffer)))
+            for row in range(n):
+                self._rxbuffer.write(self._slots[row][:self._lengths[row]])
+
+        return self._rxbuffer.read(size)
+
+
 class PacketServer(threading.Thread):
 
     def __init__(
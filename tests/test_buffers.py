@@ -0,0 +1,53 @@
+import unittest
+import socket
+import numpy as np
+
+from np_struct.buffers import RxBuffer
+from np_struct.transfer import SocketInterface
+
+
+class TestRxBuffer(unittest.TestCase):
+
+    def test_find(self):
+
+        rx = RxBuffer(size=16, chunk=16)
+        rx.write(b'abc\r')
+        self.assertEqual(rx.find(b'\r\n'), -1)
+
+        # delimiter split across writes
+        rx.write(b'\ndef\r\n')
+        self.assertEqual(rx.find(b'\r\n'), 5)
+        self.assertEqual(rx.find(b'\r\n', count=2), 10)
+        self.assertEqual(rx.read(5), b'abc\r\n')
+        self.assertEqual(rx.find(b'\r\n'), 5)
+
+        # the buffer is compacted and grown as data is added
+        data = bytes(np.arange(100, dtype=np.uint8))
+        for i in range(10):
+            rx.write(data)
+        self.assertGreaterEqual(rx.capacity, len(rx))
+        self.assertEqual(rx.read(5), b'def\r\n')
+        self.assertEqual(rx.find(bytes([99, 0]), count=9), 901)
+        self.assertEqual(rx.read(1000), data * 10)
+        self.assertEqual(len(rx), 0)
+
+    def test_socket_read(self):
+
+        a, b = socket.socketpair()
+        a.settimeout(0.5)
+        intf = SocketInterface(timeout=0.5)
+        intf.socket, intf._connected = a, True
+
+        b.sendall(b'line1\nline2\n' + bytes(range(200)))
+        self.assertEqual(intf.read_until(b'\n'), b'line1\n')
+        self.assertEqual(intf.read_until(b'\n'), b'line2\n')
+        self.assertEqual(intf.read(200), bytes(range(200)))
+
+        b.sendall(b'abc')
+        with self.assertRaises(TimeoutError):
+            intf.read(4)
+        b.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+import tempfile
+import os
+import time
+import numpy as np
+
+from np_struct import varlen
+from np_struct.transfer import Packet, LoopBack, PacketTypeError
+from np_struct.capture import Capture, CaptureWriter, RX, TX
+
+
+class capheader(Packet):
+    ptype = np.uint8()
+    nsamples = np.uint16()
+
+    def get_ptype(self):
+        return self.ptype
+
+class statuspkt(Packet):
+    hdr = capheader(ptype=0x1)
+    state = np.uint32()
+
+class samplespkt(Packet):
+    hdr = capheader(ptype=0x2)
+    samples = varlen(np.float32, length='hdr.nsamples')
+
+
+class TestCapture(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'capture.bin')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_record(self):
+        intf = LoopBack(header=capheader)
+        intf.set_capture(self.path)
+
+        for i in range(10):
+            intf.pkt_write(statuspkt(state=i))
+            intf.pkt_read()
+        intf.pkt_write(samplespkt(samples=np.arange(3)))
+        intf.pkt_read()
+        # packets that fail to decode are captured before decoding, unknown types with their header only
+        intf.write(b'\x07\x00\x00')
+        with self.assertRaises(PacketTypeError):
+            intf.pkt_read()
+        intf.set_capture(None)
+
+        cap = Capture(self.path)
+        self.assertEqual(len(cap), 23)
+        self.assertEqual(bytes(cap[22]), b'\x07\x00\x00')
+        self.assertEqual(cap.index['ptype'][22], 7)
+        np.testing.assert_array_equal(cap.index['direction'][:4], [TX, RX, TX, RX])
+        self.assertEqual(len(cap.select(RX, 0x1)), 10)
+        self.assertEqual(bytes(cap[0]), bytes(statuspkt(state=0)))
+        self.assertTrue(np.all(np.diff(cap.index['timestamp']) >= 0))
+
+        pkts = cap.decode(capheader, direction=RX)
+        np.testing.assert_array_equal(pkts[statuspkt].state.reshape(-1), np.arange(10))
+        np.testing.assert_array_equal(pkts[samplespkt][(3,)].samples.reshape(-1), np.arange(3))
+
+        # captures are appended to
+        with CaptureWriter(self.path) as writer:
+            writer.record(bytes(statuspkt(state=10)), 0x1, RX)
+        self.assertEqual(len(Capture(self.path)), 24)
+
+    def test_replay(self):
+        with CaptureWriter(self.path) as writer:
+            for i in range(1000):
+                writer.record(bytes(statuspkt(state=i)), 0x1, RX, timestamp=i * 1e-5)
+                writer.record(bytes(statuspkt(state=i)), 0x1, TX, timestamp=i * 1e-5)
+
+        cap = Capture(self.path)
+        intf = LoopBack(header=capheader)
+
+        self.assertEqual(cap.replay(intf), 1000)
+        states = [intf.pkt_read().state.item() for i in range(1000)]
+        self.assertEqual(states, list(range(1000)))
+
+        # replay at the original speed takes at least as long as the capture
+        start = time.perf_counter()
+        self.assertEqual(cap.replay(intf, speed=1, direction=None), 2000)
+        self.assertGreaterEqual(time.perf_counter() - start, 9e-3)
+        self.assertEqual(len(intf.rx_buffer), 2000 * statuspkt().nbytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+import tempfile
+import os
+import numpy as np
+
+from np_struct import varlen
+from np_struct.transfer import Packet, PacketTypeError
+from np_struct.decode import decode_file
+
+SYNC = b'\xaa\x55'
+
+
+class decheader(Packet):
+    sync = np.uint16(0x55AA)
+    ptype = np.uint8()
+    nsamples = np.uint16()
+
+    def get_ptype(self):
+        return self.ptype
+
+class seqpkt(Packet):
+    hdr = decheader(ptype=0x1)
+    seq = np.uint32()
+    # sync words inside packets
+    samples = np.int16([0x55AA] * 8)
+
+class varpkt(Packet):
+    hdr = decheader(ptype=0x2)
+    samples = varlen(np.float32, length='hdr.nsamples')
+
+
+class TestDecode(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'stream.bin')
+
+        n = 2000
+        recs = seqpkt(shape=(n,))
+        recs.flat_view()['seq'] = np.arange(n)[:, None]
+        self.n = n
+
+        with open(self.path, 'wb') as f:
+            for i in range(n):
+                f.write(recs[i].tobytes())
+                if i % 10 == 0:
+                    f.write(varpkt(samples=np.arange(i % 3)).tobytes())
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def check(self, pkts):
+        np.testing.assert_array_equal(pkts[seqpkt].seq.reshape(-1), np.arange(self.n))
+        self.assertEqual(sorted(pkts[varpkt].keys()), [(0,), (1,), (2,)])
+        self.assertEqual(sum(len(v) for v in pkts[varpkt].values()), self.n // 10)
+        np.testing.assert_array_equal(pkts[varpkt][(2,)].samples[0], [0, 1])
+
+    def test_decode(self):
+        self.check(decode_file(self.path, decheader, workers=1))
+        self.check(decode_file(self.path, decheader, workers=2, chunk_size=4096))
+
+        # chunks that start at a sync word inside a packet, or at an offset inside a packet that has a known type
+        # in its header, are trimmed to the packets of the stream
+        self.check(decode_file(self.path, decheader, workers=2, chunk_size=1000, sync=SYNC))
+        for chunk_size in [97, 1000]:
+            self.check(decode_file(self.path, decheader, workers=1, chunk_size=chunk_size))
+            self.check(decode_file(self.path, decheader, workers=1, chunk_size=chunk_size, sync=SYNC))
+
+        # records are written to files and memory mapped
+        pkts = decode_file(self.path, decheader, workers=1, chunk_size=4096, out_dir=self.tmpdir.name)
+        self.check(pkts)
+        self.assertFalse(pkts[seqpkt].flags.writeable)
+        name = '{}.{}.bin'.format(seqpkt.__module__, seqpkt.__qualname__)
+        self.assertEqual(os.path.getsize(os.path.join(self.tmpdir.name, name)), pkts[seqpkt].nbytes)
+
+    def test_sync(self):
+        with open(self.path, 'ab') as f:
+            f.write(b'\x00\x01' + SYNC + b'\x07garbage')
+            f.write(seqpkt(seq=self.n).tobytes())
+            # truncated packet at the end of the stream
+            f.write(seqpkt().tobytes()[:-3])
+
+        pkts = decode_file(self.path, decheader, workers=1, chunk_size=5000, sync=SYNC)
+        np.testing.assert_array_equal(pkts[seqpkt].seq.reshape(-1), np.arange(self.n + 1))
+
+        # streams without a sync word must only hold known packets
+        with self.assertRaises(PacketTypeError):
+            decode_file(self.path, decheader, workers=1)
+
+        empty = os.path.join(self.tmpdir.name, 'empty.bin')
+        open(empty, 'wb').close()
+        self.assertEqual(decode_file(empty, decheader), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
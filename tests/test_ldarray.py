@@ -5,6 +5,17 @@ from numpy import testing as npt
 import datetime as dt
 from dateutil import relativedelta as rdt    
 import os
+import pickle
+
+
+def _nearest(v, coords):
+    # index handler of the shared memory test, handlers are pickled by reference
+    return np.argmin(np.abs(coords - v))
+
+
+def _detrend(part):
+    # parallel_map test function, must be defined at the top level so it can be sent to worker processes
+    return part - np.mean(part, axis=1)[:, None]
 
 
 class TestLdArray(unittest.TestCase):
@@ -208,6 +219,187 @@ class TestLdArray(unittest.TestCase):
 
         self.assertEqual(str(ld), ref)
 
+    def test_str_large(self):
+
+        start = dt.datetime(2024, 1, 1)
+        time = [start + dt.timedelta(minutes=i) for i in range(5000)]
+        ld = ldarray(np.zeros((5000, 2)), coords=dict(time=time, b=['data1', 'data2']), attrs=dict(a=list(range(5000))))
+
+        lines = str(ld).split("\n")
+        # summary of the full array is the first line
+        self.assertEqual(lines[0], "ldarray: (5000, 2), float64, 0.08 MB")
+        self.assertTrue(lines[1].startswith("ldarray([[0., 0.],"))
+        # only the edges of long coordinates are printed
+        self.assertIn("  time: ['2024-01-01T00:00' '2024-01-01T00:01' ... '2024-01-04T11:18' '2024-01-04T11:19']", lines)
+        self.assertIn("  a: [0, 1, 2, 3, 4, 5, ...]", lines)
+
+    def test_groupby_bins(self):
+
+        coords = dict(f=[1., 4., 9., 12., 15., 31.], b=['data1', 'data2'])
+        ld = ldarray(np.arange(12).reshape(6, 2), coords=coords)
+
+        grouped = ld.groupby("f", bins=[0, 10, 20, 30, 40])
+        npt.assert_array_equal(grouped.mean(), [[2, 3], [7, 8], [10, 11]])
+        npt.assert_array_equal(grouped.sum(), [[6, 9], [14, 16], [10, 11]])
+        npt.assert_array_equal(grouped.max(), [[4, 5], [8, 9], [10, 11]])
+        npt.assert_array_equal(grouped.count().sel(b="data1"), [3, 2, 1])
+
+        # empty bins are dropped from the result
+        npt.assert_array_equal(grouped.mean().coords["f"], [0, 10, 30])
+        npt.assert_array_equal(grouped.mean().coords["b"], coords["b"])
+
+        # group by unique values of unsorted coordinates
+        ld = ldarray(np.arange(6), coords=dict(x=[3, 1, 2, 3, 1, 2]))
+        npt.assert_array_equal(ld.groupby("x").sum(), [5, 7, 3])
+        npt.assert_array_equal(ld.groupby("x").min().coords["x"], [1, 2, 3])
+
+    def test_resample(self):
+
+        time = [dt.datetime(2024, 1, 1, 0, 10) + dt.timedelta(minutes=20 * i) for i in range(9)]
+        ld = ldarray(np.arange(9), coords=dict(time=time))
+
+        hourly = ld.resample(time="1h").sum()
+        npt.assert_array_equal(hourly, [3, 12, 21])
+        self.assertEqual(list(hourly.coords["time"]), [dt.datetime(2024, 1, 1, h) for h in range(3)])
+
+        with self.assertRaises(ValueError):
+            ld.resample(time="1 fortnight")
+
+        # "M" is months in some libraries and minutes in others
+        with self.assertRaises(ValueError):
+            ld.resample(time="1M")
+        npt.assert_array_equal(ld.resample(time="60min").sum(), hourly)
+
+        # fixed number of bins over a datetime dimension
+        binned = ld.groupby("time", bins=2).sum()
+        npt.assert_array_equal(binned, [6, 30])
+        self.assertEqual(binned.coords["time"][0], time[0])
+
+        # numeric dimensions resample by interval width
+        ld = ldarray(np.ones(10), coords=dict(f=np.arange(10) * 1e6))
+        npt.assert_array_equal(ld.resample(f=4e6).sum(), [4, 4, 2])
+        npt.assert_array_equal(ld.resample(f=4e6).sum().coords["f"], [0, 4e6, 8e6])
+
+        with self.assertRaises(ValueError):
+            ld.resample(f="1h")
+
+    def test_rolling(self):
+
+        data = np.random.rand(3, 200)
+        ld = ldarray(data, coords=dict(a=['data1', 'data2', 'data3'], t=np.arange(200) * 0.1))
+
+        ref_mean = np.full(data.shape, np.nan)
+        ref_max = np.full(data.shape, np.nan)
+        for i in range(4, 200):
+            ref_mean[:, i] = np.mean(data[:, i - 4: i + 1], axis=-1)
+            ref_max[:, i] = np.max(data[:, i - 4: i + 1], axis=-1)
+
+        rolled = ld.rolling(t=5).mean()
+        npt.assert_array_almost_equal(rolled, ref_mean)
+        npt.assert_array_almost_equal(rolled.coords["t"], ld.coords["t"])
+        npt.assert_array_almost_equal(ld.rolling(t=5).max(), ref_max)
+
+        # blocks smaller than the window length give the same result
+        npt.assert_array_almost_equal(ld.rolling(t=5, chunk_size=3).mean(), ref_mean)
+
+        # centered windows
+        npt.assert_array_almost_equal(ld.rolling(t=5, center=True).max()[:, :-2], ref_max[:, 2:])
+
+        # non-finite values only reach the windows that contain them
+        data = np.arange(50, dtype=np.float64)
+        data[10] = np.nan
+        data[30] = np.inf
+        ld = ldarray(data, coords=dict(t=np.arange(50)))
+        ref = np.full(50, np.nan)
+        for i in range(4, 50):
+            ref[i] = np.sum(data[i - 4: i + 1])
+        for chunk_size in [None, 7]:
+            rolled = ld.rolling(t=5, chunk_size=chunk_size).sum()
+            npt.assert_array_equal(rolled, ref)
+            self.assertTrue(np.all(np.isfinite(rolled[15:30])))
+
+        # precision does not depend on the position in the block
+        data = np.full(10**4, 0.1) + 1e8
+        rolled = ldarray(data, coords=dict(t=np.arange(len(data)))).rolling(t=4).mean()
+        npt.assert_allclose(rolled[3:], data[3:], rtol=1e-14)
+
+    def test_rolling_memmap(self):
+
+        data = np.arange(100, dtype=np.float64)
+        mm = np.memmap("ld_temp_file.dat", dtype=np.float64, mode="w+", shape=(100,))
+        mm[:] = data
+        mm.flush()
+
+        ld = ldarray(np.memmap("ld_temp_file.dat", dtype=np.float64, mode="r"), coords=dict(t=np.arange(100)))
+        out = np.memmap("ld_temp_file_out.dat", dtype=np.float64, mode="w+", shape=(100,))
+
+        rolled = ld.rolling(t=10, chunk_size=16).sum(out=out)
+        npt.assert_array_equal(out[9:], np.convolve(data, np.ones(10), mode="valid"))
+        npt.assert_array_equal(rolled.coords["t"], np.arange(100))
+        self.assertTrue(np.all(np.isnan(out[:9])))
+
+        del ld, mm, out, rolled
+        os.remove("ld_temp_file.dat")
+        os.remove("ld_temp_file_out.dat")
+
+    def test_shared(self):
+
+        coords = dict(a=['data1', 'data2'], b=np.arange(0, 20, 0.2))
+        ld = ldarray(np.arange(200.).reshape(2, 100), coords=coords, attrs=dict(units="V"))
+        ld.coords.set_handler(b=_nearest)
+
+        with ld.to_shared() as handle:
+            # handles are sent to other processes by pickling, the data is not included
+            handle_copy = pickle.loads(pickle.dumps(handle))
+            self.assertLess(len(pickle.dumps(handle)), ld.nbytes)
+
+            ld_shared = ldarray.from_shared(handle_copy)
+            npt.assert_array_equal(ld_shared, ld)
+            npt.assert_array_equal(ld_shared.sel(b=19.6), [98, 198])
+            self.assertEqual(ld_shared.attrs["units"], "V")
+            # index handlers are kept, the same as when pickling the array
+            self.assertIs(ld_shared.coords.idx_handlers["b"], _nearest)
+            npt.assert_array_equal(ld_shared.sel(b=19.63), [98, 198])
+
+            # both arrays use the same buffer
+            ld_shared[0, 0] = -1
+            self.assertEqual(ldarray.from_shared(handle)[0, 0], -1)
+            del ld_shared
+
+    def test_pickle(self):
+
+        coords = dict(a=['data1', 'data2'], b=np.arange(0, 20, 0.2))
+        ld = ldarray(np.arange(200.).reshape(2, 100), coords=coords, attrs=dict(units="V"))
+
+        buffers = []
+        data = pickle.dumps(ld, protocol=5, buffer_callback=buffers.append)
+        # array data and coordinates are sent out-of-band
+        self.assertLess(len(data), ld.nbytes)
+
+        ld_load = pickle.loads(data, buffers=buffers)
+        npt.assert_array_equal(ld_load, ld)
+        npt.assert_array_equal(ld_load.sel(b=19.6), [98, 198])
+        self.assertEqual(ld_load.attrs["units"], "V")
+
+        # default protocol
+        ld_load = pickle.loads(pickle.dumps(ld))
+        npt.assert_array_equal(ld_load.coords["a"], coords["a"])
+
+    def test_parallel_map(self):
+
+        coords = dict(channel=np.arange(8), t=np.arange(0, 20, 0.2))
+        data = np.random.rand(8, 100)
+        ld = ldarray(data, coords=coords)
+
+        result = ld.parallel_map(_detrend, dim="channel", processes=2, chunks=3)
+
+        npt.assert_array_almost_equal(result, data - np.mean(data, axis=1)[:, None])
+        npt.assert_array_equal(result.coords["channel"], coords["channel"])
+
+        # results that can't be joined are returned as a list
+        sums = ld.parallel_map(np.sum, dim="channel", processes=2)
+        self.assertAlmostEqual(np.sum(sums), np.sum(data))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
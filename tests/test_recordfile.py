@@ -0,0 +1,124 @@
+import unittest
+import tempfile
+import os
+import numpy as np
+
+from np_struct.transfer import Packet
+from np_struct.bitfields import uint16
+from np_struct.recordfile import RecordFile
+
+
+class recheader(Packet):
+    ptype = np.uint8()
+    timestamp = np.float64()
+
+    def get_ptype(self):
+        return self.ptype
+
+class recpkt(Packet):
+    hdr = recheader(ptype=0x1)
+    state1 = uint16(bits=5)
+    state2 = uint16(bits=3)
+    samples = np.int16([0] * 4)
+
+
+def make_records(n, start=0):
+    recs = recpkt(shape=(n,))
+    flat = recs.flat_view()
+    i = np.arange(start, start + n)
+    flat['hdr.ptype'] = (i % 4)[:, None]
+    flat['hdr.timestamp'] = (i * 0.5)[:, None]
+    recs.state2 = (i % 7).astype(np.uint16)[:, None]
+    return recs
+
+
+class TestRecordFile(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'records.bin')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_index(self):
+        make_records(1000).tofile(self.path)
+        rf = RecordFile(self.path, recpkt, chunk_size=128)
+        i = np.arange(1000)
+
+        # the same records are selected with and without an index
+        scanned = rf.select('hdr.ptype', 3, indices=True)
+        np.testing.assert_array_equal(scanned, np.flatnonzero(i % 4 == 3))
+
+        rf.build_index('hdr.ptype')
+        rf.build_index('state2')
+        rf.build_index('hdr.timestamp')
+        self.assertTrue(os.path.exists(self.path + '.hdr.ptype.npy'))
+        np.testing.assert_array_equal(rf.select('hdr.ptype', 3, indices=True), scanned)
+        np.testing.assert_array_equal(rf.select('state2', [0, 6], indices=True), np.flatnonzero(i % 7 % 6 == 0))
+
+        recs = rf.select('hdr.timestamp', start=10, stop=20)
+        self.assertIsInstance(recs, recpkt)
+        np.testing.assert_array_equal(recs.hdr.timestamp.reshape(-1), np.arange(20, 40) * 0.5)
+
+        # appended records are added to the indexes, which are loaded when the file is opened again
+        rf.append(make_records(500, start=1000))
+        rf = RecordFile(self.path, recpkt)
+        self.assertEqual(set(rf.indexes), {'hdr.ptype', 'state2', 'hdr.timestamp'})
+        self.assertEqual(sum(len(run) for run in rf.indexes['hdr.ptype']), 1500)
+
+        i = np.arange(1500)
+        np.testing.assert_array_equal(rf.select('hdr.ptype', 3, indices=True), np.flatnonzero(i % 4 == 3))
+        np.testing.assert_array_equal(rf.select('state2', 6, indices=True), np.flatnonzero(i % 7 == 6))
+        np.testing.assert_array_equal(rf.select('hdr.timestamp', start=740, indices=True), np.arange(1480, 1500))
+
+        # records written by another writer are scanned by selections, which don't write to the index files
+        files = sorted(os.listdir(self.tmpdir.name))
+        with open(self.path, 'ab') as f:
+            f.write(make_records(10, start=1500).tobytes())
+        self.assertEqual(len(rf.select('hdr.ptype', 0)), 378)
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), files)
+        rf.refresh()
+        self.assertEqual(len(rf.select('hdr.ptype', 0)), 378)
+
+        rf.drop_index('state2')
+        self.assertFalse(os.path.exists(self.path + '.state2.npy'))
+
+        with self.assertRaises(ValueError):
+            rf.build_index('samples')
+        with self.assertRaises(ValueError):
+            rf.select('missing', 1)
+        rf.close()
+
+    def test_runs(self):
+        rf = RecordFile(self.path, recpkt)
+        rf.build_index('hdr.ptype')
+
+        # each append adds a run with the new records, runs of about the same size are merged
+        n = 0
+        for size in [50] * 20 + [2] * 30:
+            rf.append(make_records(size, start=n))
+            n += size
+            self.assertLessEqual(len(rf.indexes['hdr.ptype']), 2 * int(np.log2(n)) + 1)
+
+        i = np.arange(n)
+        np.testing.assert_array_equal(rf.select('hdr.ptype', [1, 2], indices=True), np.flatnonzero(i % 4 % 3 != 0))
+        runs = [len(run) for run in rf.indexes['hdr.ptype']]
+
+        # the runs are loaded when the file is opened again
+        rf = RecordFile(self.path, recpkt)
+        self.assertEqual([len(run) for run in rf.indexes['hdr.ptype']], runs)
+        np.testing.assert_array_equal(rf.select('hdr.ptype', 3, indices=True), np.flatnonzero(i % 4 == 3))
+
+        # a truncated file is scanned until the index is rebuilt
+        with open(self.path, 'r+b') as f:
+            f.truncate(100 * rf.dtype.itemsize)
+        np.testing.assert_array_equal(rf.select('hdr.ptype', 3, indices=True), np.arange(3, 100, 4))
+        rf.refresh()
+        self.assertEqual([len(run) for run in rf.indexes['hdr.ptype']], [100])
+        self.assertEqual(sorted(os.listdir(self.tmpdir.name)), ['records.bin', 'records.bin.hdr.ptype.npy'])
+        rf.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,532 @@
+import numpy as np
+import unittest
+import enum
+import pickle
+import struct
+import os
+import shutil
+import subprocess
+import tempfile
+
+from np_struct import Struct, Packet, varlen
+from np_struct.cheader import load_c_header, parse_c_structs, build_structs, CHeaderError
+from np_struct.bitfields import uint16
+
+
+class example(Struct):
+    data1 = np.uint32()
+    data2 = np.complex128([0]*3)
+
+class nested(Struct):
+    field1 = example()
+    field2 = np.float64([1, 2])
+    state1 = uint16(bits=7)
+    state2 = uint16(bits=3)
+
+class Mode(enum.IntEnum):
+    IDLE = 0
+    RUNNING = 1
+    FAULT = 4
+
+class status(Struct):
+    mode = uint16('RUNNING', bits=3, enum=Mode)
+    code = uint16(bits=13)
+    level = uint16(bits=2, enum=dict(low=0, high=3))
+
+class header(Struct):
+    ptype = np.uint8()
+    length = np.uint32()
+
+class aligned(Struct, align=True):
+    hdr = header()
+    flag = np.uint8()
+    state1 = uint16(bits=3)
+    state2 = uint16(bits=5)
+    points = header(shape=(2,))
+    values = np.float64([0, 0])
+
+class packedhdr(Struct, packed=True):
+    ptype = np.uint8()
+    length = np.uint32()
+
+class alignedpacked(Struct, align=True):
+    flag = np.uint8()
+    hdr = packedhdr()
+    count = np.uint16()
+
+class varrec(Struct):
+    count = np.uint16()
+    values = varlen(np.float32, length='count')
+    tail = np.uint8()
+
+# bit-field layouts that share storage units with other members. Sizes and bit positions were verified with gcc 
+# on x86-64, test_c_layout_gcc checks them again when a compiler is available.
+C_BITFIELDS = """
+#include <stdint.h>
+struct t1 { uint8_t flag; uint16_t s1:3; uint16_t s2:5; };
+struct __attribute__((packed)) t2 { uint8_t x:6; uint16_t y:4; uint8_t z; };
+struct t4 { uint8_t a; uint32_t b:3; };
+struct t5 { uint8_t a:4; uint8_t b:8; };
+struct t6 { uint8_t a; uint32_t :3; };
+struct t7 { uint16_t a:3; uint16_t :0; uint16_t b:2; uint8_t c; };
+struct t8 { uint8_t a; struct t4 n; uint16_t d:9; uint16_t e:9; };
+struct __attribute__((packed)) t9 { uint8_t a; uint32_t b; };
+struct t10 { uint8_t a; struct t9 p; uint16_t c; };
+struct t11 { uint8_t state:3; uint8_t x; uint8_t mode:2; uint8_t y; };
+"""
+
+C_BITFIELD_SIZES = dict(t1=2, t2=3, t4=4, t5=2, t6=2, t7=4, t8=12, t9=5, t10=8, t11=4)
+
+C_HEADER = """
+#include <stdint.h>
+#define NSAMP 8
+
+/* packet header */
+typedef struct {
+    uint16_t psize;
+    uint8_t ptype;
+    uint8_t payload_shape[2];
+} pktheader_t;
+
+#pragma pack(push, 1)
+typedef struct cmdpkt {
+    pktheader_t hdr;
+    uint16_t state1 : 7;
+    uint16_t state2 : 3;
+    uint16_t : 2;
+    uint16_t state3 : 1;
+    int16_t samples[2][NSAMP / 2];
+    struct { uint8_t x, y; } points[2];
+} cmdpkt_t;
+#pragma pack(pop)
+
+struct aligned_s {
+    uint8_t a;
+    uint32_t b;
+    unsigned long long c;
+    float f;
+};
+
+int process(struct aligned_s *s);
+"""
+
+
+class TestStructures(unittest.TestCase):
+
+    def test_pickle(self):
+
+        recs = nested(shape=(100,))
+        recs.field2 = np.arange(200).reshape(100, 2)
+        recs.state1 = np.arange(100, dtype=np.uint16)[:, None]
+
+        # protocol 5 sends the record data as out-of-band buffers
+        buffers = []
+        data = pickle.dumps(recs, protocol=5, buffer_callback=buffers.append)
+        self.assertLess(len(data), recs.nbytes)
+
+        loaded = pickle.loads(data, buffers=buffers)
+        self.assertIsInstance(loaded, nested)
+        self.assertEqual(loaded.dtype, recs.dtype)
+        np.testing.assert_array_equal(loaded.field2, recs.field2)
+        np.testing.assert_array_equal(loaded.state1, recs.state1)
+
+        # single records
+        ex = example(data1=5)
+        loaded = pickle.loads(pickle.dumps(ex))
+        self.assertEqual(loaded.data1, 5)
+        self.assertIsInstance(loaded, example)
+
+    def test_str(self):
+
+        ex = example(shape=(3,))
+        ex[0].data2 = 1 + 2j
+
+        ref = (
+            "Struct example: (3,)\n[\n    data1:  uint32[0]\n    data2:  complex128[1.+2.j 1.+2.j 1.+2.j]\n]\n...\n"
+            "[\n    data1:  uint32[0]\n    data2:  complex128[0.+0.j 0.+0.j 0.+0.j]\n]"
+        )
+        self.assertEqual(str(ex), ref)
+
+        # large arrays lead with a size summary
+        recs = nested(shape=(5000,))
+        recs.state1 = np.arange(5000, dtype=np.uint16)[:, None]
+        lines = str(recs).split("\n")
+        self.assertEqual(lines[0], "Struct nested: (5000,) 70 bytes/record, 0.35 MB")
+        # bit fields of the first and last records are printed
+        self.assertIn("    state1:       uint16(7:0)[0]", lines)
+        self.assertIn("    state1:       uint16(7:0)[7]", lines)
+
+    def test_schema(self):
+
+        # unaligned structures are packed
+        schema = header.__schema__
+        self.assertEqual([(f.name, f.offset) for f in schema], [("ptype", 0), ("length", 1)])
+        self.assertEqual(schema.itemsize, 5)
+
+        # aligned structures are padded the same as C, including nested structures
+        schema = aligned.__schema__
+        offsets = {f.name: f.offset for f in schema}
+        self.assertEqual(offsets["hdr.ptype"], 0)
+        self.assertEqual(offsets["hdr.length"], 4)
+        self.assertEqual(offsets["flag"], 8)
+        self.assertEqual(offsets["state2"], 10)
+        self.assertEqual(offsets["points[1].length"], 24)
+        self.assertEqual(offsets["values"], 32)
+        self.assertEqual(schema.itemsize, 48)
+
+        # packed structures keep their layout inside aligned structures
+        schema = alignedpacked.__schema__
+        offsets = [(f.name, f.offset) for f in schema]
+        self.assertEqual(offsets, [("flag", 0), ("hdr.ptype", 1), ("hdr.length", 2), ("count", 6)])
+        self.assertEqual(schema.itemsize, 8)
+        with self.assertRaises(ValueError):
+            class invalid(Struct, align=True, packed=True):
+                a = np.uint8()
+
+        schema = aligned.__schema__
+        self.assertEqual(schema["state2"].base, "state1_base")
+        self.assertEqual(schema["state2"].bit_pos, 3)
+        self.assertEqual(schema["state2"].mask, 0x1F)
+
+        # flat view reads nested fields directly
+        recs = aligned(shape=(4,))
+        recs.points[:, 1].ptype = 7
+        flat = recs.flat_view()
+        np.testing.assert_array_equal(flat["points[1].ptype"].squeeze(), [7] * 4)
+
+        # flat view shares memory with the records
+        flat["hdr.length"] = np.arange(4)[:, None]
+        np.testing.assert_array_equal(recs.hdr.length.squeeze(), np.arange(4))
+
+    def test_frombuffer_varlen(self):
+
+        lengths = [3, 1, 3, 0, 1, 3]
+        data = b''.join(bytes(varrec(values=np.arange(n) + i, tail=i)) for i, n in enumerate(lengths))
+
+        groups = varrec.frombuffer(data)
+        self.assertEqual(sorted(groups.keys()), [(0,), (1,), (3,)])
+
+        recs = groups[(3,)]
+        self.assertIsInstance(recs, varrec)
+        self.assertEqual(recs.shape, (3,))
+        np.testing.assert_array_equal(recs.tail[:, 0], [0, 2, 5])
+        np.testing.assert_array_equal(recs.values[1], [2, 3, 4])
+        np.testing.assert_array_equal(groups[(1,)].values, [[1], [4]])
+
+        # count limits the number of records walked
+        self.assertEqual(sum(len(r) for r in varrec.frombuffer(data, count=2).values()), 2)
+
+        # record offsets restore the order of the stream
+        groups, offsets = varrec.frombuffer(data, return_offsets=True)
+        self.assertEqual(offsets[(1,)].tolist(), [15, 40])
+        order = sorted((o, k, i) for k, v in offsets.items() for i, o in enumerate(v))
+        np.testing.assert_array_equal([groups[k].tail.reshape(-1)[i] for _, k, i in order], np.arange(6))
+
+        with self.assertRaises(ValueError):
+            varrec.frombuffer(data[:-1])
+
+        # length fields must come before the variable member
+        with self.assertRaises(ValueError):
+            class badrec(Struct):
+                values = varlen(np.float32, length='count')
+                count = np.uint16()
+
+        # and before any other variable member
+        with self.assertRaises(ValueError):
+            class badrec2(Struct):
+                n1 = np.uint16()
+                a = varlen(np.float32, length='n1')
+                n2 = np.uint16()
+                b = varlen(np.float32, length='n2')
+
+        # packet lengths must be in the header
+        with self.assertRaises(ValueError):
+            class badpkt(Packet):
+                hdr = header()
+                n = np.uint16()
+                values = varlen(np.float32, length='n')
+
+    def test_frombuffer(self):
+
+        # records packed by C with native alignment, struct {u8 ptype; u32 length} hdr, u8 flag, u16 bits, ...
+        fmt = "@BIBH" + "BI" * 2 + "d" * 2
+        data = b"".join(
+            struct.pack(fmt, i, 10 * i, 1, 0b10101_011, 0, 0, 0, 0, 0.5 * i, 1.5)
+            for i in range(3)
+        )
+        recs = aligned.frombuffer(data)
+
+        self.assertEqual(recs.shape, (3,))
+        np.testing.assert_array_equal(recs.hdr.length.squeeze(), [0, 10, 20])
+        np.testing.assert_array_equal(recs.state1.squeeze(), [3] * 3)
+        np.testing.assert_array_equal(recs.state2.squeeze(), [0b10101] * 3)
+        np.testing.assert_array_equal(recs.flat_view()["values"][:, 0], [0, 0.5, 1])
+
+    def test_byte_order(self):
+
+        obj = nested(byte_order='>')
+        obj.field1.data1 = 0x01020304
+        obj.state2 = 5
+        self.assertEqual(obj.tobytes()[:4], b'\x01\x02\x03\x04')
+        self.assertEqual(obj.state2, 5)
+        # dtypes of each byte order are cached
+        self.assertIs(nested(byte_order='>').dtype, obj.dtype)
+
+        data = obj.tobytes() * 4
+        recs = nested.frombuffer(data, byte_order='>')
+        self.assertEqual(recs.dtype, obj.dtype)
+        np.testing.assert_array_equal(recs.field1.data1.squeeze(), [0x01020304] * 4)
+
+        # decode straight into native byte order
+        native = nested.frombuffer(data, byte_order='>', native=True)
+        self.assertEqual(native.dtype, nested.__schema__.dtype)
+        np.testing.assert_array_equal(native.field1.data1.squeeze(), [0x01020304] * 4)
+        np.testing.assert_array_equal(native.state2.squeeze(), [5] * 4)
+        self.assertIs(native.to_byte_order('='), native)
+
+        # variable length records, the length field is read in the same byte order
+        rec = varrec(values=np.arange(3), tail=7, byte_order='>')
+        self.assertEqual(rec.tobytes()[:2], b'\x00\x03')
+        groups = varrec.frombuffer(rec.tobytes() * 2, byte_order='>', native=True)
+        np.testing.assert_array_equal(groups[(3,)].values, [np.arange(3)] * 2)
+
+    def test_columns(self):
+
+        recs = nested(shape=(5,))
+        recs.flat_view()['field1.data1'] = np.arange(5)[:, None]
+        recs.state1 = np.arange(5, dtype=np.uint16)[:, None]
+        recs.state2 = 3
+
+        cols = recs.to_columns()
+        self.assertEqual(list(cols), ['field1.data1', 'field1.data2', 'field2', 'state1', 'state2'])
+        np.testing.assert_array_equal(cols['field1.data1'], np.arange(5))
+        np.testing.assert_array_equal(cols['state2'], [3] * 5)
+        self.assertEqual(cols['field2'].shape, (5, 2))
+        self.assertTrue(all(c.flags.c_contiguous for c in cols.values()))
+
+        self.assertEqual(list(recs.to_columns(['field1', 'state1'])), ['field1.data1', 'field1.data2', 'state1'])
+        self.assertIn('state1_base', recs.to_columns(expand_bitfields=False))
+        with self.assertRaises(ValueError):
+            recs.to_columns(['missing'])
+
+        # round trip, bit fields are packed into their base field
+        self.assertEqual(nested.from_columns(cols).tobytes(), recs.tobytes())
+
+        # columns are native, in any byte order of the records
+        swapped = nested.from_columns(cols, byte_order='>')
+        self.assertEqual(swapped.dtype, nested(byte_order='>').dtype)
+        np.testing.assert_array_equal(swapped.to_columns()['state1'], np.arange(5))
+
+        # variable length members are sized from their column
+        recs = varrec(values=np.arange(3), shape=(4,))
+        self.assertEqual(recs.to_columns()['values'].shape, (4, 3))
+        self.assertEqual(varrec.from_columns(recs.to_columns()).tobytes(), recs.tobytes())
+
+    def test_enum(self):
+
+        recs = status(shape=(5,))
+        np.testing.assert_array_equal(recs.decode_enum('mode', names=True), ['RUNNING'] * 5)
+
+        # members, names and arrays of names are accepted on assignment
+        recs.mode = np.array(['IDLE', 'FAULT', 'RUNNING', 'IDLE', 'FAULT'])[:, None]
+        rec = recs[2]
+        rec.mode = 5
+        np.testing.assert_array_equal(recs.mode.reshape(-1), [0, 4, 5, 0, 4])
+
+        codes, categories = recs.decode_enum('mode')
+        np.testing.assert_array_equal(categories, ['IDLE', 'RUNNING', 'FAULT'])
+        np.testing.assert_array_equal(codes, [0, 2, -1, 0, 2])
+        np.testing.assert_array_equal(recs.decode_enum('mode', names=True), ['IDLE', 'FAULT', '', 'IDLE', 'FAULT'])
+
+        rec = status()
+        rec.mode = Mode.FAULT
+        rec.level = 'high'
+        self.assertEqual(rec.mode, 4)
+        self.assertEqual(rec.level, 3)
+        with self.assertRaises(ValueError):
+            rec.mode = 'STOPPED'
+        with self.assertRaises(ValueError):
+            rec.decode_enum('code')
+
+    def test_query(self):
+
+        n = 1000
+        recs = nested(shape=(n,))
+        recs.flat_view()['field1.data1'] = np.arange(n)[:, None]
+        recs.flat_view()['field2'] = np.arange(2 * n).reshape(n, 2)
+        recs.state1 = (np.arange(n) % 11).astype(np.uint16)[:, None]
+
+        idx = recs.query('field1.data1 % 5 == 3 & state1 > 5', indices=True, chunk_size=64)
+        np.testing.assert_array_equal(idx, np.flatnonzero((np.arange(n) % 5 == 3) & (np.arange(n) % 11 > 5)))
+
+        matched = recs.query('2 <= state1 < 4 and field2[1] > 1000')
+        self.assertIsInstance(matched, nested)
+        np.testing.assert_array_equal(matched.state1.reshape(-1) % 11, [2, 3] * (len(matched) // 2))
+        self.assertTrue(np.all(matched.field2[:, 1] > 1000))
+
+        expected = np.flatnonzero(~np.isin(np.arange(n) % 11, [0, 1]) | (np.arange(n) <= 10))
+        np.testing.assert_array_equal(recs.query('state1 not in (0, 1) | ~(field1.data1 > 10)', indices=True), expected)
+
+        # enum fields are compared with member names
+        srecs = status(shape=(4,))
+        srecs.mode = np.array(['IDLE', 'FAULT', 'RUNNING', 'FAULT'])[:, None]
+        np.testing.assert_array_equal(srecs.query("mode == 'FAULT'", indices=True), [1, 3])
+
+        # memory mapped records are read in chunks
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'recs.bin')
+            recs.tofile(path)
+            mapped = nested.frombuffer(np.memmap(path, dtype=np.uint8, mode='r'))
+            np.testing.assert_array_equal(mapped.query('field1.data1 % 5 == 3 & state1 > 5', indices=True), idx)
+            del mapped
+
+        for expr in ['field2 > 1', 'missing == 1', 'state1 ==', "state1 == 'IDLE'"]:
+            with self.assertRaises(ValueError):
+                recs.query(expr)
+
+    def test_to_ldarray(self):
+
+        recs = nested(shape=(5,))
+        recs.flat_view()['field1.data1'] = np.arange(5)[:, None] * 10
+        recs.flat_view()['field2'] = np.arange(10).reshape(5, 2)
+        recs.state1 = np.arange(5, dtype=np.uint16)[:, None]
+
+        ld = recs.to_ldarray('field2', dims=('seq', 'channel'), coords_from='field1.data1')
+        self.assertEqual(ld.shape, (5, 2))
+        np.testing.assert_array_equal(ld.coords['seq'], np.arange(5) * 10)
+        np.testing.assert_array_equal(ld.sel(seq=20), [4, 5])
+        # the data is a view of the records
+        self.assertTrue(np.shares_memory(ld, recs))
+        ld[0, 0] = -1
+        self.assertEqual(recs.field2[0, 0], -1)
+
+        ld = recs.to_ldarray('field1.data1')
+        self.assertEqual(ld.shape, (5,))
+        np.testing.assert_array_equal(ld.coords['index'], np.arange(5))
+
+        ld = recs.to_ldarray('field1.data2', coords=dict(dim1=['a', 'b', 'c']))
+        np.testing.assert_array_equal(ld.coords['dim1'], ['a', 'b', 'c'])
+
+        np.testing.assert_array_equal(recs.to_ldarray('state1'), np.arange(5))
+        with self.assertRaises(ValueError):
+            recs.to_ldarray('field2', dims=('seq',))
+
+    def test_c_header(self):
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "packets.h")
+            with open(path, "w") as f:
+                f.write(C_HEADER)
+
+            cache_dir = os.path.join(tmpdir, "cache")
+            classes = load_c_header(path, base=Packet, ptype_field="ptype", ptypes=dict(cmdpkt=4), cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+            # loaded from the cache
+            cached = load_c_header(path, base=Packet, ptype_field="ptype", ptypes=dict(cmdpkt=4), cache_dir=cache_dir)
+
+        for c in [classes, cached]:
+            self.assertEqual(c["cmdpkt"], c["cmdpkt_t"])
+            self.assertTrue(issubclass(c["cmdpkt"], Packet))
+
+            # C layout: header is 6 bytes (aligned), packed bit-fields follow
+            schema = c["cmdpkt"].__schema__
+            offsets = {f.name: f.offset for f in schema}
+            self.assertEqual(offsets["state1_base"], 6)
+            self.assertEqual(schema["state3"].bit_pos, 12)
+            self.assertEqual(schema["samples"].shape, (2, 4))
+            self.assertEqual(offsets["points[1].y"], 8 + 16 + 3)
+            self.assertEqual(schema.itemsize, 28)
+            self.assertEqual(c["aligned_s"].__schema__.itemsize, 24)
+
+            pkt = c["cmdpkt"]()
+            self.assertEqual(pkt.hdr.get_ptype(), 4)
+            pkt.state2 = 5
+            self.assertEqual(pkt.state2, 5)
+
+        with self.assertRaises(CHeaderError):
+            parse_c_structs("struct a { uint8_t *ptr; };")
+
+    def test_c_bitfields(self):
+
+        c = build_structs(parse_c_structs(C_BITFIELDS))
+        self.assertEqual({k: v.__schema__.itemsize for k, v in c.items()}, C_BITFIELD_SIZES)
+
+        # s1 shares the 16 bit storage unit that holds flag
+        self.assertEqual(c["t1"].__schema__["s2"].offset, 1)
+        self.assertEqual(c["t1"].__schema__["s2"].bit_pos, 3)
+
+        # packed bit-fields cross storage units
+        rec = c["t2"]()
+        rec.y = 0xF
+        self.assertEqual(bytes(rec), bytes([0xC0, 0x03, 0]))
+
+        # nested structs are placed at their C alignment
+        self.assertEqual(c["t8"].__schema__["n.a"].offset, 4)
+        self.assertEqual(c["t8"].__schema__["e"].offset, 10)
+        # packed structs are not padded inside aligned structs
+        self.assertEqual(c["t10"].__schema__["p.b"].offset, 2)
+        self.assertEqual(c["t10"].__schema__["c"].offset, 6)
+
+        # separate runs of bit-fields get their own reserved members
+        self.assertEqual(c["t11"].__schema__["mode"].offset, 2)
+        self.assertNotEqual(c["t11"].__schema__["_reserved0"].offset, c["t11"].__schema__["_reserved1"].offset)
+
+        # members named like array attributes are renamed
+        c = build_structs(parse_c_structs("struct s { uint16_t size; uint8_t data[2]; uint8_t flags:4; };"))
+        names = [f.name for f in c["s"].__schema__ if not f.name.startswith("_")]
+        self.assertEqual(names, ["size_", "data_", "flags__base", "flags_"])
+        c = build_structs(parse_c_structs("struct s { uint16_t size; uint8_t data[2]; };"), rename=dict(size="length"))
+        self.assertEqual(c["s"].__schema__["length"].offset, 0)
+        self.assertEqual(c["s"].__schema__["data_"].shape, (2,))
+
+        # generated classes pickle without being importable
+        c = build_structs(parse_c_structs(C_BITFIELDS))
+        rec = c["t8"]()
+        rec.e = 300
+        loaded = pickle.loads(pickle.dumps(rec))
+        self.assertEqual(loaded.e, 300)
+        self.assertEqual(bytes(loaded), bytes(rec))
+
+    @unittest.skipIf(shutil.which("gcc") is None, "requires gcc")
+    def test_c_layout_gcc(self):
+
+        classes = build_structs(parse_c_structs(C_BITFIELDS))
+
+        # C program that prints the size of each struct, and the bytes of a record with each bit-field set to ones
+        lines = ["#include <stdio.h>", "#include <string.h>", C_BITFIELDS, "int main() {"]
+        for name, cls in classes.items():
+            lines.append('printf("{} %zu\\n", sizeof(struct {}));'.format(name, name))
+            for f in cls.__schema__:
+                if f.is_bitfield and not any(p.startswith("_") for p in f.name.split(".")):
+                    lines += [
+                        "{{ struct {} v; memset(&v, 0, sizeof(v)); v.{} = -1;".format(name, f.name),
+                        'printf("{}:{} "); for (size_t i = 0; i < sizeof(v); i++) printf("%02x", ((unsigned char*)&v)[i]);'.format(name, f.name),
+                        'printf("\\n"); }',
+                    ]
+        lines.append("return 0; }")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            src = os.path.join(tmpdir, "layout.c")
+            exe = os.path.join(tmpdir, "layout")
+            with open(src, "w") as f:
+                f.write("\n".join(lines))
+            subprocess.run(["gcc", src, "-o", exe], check=True)
+            output = subprocess.run([exe], check=True, capture_output=True, text=True).stdout
+
+        for line in output.splitlines():
+            key, value = line.split()
+            if ":" not in key:
+                self.assertEqual(classes[key].__schema__.itemsize, int(value), key)
+                continue
+
+            name, path = key.split(":")
+            field = classes[name].__schema__[path]
+            rec = np.zeros(1, dtype=classes[name].__schema__.dtype)
+            base = rec.view(np.uint8)[field.offset: field.offset + field.dtype.itemsize].view(field.dtype)
+            base[0] = field.mask << field.bit_pos
+            self.assertEqual(rec.tobytes().hex(), value, key)
+
+
+if __name__ == '__main__':
+    unittest.main()
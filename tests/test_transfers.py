@@ -1,10 +1,23 @@
 import numpy as np
 import unittest
-
-from np_struct.transfer import SocketInterface, PacketServer, Packet
+import os
+import time
+import socket
+import threading
+import zlib
+
+from np_struct.transfer import SocketInterface, PacketServer, Packet, LoopBack, SerialInterface, get_packet_table
+from np_struct.transfer import DatagramInterface, PacketTypeError, PacketChecksumError
+from np_struct.stats import LatencyHistogram
 from np_struct.bitfields import uint16
+from np_struct import varlen, checksum
 from enum import Enum
 
+try:
+    import serial
+except ImportError:
+    serial = None
+
 
 class pkt_types(Enum):
     invalid = 0x00
@@ -46,6 +59,23 @@ class variablepkt(Packet):
     def from_header(cls, hdr: pktheader, **kwargs):
         return cls(da=np.zeros(hdr.payload_shape), **kwargs)
 
+class samplepkt(Packet):
+    # number of samples is given by the psize field of the header
+    hdr = pktheader(ptype=0x21)
+    samples = varlen(np.int16, length='hdr.psize')
+    crc = np.uint8()
+
+class crcpkt(Packet):
+    hdr = pktheader(ptype=0x22)
+    samples = varlen(np.int16, length='hdr.psize')
+    crc16 = checksum('crc16', start='samples')
+    crc32 = checksum('crc32')
+
+class extpkt(datapkt):
+    # packet types are registered at any depth of inheritance
+    hdr = pktheader(ptype=0x20)
+    extra = np.uint8()
+
 def pkt_handler(pkt: Packet) -> Packet:
     """
     Server-side packet handler. Given a packet from the client, create a new packet to send back.
@@ -127,6 +157,415 @@ class TestSockets(unittest.TestCase):
 
 
 
+class TestPacketTable(unittest.TestCase):
+
+    def test_registry(self):
+
+        table = get_packet_table(pktheader)
+        self.assertIs(table.types[pkt_types.datapkt.value], datapkt)
+        self.assertIs(table.types[0x20], extpkt)
+
+        # packet types are small integers, use the array lookup table
+        self.assertIs(table.lut[pkt_types.cmdpkt.value], cmdpkt)
+        self.assertIsNone(table.get(0x7F))
+
+        # registered types are read-only through an interface
+        with self.assertRaises(TypeError):
+            LoopBack(header=pktheader)._pkt_types[0x7F] = datapkt
+
+        # all interfaces share the same table
+        self.assertIs(LoopBack(header=pktheader)._pkt_table, LoopBack(header=pktheader)._pkt_table)
+
+    def test_loopback_dispatch(self):
+
+        intf = LoopBack(header=pktheader)
+        pkt = extpkt(extra=3)
+        intf.pkt_write(pkt)
+
+        rxpkt = intf.pkt_read()
+        self.assertIsInstance(rxpkt, extpkt)
+        self.assertEqual(rxpkt.extra, 3)
+
+    def test_variable_length(self):
+
+        intf = LoopBack(header=pktheader)
+        for n in [5, 0, 5, 12]:
+            pkt = samplepkt(samples=np.arange(n), crc=n)
+            self.assertEqual(pkt.hdr.psize, n)
+            self.assertEqual(samplepkt.size_from_header(pkt.hdr), pkt.get_size())
+            intf.pkt_write(pkt)
+
+        for n in [5, 0, 5, 12]:
+            rxpkt = intf.pkt_read()
+            self.assertIsInstance(rxpkt, samplepkt)
+            np.testing.assert_array_equal(rxpkt.samples, np.arange(n))
+            self.assertEqual(rxpkt.crc, n)
+
+        # one dtype per distinct length
+        self.assertIs(samplepkt(samples=np.arange(5)).dtype, samplepkt(samples=np.ones(5)).dtype)
+
+        # packets built from a header are sized by the length field
+        hdr = pktheader(psize=3)
+        self.assertEqual(samplepkt.from_header(hdr).samples.shape, (3,))
+
+    def test_write_many(self):
+
+        intf = LoopBack(header=pktheader)
+        pkts = [samplepkt(samples=np.arange(n), crc=n) for n in range(1, 4)]
+
+        intf.pkt_write_many(pkts)
+        self.assertEqual(intf.rx_buffer, b''.join(bytes(p) for p in pkts))
+
+        # batched writes are held until max_bytes are queued, or a packet is read
+        intf.flush()
+        intf.set_batching(max_bytes=100)
+        intf.pkt_write(pkts[0])
+        intf.pkt_write(pkts[1])
+        self.assertEqual(intf.rx_buffer, b'')
+
+        rxpkt = intf.pkt_read()
+        np.testing.assert_array_equal(rxpkt.samples, [0])
+        self.assertEqual(len(intf.rx_buffer), pkts[1].get_size())
+
+        intf.pkt_write_many(pkts * 10)
+        self.assertGreater(len(intf.rx_buffer), 100)
+
+        # queued packets are copied, the packet can be changed before the queue is sent
+        intf.flush()
+        pkt = samplepkt(samples=np.arange(2), crc=1)
+        intf.pkt_write(pkt)
+        pkt.crc = 99
+        intf.pkt_write(pkt)
+        intf.tx_flush()
+        self.assertEqual([intf.pkt_read().crc.item() for _ in range(2)], [1, 99])
+        intf.set_batching()
+
+    def test_write_delay(self):
+
+        intf = LoopBack(header=pktheader)
+        intf.set_batching(max_delay=0.02, max_bytes=1000)
+
+        intf.pkt_write(samplepkt(samples=np.arange(3), crc=3))
+        self.assertEqual(intf.rx_buffer, b'')
+
+        # a lone packet is sent once the delay expires
+        deadline = time.time() + 2
+        while not len(intf.rx_buffer) and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(intf.pkt_read().crc, 3)
+        intf.set_batching()
+
+    def test_vectored_socket_write(self):
+
+        a, b = socket.socketpair()
+        intf = SocketInterface(header=pktheader)
+        intf.socket, intf._connected = a, True
+
+        pkts = [samplepkt(samples=np.arange(n % 50), crc=n % 256) for n in range(2000)]
+        expected = b''.join(bytes(p) for p in pkts)
+
+        # read on another thread so large writes don't block
+        received = bytearray()
+        def recv_all():
+            while len(received) < len(expected):
+                received.extend(b.recv(1 << 16))
+
+        reader = threading.Thread(target=recv_all)
+        reader.start()
+        intf.pkt_write_many(pkts)
+        reader.join()
+        intf.close()
+        b.close()
+
+        self.assertEqual(bytes(received), expected)
+
+    def test_checksums(self):
+        intf = LoopBack(header=pktheader)
+
+        # filled on write, verified on read
+        intf.pkt_write(crcpkt(samples=np.arange(5)))
+        rxpkt = intf.pkt_read()
+        self.assertEqual(rxpkt.crc32.item(), zlib.crc32(rxpkt.tobytes()[:-4]))
+        self.assertTrue(rxpkt.verify_checksums().all())
+
+        data = bytearray(bytes(rxpkt))
+        data[6] ^= 0xFF
+        intf.write(data)
+        with self.assertRaises(PacketChecksumError):
+            intf.pkt_read()
+
+        # vectorized over record arrays, in both the per-row and column-wise paths
+        for n in [3, 500]:
+            recs = crcpkt(samples=np.arange(4), shape=(n,))
+            recs.samples = np.arange(n * 4).reshape(n, 4)
+            recs.update_checksums()
+            raw = recs.tobytes()
+            size = recs.itemsize
+            expected = [zlib.crc32(raw[i * size:(i + 1) * size - 4]) for i in range(n)]
+            np.testing.assert_array_equal(recs.crc32.reshape(-1), expected)
+
+            recs.samples[1] = 0
+            np.testing.assert_array_equal(np.flatnonzero(~recs.verify_checksums()), [1])
+
+    def test_byte_order(self):
+        intf = LoopBack(header=pktheader, byte_order='>')
+
+        # packets are written in the byte order of the interface
+        intf.pkt_write(samplepkt(samples=np.arange(3), crc=5))
+        self.assertEqual(intf.rx_buffer[:2], b'\x00\x03')
+
+        rxpkt = intf.pkt_read()
+        self.assertIsInstance(rxpkt, samplepkt)
+        self.assertEqual(rxpkt.hdr.psize, 3)
+        np.testing.assert_array_equal(rxpkt.samples, np.arange(3))
+        self.assertEqual(rxpkt.dtype['samples'].base.byteorder, '>')
+
+    def test_duplicate_types(self):
+
+        class dupheader(Packet):
+            ptype = np.uint8()
+
+            def get_ptype(self):
+                return self.ptype
+
+        class pkt1(Packet):
+            hdr = dupheader(ptype=1)
+
+        class pkt2(Packet):
+            hdr = dupheader(ptype=1)
+
+        with self.assertRaises(RuntimeError):
+            LoopBack(header=dupheader)
+
+
+class TestLoopBack(unittest.TestCase):
+
+    def test_chunks(self):
+        intf = LoopBack(header=pktheader, timeout=0.05)
+        intf.write(b'abc')
+        intf.write_many([b'de', b'', b'fgh'])
+        self.assertEqual(intf.in_waiting, 8)
+
+        # reads across and inside chunks
+        self.assertEqual(intf.read(4), b'abcd')
+        self.assertEqual(intf.read(2), b'ef')
+        self.assertEqual(intf.rx_buffer, b'gh')
+
+        with self.assertRaises(TimeoutError):
+            intf.read(3)
+
+        intf.flush()
+        self.assertEqual(intf.in_waiting, 0)
+
+    def test_producer_consumer(self):
+        intf = LoopBack(header=pktheader, capacity=10 * ack().nbytes)
+        n = 2000
+
+        def produce():
+            for i in range(n):
+                intf.pkt_write(ack(ack_ptype=i % 256))
+
+        thread = threading.Thread(target=produce)
+        thread.start()
+        received = [intf.pkt_read().ack_ptype.item() for i in range(n)]
+        thread.join()
+
+        self.assertEqual(received, [i % 256 for i in range(n)])
+        self.assertEqual(intf.in_waiting, 0)
+
+    def test_capacity(self):
+        intf = LoopBack(header=pktheader, timeout=0.05, capacity=4)
+        intf.write(b'abc')
+        with self.assertRaises(TimeoutError):
+            intf.write(b'de')
+
+        # writes larger than the capacity are accepted when nothing is waiting
+        intf.read(3)
+        intf.write(b'0123456789')
+        self.assertEqual(intf.read(10), b'0123456789')
+
+
+class TestStats(unittest.TestCase):
+
+    def test_histogram(self):
+        hist = LatencyHistogram()
+        for v in range(1, 1001):
+            hist.record(v * 1000)
+
+        # buckets are within 12.5% of the recorded values
+        self.assertLessEqual(abs(hist.percentile(50) - 500e3), 500e3 / 8)
+        self.assertLessEqual(abs(hist.percentile(99) - 990e3), 990e3 / 8)
+        self.assertEqual(hist.percentile(100), 1000e3)
+        self.assertEqual(hist.summary()['count'], 1000)
+
+        for idx in range(hist.NBUCKETS - 1):
+            lo, hi = hist.bucket_bounds(idx)
+            self.assertEqual(hist.bucket_bounds(idx + 1)[0], hi + 1)
+
+    def test_loopback(self):
+        events = []
+        intf = LoopBack(header=pktheader)
+        stats = intf.set_stats(hook=lambda *args: events.append(args[0]))
+
+        for i in range(3):
+            intf.pkt_sendrecv(datapkt(da=np.arange(10)))
+        intf.pkt_write_many([ack(), ack()])
+        intf.pkt_read()
+        intf.pkt_read()
+
+        # unknown packet type
+        intf.write(b'\x00\x00\x77\x01\x01')
+        with self.assertRaises(PacketTypeError):
+            intf.pkt_read()
+
+        snap = stats.snapshot()
+        self.assertEqual(snap['rx']['packets'], 5)
+        self.assertEqual(snap['tx']['bytes'], 3 * datapkt().nbytes + 2 * ack().nbytes)
+        self.assertEqual(snap['rx_types'][pkt_types.datapkt.value]['latency']['count'], 3)
+        self.assertEqual(snap['rtt'][pkt_types.datapkt.value]['count'], 3)
+        self.assertEqual(snap['tx_types'][pkt_types.ack.value]['packets'], 2)
+        self.assertEqual(snap['type_errors'], 1)
+        self.assertEqual(events.count('rtt'), 3)
+        self.assertEqual(events[-1], 'type_error')
+
+        intf.set_stats(False)
+        self.assertIsNone(intf.stats)
+
+
+class TestDatagram(unittest.TestCase):
+
+    def setUp(self):
+        self.rx = DatagramInterface(('127.0.0.1', 0), header=pktheader, timeout=0.5, max_datagram=512).connect()
+        self.tx = DatagramInterface(('127.0.0.1', 0), header=pktheader, target=self.rx.host).connect()
+
+    def tearDown(self):
+        self.rx.close()
+        self.tx.close()
+
+    def test_batch(self):
+        self.tx.pkt_write(datapkt(da=np.arange(10)))
+        self.tx.pkt_write(ack(ack_ptype=3))
+        # several packets in one datagram
+        self.tx.write(bytes(datapkt(da=np.ones(10))) + bytes(ack(ack_ptype=5)))
+        self.tx.pkt_write(samplepkt(samples=np.arange(4)))
+        # unknown packet type
+        self.tx.write(b'\x00\x00\x77\x01\x01')
+        # larger than max_datagram
+        self.tx.write(bytes(1024))
+        time.sleep(0.05)
+
+        pkts = self.rx.pkt_read_batch()
+        self.assertEqual(set(pkts.keys()), {datapkt, ack, samplepkt})
+
+        self.assertIsInstance(pkts[datapkt], datapkt)
+        np.testing.assert_array_equal(pkts[datapkt].da, [np.arange(10), np.ones(10)])
+        np.testing.assert_array_equal(pkts[ack].ack_ptype.reshape(-1), [3, 5])
+        self.assertEqual(len(pkts[samplepkt]), 1)
+        np.testing.assert_array_equal(pkts[samplepkt][0].samples, np.arange(4))
+
+        counters = self.rx.counters
+        self.assertEqual(counters['datagrams'], 5)
+        self.assertEqual(counters['packets'], 5)
+        self.assertEqual(counters['dropped'], 1)
+        self.assertEqual(counters['truncated'], 1)
+
+        # nothing left to receive
+        self.assertEqual(self.rx.pkt_read_batch(timeout=0), {})
+
+    def test_overrun(self):
+        self.rx.batch_size = 4
+        for i in range(6):
+            self.tx.pkt_write(ack(ack_ptype=i))
+        time.sleep(0.05)
+
+        self.assertEqual(len(self.rx.pkt_read_batch()[ack]), 4)
+        self.assertEqual(self.rx.counters['overruns'], 1)
+        self.assertEqual(len(self.rx.pkt_read_batch()[ack]), 2)
+
+    def test_batch_order(self):
+        # packets of one type in single and multi-packet datagrams are returned in arrival order
+        self.tx.write(bytes(ack(ack_ptype=1)) + bytes(ack(ack_ptype=2)))
+        self.tx.pkt_write(ack(ack_ptype=3))
+        self.tx.write(bytes(ack(ack_ptype=4)) + bytes(datapkt()) + bytes(ack(ack_ptype=5)))
+        self.tx.pkt_write(ack(ack_ptype=6))
+        time.sleep(0.05)
+
+        pkts = self.rx.pkt_read_batch()
+        np.testing.assert_array_equal(pkts[ack].ack_ptype.reshape(-1), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(len(pkts[datapkt]), 1)
+
+    def test_pkt_read(self):
+        self.tx.pkt_write(datapkt(da=np.arange(10)))
+        rxpkt = self.rx.pkt_read()
+        np.testing.assert_array_equal(rxpkt.da, np.arange(10))
+
+
+@unittest.skipIf(serial is None or not hasattr(os, 'openpty'), 'requires pyserial and a pty')
+class TestSerial(unittest.TestCase):
+    # a pty pair stands in for a serial device, the test writes device data to the master end
+
+    def setUp(self):
+        self.master, slave = os.openpty()
+        self.port = os.ttyname(slave)
+        self.slave = slave
+
+    def tearDown(self):
+        os.close(self.master)
+        os.close(self.slave)
+
+    def check_interface(self, intf):
+        pkts = [samplepkt(samples=np.arange(n), crc=n) for n in range(1, 6)]
+        data = b''.join(bytes(p) for p in pkts)
+
+        # packets arrive in pieces from another thread
+        def device():
+            for i in range(0, len(data), 7):
+                os.write(self.master, data[i:i + 7])
+                time.sleep(0.001)
+            os.write(self.master, b'line\n')
+
+        writer = threading.Thread(target=device)
+        writer.start()
+        for n in range(1, 6):
+            rxpkt = intf.pkt_read()
+            np.testing.assert_array_equal(rxpkt.samples, np.arange(n))
+        self.assertEqual(intf.read_until(b'\n'), b'line\n')
+        writer.join()
+
+        intf.pkt_write(pkts[0])
+        self.assertEqual(os.read(self.master, 100), bytes(pkts[0]))
+
+        with self.assertRaises(TimeoutError):
+            intf.read(1)
+
+    def test_blocking(self):
+        intf = SerialInterface(self.port, timeout=0.2, header=pktheader)
+        self.check_interface(intf)
+        intf.close()
+
+    def test_threaded(self):
+        intf = SerialInterface(self.port, timeout=0.2, header=pktheader, threaded=True)
+        self.check_interface(intf)
+
+        # the reader thread doesn't spin while waiting for data
+        t0 = time.process_time()
+        time.sleep(0.3)
+        self.assertLess(time.process_time() - t0, 0.1)
+
+        intf.close()
+        self.assertIsNone(intf._reader)
+
+    def test_open_error(self):
+        with self.assertRaises(serial.SerialException):
+            SerialInterface(self.port + '-missing', timeout=0.2, header=pktheader, threaded=True)
+
+        # the partly initialized interface can still be closed
+        intf = SerialInterface.__new__(SerialInterface)
+        with self.assertRaises(serial.SerialException):
+            intf.__init__(self.port + '-missing', timeout=0.2, header=pktheader, threaded=True)
+        intf.close()
+        self.assertFalse(intf.is_open())
+
 
 if __name__ == '__main__':
     unittest.main()